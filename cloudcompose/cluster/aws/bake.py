@@ -0,0 +1,125 @@
+from __future__ import print_function
+from builtins import object
+import botocore
+import datetime
+from retrying import retry
+from time import sleep, time
+from cloudcompose.exceptions import CloudComposeException
+from .instancetypes import CAPACITY_ERROR_CODES
+
+BAKE_POLL_INTERVAL = 15
+
+# builds an AMI by running the bake script on a builder instance and imaging it
+class ImageBakeController(object):
+    def __init__(self, ec2, cluster_name, silent=False):
+        self.ec2 = ec2
+        self.cluster_name = cluster_name
+        self.silent = silent
+
+    def find_baked_image(self, name, content_hash=None):
+        filters = [{'Name': 'tag:Name', 'Values': [name]}, {'Name': 'state', 'Values': ['available']}]
+        if content_hash:
+            filters.append({'Name': 'tag:ContentHash', 'Values': [content_hash]})
+
+        images = self._ec2_describe_images(Owners=['self'], Filters=filters)
+        for image in sorted(images, reverse=True, key=lambda image: image['CreationDate']):
+            return image['ImageId']
+
+    def is_baked_image(self, image_id, name):
+        for image in self._ec2_describe_images(ImageIds=[image_id]):
+            for tag in image.get('Tags', []):
+                if tag['Key'] == 'Name' and tag['Value'] == name:
+                    return True
+        return False
+
+    def bake(self, name, content_hash, base_image, instance_types, timeout=1800, **instance_args):
+        instance_args['TagSpecifications'] = [{
+            'ResourceType': 'instance',
+            'Tags': [{'Key': 'Name', 'Value': '%s-bake' % self.cluster_name},
+                     {'Key': 'BakeFor', 'Value': self.cluster_name}]
+        }]
+        instance_args['InstanceInitiatedShutdownBehavior'] = 'stop'
+        instance_id = self._run_builder(base_image, instance_types, **instance_args)
+        if not self.silent:
+            print('launched builder %s from %s' % (instance_id, base_image))
+
+        try:
+            # the bake script shuts the builder down once it is done
+            self._wait_for_state(instance_id, 'stopped', timeout)
+            string_time = datetime.datetime.utcnow().strftime("%Y-%m-%d-%H-%M-%S")
+            tags = [{'Key': 'Name', 'Value': name},
+                    {'Key': 'ContentHash', 'Value': content_hash},
+                    {'Key': 'BaseImage', 'Value': base_image}]
+            image_id = self._ec2_create_image(
+                InstanceId=instance_id,
+                Name='%s-%s' % (name, string_time),
+                Description='%s baked from %s' % (name, base_image),
+                TagSpecifications=[{'ResourceType': 'image', 'Tags': tags},
+                                   {'ResourceType': 'snapshot', 'Tags': tags}])['ImageId']
+            if not self.silent:
+                print('creating image %s' % image_id)
+            self._wait_for_image(image_id, timeout)
+        finally:
+            self._ec2_terminate_instances(InstanceIds=[instance_id])
+            if not self.silent:
+                print('terminated builder %s' % instance_id)
+
+        return image_id
+
+    def _run_builder(self, base_image, instance_types, **instance_args):
+        for index, instance_type in enumerate(instance_types):
+            try:
+                response = self._ec2_run_instances(ImageId=base_image, MinCount=1, MaxCount=1, InstanceType=instance_type, **instance_args)
+                return response['Instances'][0]['InstanceId']
+            except botocore.exceptions.ClientError as ex:
+                if ex.response["Error"]["Code"] not in CAPACITY_ERROR_CODES or index == len(instance_types) - 1:
+                    raise
+                if not self.silent:
+                    print('no capacity for builder as %s, trying %s' % (instance_type, instance_types[index + 1]))
+
+    def _wait_for_state(self, instance_id, state, timeout):
+        deadline = time() + timeout
+        while time() < deadline:
+            for reservation in self._ec2_describe_instances(InstanceIds=[instance_id]).get('Reservations', []):
+                for instance in reservation.get('Instances', []):
+                    if instance['State']['Name'] == state:
+                        return
+                    if instance['State']['Name'] in ['terminated', 'shutting-down']:
+                        raise CloudComposeException('Builder %s terminated before the bake finished' % instance_id)
+            sleep(BAKE_POLL_INTERVAL)
+        raise CloudComposeException('Builder %s did not finish the bake within %s seconds' % (instance_id, timeout))
+
+    def _wait_for_image(self, image_id, timeout):
+        deadline = time() + timeout
+        while time() < deadline:
+            for image in self._ec2_describe_images(ImageIds=[image_id]):
+                if image['State'] == 'available':
+                    return
+                if image['State'] == 'failed':
+                    raise CloudComposeException('Image %s failed' % image_id)
+            sleep(BAKE_POLL_INTERVAL)
+        raise CloudComposeException('Image %s was not available within %s seconds' % (image_id, timeout))
+
+    def _is_retryable_exception(exception):
+        return not isinstance(exception, botocore.exceptions.ClientError) or \
+            exception.response["Error"]["Code"] in ['InvalidInstanceID.NotFound', 'InvalidAMIID.NotFound']
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _ec2_run_instances(self, **kwargs):
+        return self.ec2.run_instances(**kwargs)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _ec2_describe_instances(self, **kwargs):
+        return self.ec2.describe_instances(**kwargs)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _ec2_describe_images(self, **kwargs):
+        return self.ec2.describe_images(**kwargs).get('Images', [])
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _ec2_create_image(self, **kwargs):
+        return self.ec2.create_image(**kwargs)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _ec2_terminate_instances(self, **kwargs):
+        return self.ec2.terminate_instances(**kwargs)
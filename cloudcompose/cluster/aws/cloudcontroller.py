@@ -7,15 +7,33 @@ from past.builtins import basestring
 from builtins import object
 from os import environ
 import sys
+import subprocess
+import hashlib
+import json
+import copy
+import uuid
 from os.path import abspath, dirname, join, isfile
 import logging
 from cloudcompose.exceptions import CloudComposeException
+from cloudcompose.cluster.journal import StateJournal
+from cloudcompose.cluster.boottimings import BootTimings
+from cloudcompose.cluster.awslogs import AwsLogs
+from cloudcompose.cluster.nodeselection import NodeSelection
+from cloudcompose.cluster.cloudinit import CloudInit
 from .iam import InstancePolicyController
-from .ebs import EBSController
+from .ebs import EBSController, MAX_TAG_RESOURCES
 from .cloudwatch import LogsController
+from .instancetypes import InstanceTypeCatalog, CAPACITY_ERROR_CODES
+from .elb import TargetGroupController
+from .scaling import ScalingController
+from .lifecycle import LifecycleController, DRAIN_BATCH_SIZE
+from .bake import ImageBakeController
+from .discovery import DiscoveryController
 from cloudcompose.util import require_env_var
 import boto3
 import botocore
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
 from time import sleep
 import time, datetime
 from retrying import retry
@@ -28,43 +46,365 @@ import pytz
 from dateutil.tz import tzlocal
 
 MAX_CLOUD_INIT_LENGTH = 16000
+MAX_TOKEN_GENERATIONS = 10
+LIVE_INSTANCE_STATES = ['pending', 'running']
 
 class CloudController(object):
-    def __init__(self, cloud_config, ec2_client=None, asg_client=None, silent=False):
+    def __init__(self, cloud_config, ec2_client=None, asg_client=None, silent=False, region=None, nodes=None, exclude_nodes=None):
         logging.basicConfig(level=logging.ERROR)
         self.logger = logging.getLogger(__name__)
         self.cloud_config = cloud_config
         self.silent = silent
         self.config_data = cloud_config.config_data('cluster')
         self.aws = self.config_data['aws']
+        self.default_region = environ.get('AWS_REGION', 'us-east-1')
+        self.multi_region = region is None and len(self.regions()) > 1
+        self.region = region or self.regions()[0]
+        self.node_selection = NodeSelection(nodes, exclude_nodes)
+        if self.node_selection.active and self.aws.get('asg'):
+            raise CloudComposeException('Nodes can not be selected for autoscaling groups')
+        # the templates keep seeing every node in aws.nodes
+        self.nodes = [node for node in self.node_selection.select(self.aws.get('nodes', []))
+                      if node.get('region', self.default_region) == self.region]
+        if not self.multi_region:
+            self._select_region(self.region)
         self.log_driver = self.config_data.get('logging', {}).get('driver')
-        self.log_group = self.config_data.get('logging', {}).get('meta', {}).get('group')
-        self.log_retention = self.config_data.get('logging', {}).get('meta', {}).get('retention')
+        self.log_groups = AwsLogs(self.config_data).log_groups()
         self.instance_policy = self.aws.get('instance_policy')
         self.cluster_name = self.config_data['name']
         self.ec2 = ec2_client or self._get_ec2_client()
         self.asg = asg_client or self._get_asg_client()
+        self.instance_types = InstanceTypeCatalog(self.ec2, region=self.region, silent=silent)
+        self.unavailable_instance_types = {}
+        self.journal = StateJournal(self._journal_name(region))
+        self.resume = False
 
     def _get_ec2_client(self):
-        return boto3.client('ec2', region_name=environ.get('AWS_REGION', 'us-east-1'))
+        return boto3.client('ec2', region_name=self.region, config=self._client_config())
 
     def _get_asg_client(self):
-        return boto3.client('autoscaling', region_name=environ.get('AWS_REGION', 'us-east-1'))
+        return boto3.client('autoscaling', region_name=self.region, config=self._client_config())
+
+    def _client_config(self):
+        # adaptive retries rate limit each region's clients independently
+        return Config(retries={'max_attempts': 10, 'mode': 'adaptive'})
+
+    def _journal_name(self, region):
+        if region:
+            return '%s.%s' % (self.cluster_name, region)
+        return self.cluster_name
+
+    def regions(self):
+        regions = set()
+        for node in self.aws.get('nodes', []):
+            regions.add(node.get('region', self.default_region))
+        for subnet_group in self.aws.get('asg', {}).get('subnets', []):
+            if isinstance(subnet_group, dict):
+                regions.add(subnet_group.get('region', self.default_region))
+            else:
+                regions.add(self.default_region)
+        return sorted(regions) or [self.default_region]
 
-    def up(self, cloud_init=None, use_snapshots=True, upgrade_image=False, snapshot_cluster=None, snapshot_time=None):
+    def _select_region(self, region):
+        # applies the aws.regions overrides and keeps only the ASG subnets of the region
+        self.aws.update(self.aws.get('regions', {}).get(region, {}))
+        if self.aws.get('asg'):
+            subnets = []
+            for subnet_group in self.aws['asg'].get('subnets', []):
+                if not isinstance(subnet_group, dict):
+                    if region == self.default_region:
+                        subnets.append(subnet_group)
+                elif subnet_group.get('region', self.default_region) == region:
+                    subnets.extend(subnet_group.get('subnets', []))
+            self.aws['asg']['subnets'] = subnets
+
+    def _for_each_region(self, method_name, *args, **kwargs):
+        # one controller per region, each with its own clients and cloud init
+        regions = self.regions()
+        if self.node_selection.active:
+            # regions without selected nodes have nothing to do
+            selected_regions = set(node.get('region', self.default_region) for node in self.node_selection.select(self.aws.get('nodes', [])))
+            regions = [region for region in regions if region in selected_regions]
+        controllers = [CloudController(self.cloud_config, silent=self.silent, region=region,
+                                       nodes=self.node_selection.nodes, exclude_nodes=self.node_selection.exclude_nodes) for region in regions]
+        with ThreadPoolExecutor(max_workers=len(controllers)) as executor:
+            futures = [executor.submit(getattr(controller, method_name), *self._regional_args(args), **kwargs) for controller in controllers]
+            return dict(zip(regions, [future.result() for future in futures]))
+
+    def _regional_args(self, args):
+        # a cloud init keeps the state of its last build, so the regions must not share one
+        return [copy.copy(arg) if isinstance(arg, CloudInit) else arg for arg in args]
+
+    def up(self, cloud_init=None, use_snapshots=True, upgrade_image=False, snapshot_cluster=None, snapshot_time=None, restore_mode=None, resume=False,
+           wait_healthy=False, wait_timeout=600):
+        if self.multi_region:
+            results = self._for_each_region('up', cloud_init, use_snapshots, upgrade_image, snapshot_cluster, snapshot_time, restore_mode, resume,
+                                            wait_healthy, wait_timeout)
+            if not self.silent:
+                for region, instances in sorted(results.items()):
+                    print('%s: %s nodes %s' % (region, len(instances), ','.join(instance_data[0] for instance_data in instances.values())))
+            return results
+
+        self.journal.start('up', resume)
+        self.resume = resume
         if snapshot_time and use_snapshots:
             snapshot_time = self._parse_localized_time(snapshot_time)
             if not self.silent:
                 print('restoring from snapshot created on or before %s' % snapshot_time.strftime('%Y-%m-%d %H:%M:%S %Z'))
 
-        self.aws['ami'] = self._resolve_ami_name(upgrade_image)
+        if resume and self.journal.is_done('resolve'):
+            self._restore_resolved_from_journal()
+        else:
+            self.aws['ami'] = self._resolve_ami_name(upgrade_image)
+            self.config_data['_baked'] = self._is_baked_image(self.aws['ami'])
         block_device_map = self._block_device_map(use_snapshots, snapshot_cluster, snapshot_time)
-        if self.log_driver == 'awslogs':
-            self._create_log_group(self.log_group, self.log_retention)
+        self.journal.step_done('resolve', ami=self.aws['ami'], ami_name=self.aws.get('ami_name'), baked=self.config_data['_baked'],
+                               snapshots=dict((volume['name'], volume['snapshot']) for volume in self.aws['volumes'] if 'snapshot' in volume))
+        fast_restores = None
+        if use_snapshots:
+            fast_restores = self._prepare_snapshot_restore(block_device_map, restore_mode)
+        if self.log_driver == 'awslogs' and not self._resumed_step('log_group'):
+            self._create_log_groups(self.log_groups)
+            self.journal.step_done('log_group')
+        if self._discovery_enabled() and not self._resumed_step('discovery'):
+            # the node addresses are static, so they are published before the nodes boot
+            self._discovery_controller().register(self.nodes, self.aws['nodes'])
+            self.journal.step_done('discovery')
+        instances = {}
+        started = time.time()
+        try:
+            if self.aws.get('asg'):
+                self._create_asg(block_device_map, cloud_init)
+                if fast_restores:
+                    self._wait_for_asg_launches(self.cluster_name)
+            else:
+                instances = self._create_instances(block_device_map, cloud_init)
+                if fast_restores:
+                    for instance_data in instances.values():
+                        self._wait_for_running(instance_data[0])
+                if self.aws.get('target_groups') and instances:
+                    self._register_targets(self.aws['target_groups'], [instance_data[0] for instance_data in instances.values()])
+        finally:
+            if fast_restores:
+                self._disable_fast_snapshot_restores(*fast_restores)
+        self.journal.complete()
+
+        if wait_healthy:
+            self._wait_healthy(instances, started, wait_timeout)
+        return instances
+
+    def _register_targets(self, target_groups, instance_ids):
+        controller = TargetGroupController(self.region, silent=self.silent)
+        controller.register_targets(target_groups, instance_ids)
+
+    def _wait_healthy(self, instances, started, timeout):
+        if self.aws.get('asg'):
+            target_groups = self.aws['asg'].get('target_groups', [])
+            self._wait_for_asg_launches(self.cluster_name, timeout)
+            asg_instances = self._describe_asg(self.cluster_name)["AutoScalingGroups"][0]["Instances"]
+            node_instances = [(instance['InstanceId'], instance['InstanceId']) for instance in asg_instances]
+        else:
+            target_groups = self.aws.get('target_groups', [])
+            node_instances = [(node_id, instance_data[0]) for node_id, instance_data in sorted(instances.items())]
+
+        if not target_groups or not node_instances:
+            if not self.silent:
+                print('no target groups or instances to wait for')
+            return
+
+        controller = TargetGroupController(self.region, silent=self.silent)
+        remaining = max(timeout - (time.time() - started), 0)
+        healthy = controller.wait_healthy(target_groups, [instance_id for node, instance_id in node_instances], started, remaining)
+
+        unhealthy = []
+        for node, instance_id in node_instances:
+            seconds = healthy[instance_id]
+            if seconds is None:
+                unhealthy.append(str(node))
+            if not self.silent:
+                if seconds is None:
+                    print('node %s %s is not healthy' % (node, instance_id))
+                else:
+                    print('node %s %s healthy after %.0fs' % (node, instance_id, seconds))
+
+        if unhealthy:
+            raise CloudComposeException('Nodes %s were not healthy within %s seconds' % (','.join(unhealthy), timeout))
+
+    def _resumed_step(self, step):
+        return self.resume and self.journal.is_done(step)
+
+    def _restore_resolved_from_journal(self):
+        self.aws['ami'] = self.journal.get('ami')
+        if self.journal.get('ami_name'):
+            self.aws['ami_name'] = self.journal.get('ami_name')
+        self.config_data['_baked'] = self.journal.get('baked', False)
+        snapshots = self.journal.get('snapshots', {})
+        for volume in self.aws['volumes']:
+            if volume['name'] in snapshots and 'snapshot' not in volume:
+                volume['snapshot'] = snapshots[volume['name']]
+        if not self.silent:
+            print('resuming with ami %s' % self.aws['ami'])
+
+    def status(self, timings=False):
+        if self.multi_region:
+            nodes = []
+            for region, region_nodes in sorted(self._for_each_region('_status_nodes').items()):
+                nodes.extend([(node_id, instance, region) for node_id, instance in region_nodes])
+        else:
+            nodes = [(node_id, instance, self.region) for node_id, instance in self._status_nodes()]
+
+        rows = []
+        for node_id, instance, region in nodes:
+            if instance:
+                rows.append((str(node_id), instance['InstanceId'], instance['State']['Name'], instance.get('InstanceType', ''), instance.get('PrivateIpAddress', ''), instance.get('ImageId', ''), region))
+            else:
+                rows.append((str(node_id), '', 'missing', '', '', '', region))
+
+        if not self.silent:
+            for row in [('NODE', 'INSTANCE', 'STATE', 'TYPE', 'IP', 'AMI', 'REGION')] + rows:
+                if not self.multi_region:
+                    row = row[:6]
+                print(' '.join(['%-6s %-20s %-14s %-12s %-16s %-22s' % row[:6]] + list(row[6:])).rstrip())
+
+        if timings:
+            self._print_boot_timings([instance for node_id, instance, region in nodes if instance])
+        return rows
+
+    def _status_nodes(self):
         if self.aws.get('asg'):
-            self._create_asg(block_device_map, cloud_init)
+            filters = [{"Name": "tag:aws:autoscaling:groupName", "Values": [self.cluster_name]}]
+            instances = self._describe_instances_by_filters(filters)
+            return [(instance.get('PrivateIpAddress', instance['InstanceId']), instance) for instance in instances.values()]
+
+        instances = self._node_instances()
+        nodes = [(node['id'], instances.get(str(node['id']))) for node in self.nodes]
+        for node_id, instance in nodes:
+            if instance and instance['State']['Name'] in LIVE_INSTANCE_STATES:
+                self._journal_instance(node_id, instance)
+        return nodes
+
+    def _print_boot_timings(self, instances):
+        boot_timings_config = self.config_data.get('boot_timings')
+        if isinstance(boot_timings_config, dict) and boot_timings_config.get('endpoint'):
+            print('boot timings are sent to %s and cannot be collected from the instance tags' % boot_timings_config['endpoint'])
+            return
+
+        boot_timings = BootTimings()
+        for instance in instances:
+            boot_timings.add_instance(instance)
+
+        summary = boot_timings.summary()
+        if not summary:
+            print('no boot timings recorded, enable boot_timings in the cluster config')
+            return
+
+        print('')
+        for row in [('PHASE', 'NODES', 'P50', 'P90', 'MAX')] + [(phase, str(count), '%.1fs' % p50, '%.1fs' % p90, '%.1fs' % maximum) for phase, count, p50, p90, maximum in summary]:
+            print('%-20s %-6s %-10s %-10s %s' % row)
+
+    def _node_instances(self):
+        # journaled instances are verified with one call, the rest are found by IP with another
+        journal_nodes = self.journal.nodes()
+        instances = {}
+        journaled = dict((str(node['id']), journal_nodes[str(node['id'])]['instance_id']) for node in self.nodes
+                         if 'instance_id' in journal_nodes.get(str(node['id']), {}))
+        if journaled:
+            described = self._describe_instances_by_filters([{"Name": "instance-id", "Values": list(journaled.values())}])
+            for node_id, instance_id in journaled.items():
+                instance = described.get(instance_id)
+                if instance and instance['State']['Name'] in LIVE_INSTANCE_STATES:
+                    instances[node_id] = instance
+
+        unresolved = [node for node in self.nodes if str(node['id']) not in instances]
+        if unresolved:
+            by_ip = {}
+            described = self._describe_instances_by_filters([{"Name": "private-ip-address", "Values": [node['ip'] for node in unresolved]}])
+            for instance in described.values():
+                ip = instance.get('PrivateIpAddress')
+                # a live instance wins over terminated ones that had the same address
+                if ip not in by_ip or instance['State']['Name'] in LIVE_INSTANCE_STATES:
+                    by_ip[ip] = instance
+            for node in unresolved:
+                instances[str(node['id'])] = by_ip.get(node['ip'])
+        return instances
+
+    def _journal_instance(self, node_id, instance):
+        volumes = {}
+        for mapping in instance.get('BlockDeviceMappings', []):
+            if 'VolumeId' in mapping.get('Ebs', {}):
+                volumes[mapping['DeviceName']] = mapping['Ebs']['VolumeId']
+        self.journal.record_node(node_id, instance_id=instance['InstanceId'], ip=instance.get('PrivateIpAddress'),
+                                 instance_type=instance.get('InstanceType'), ami=instance.get('ImageId'), volumes=volumes)
+
+    def _describe_instances_by_filters(self, filters):
+        described = {}
+        instances = self._ec2_describe_instances(Filters=filters)
+        for reservation in instances.get('Reservations', []):
+            for instance in reservation.get('Instances', []):
+                described[instance['InstanceId']] = instance
+        return described
+
+    def _restore_config(self, restore_mode):
+        restore_config = self.aws.get('restore', {})
+        if restore_mode is None:
+            restore_mode = restore_config.get('mode', 'lazy')
+        if restore_mode not in ['lazy', 'prewarm', 'fsr']:
+            raise CloudComposeException('Unknown restore mode %s, use lazy, prewarm or fsr' % restore_mode)
+        return restore_mode, int(restore_config.get('timeout', 3600))
+
+    def _prepare_snapshot_restore(self, block_device_map, restore_mode):
+        restore_mode, timeout = self._restore_config(restore_mode)
+        restored_devices = {}
+        for volume_config in block_device_map:
+            snapshot_id = volume_config.get('Ebs', {}).get('SnapshotId')
+            if snapshot_id:
+                restored_devices[snapshot_id] = volume_config['DeviceName']
+
+        if restore_mode == 'lazy' or not restored_devices:
+            return None
+
+        prewarm_snapshots = list(restored_devices.keys())
+        fast_restores = None
+        if restore_mode == 'fsr':
+            controller = EBSController(self.ec2, self.cluster_name, silent=self.silent)
+            availability_zones = self._availability_zones()
+            enabled, prewarm_snapshots = controller.enable_fast_snapshot_restores(list(restored_devices.keys()), availability_zones, timeout)
+            if enabled:
+                fast_restores = (enabled, availability_zones)
+
+        for volume in self.aws['volumes']:
+            if volume.get('snapshot') in prewarm_snapshots:
+                volume['prewarm'] = restored_devices[volume['snapshot']]
+
+        return fast_restores
+
+    def _disable_fast_snapshot_restores(self, snapshot_ids, availability_zones):
+        controller = EBSController(self.ec2, self.cluster_name, silent=self.silent)
+        controller.disable_fast_snapshot_restores(snapshot_ids, availability_zones)
+
+    def _availability_zones(self):
+        if self.aws.get('asg'):
+            subnet_ids = self.aws['asg']['subnets']
         else:
-            self._create_instances(block_device_map, cloud_init)
+            subnet_ids = [node['subnet'] for node in self.nodes]
+
+        return sorted(set(self._subnet_availability_zones(subnet_ids).values()))
+
+    def _subnet_availability_zones(self, subnet_ids):
+        subnet_zones = {}
+        for subnet in self._ec2_describe_subnets(SubnetIds=list(set(subnet_ids))).get('Subnets', []):
+            subnet_zones[subnet['SubnetId']] = subnet['AvailabilityZone']
+        return subnet_zones
+
+    def _wait_for_asg_launches(self, asg_name, timeout=900):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            asg_details = self._describe_asg(asg_name)["AutoScalingGroups"][0]
+            instances = asg_details["Instances"]
+            pending = [instance for instance in instances if instance["LifecycleState"].startswith("Pending")]
+            if len(instances) >= asg_details["DesiredCapacity"] and not pending:
+                return
+            time.sleep(5)
 
     def _parse_localized_time(self, snapshot_time):
         snapshot_time = parse(snapshot_time)
@@ -74,15 +414,29 @@ class CloudController(object):
         snapshot_time = snapshot_time.astimezone(pytz.UTC)
         return snapshot_time
 
-    def down(self, force=False):
+    def down(self, force=False, graceful=False):
+        if self.multi_region:
+            results = self._for_each_region('down', force, graceful)
+            if self._discovery_enabled():
+                self._discovery_controller().deregister([], self._unselected_nodes())
+            return results
+
         if self.aws.get('asg'):
             asg_name = self.cluster_name
             try:
-                self._asg_update_auto_scaling_group(
-                                        AutoScalingGroupName=asg_name,
-                                        MinSize=0,
-                                        MaxSize=0,
-                                        DesiredCapacity=0)
+                if self._asg_capacity().get('scheduled'):
+                    # a scheduled scale out would bring the group back up
+                    self._scaling_controller().delete_scheduled_actions(self._asg_capacity()['scheduled'])
+                if graceful:
+                    lifecycle = self._asg_lifecycle()
+                    self._lifecycle_controller().drain(int(lifecycle.get('drain_batch', DRAIN_BATCH_SIZE)),
+                                                       int(lifecycle.get('drain_timeout', 300)) + 300)
+                else:
+                    self._asg_update_auto_scaling_group(
+                                            AutoScalingGroupName=asg_name,
+                                            MinSize=0,
+                                            MaxSize=0,
+                                            DesiredCapacity=0)
                 if not self.silent:
                     print('auto scaling group %s size is now 0' % asg_name)
             except botocore.exceptions.ClientError as ex:
@@ -93,14 +447,29 @@ class CloudController(object):
                     raise ex
 
         else:
-            ips = [node['ip'] for node in self.aws.get('nodes', [])]
-            instance_ids = self._instance_ids_from_private_ip(ips)
+            instance_ids = [instance['InstanceId'] for instance in self._node_instances().values()
+                            if instance and instance['State']['Name'] in LIVE_INSTANCE_STATES]
             if len(instance_ids) > 0:
                 if force:
                     self._disable_terminate_protection(instance_ids)
                 self._ec2_terminate_instances(InstanceIds=instance_ids)
                 if not self.silent:
                     print('terminated %s' % ','.join(instance_ids))
+            self.journal.remove_nodes([node['id'] for node in self.nodes])
+            if self._discovery_enabled():
+                # with several regions the shared records are removed once all regions are down
+                remaining_nodes = None if len(self.regions()) > 1 else self._unselected_nodes()
+                self._discovery_controller().deregister(self.nodes, remaining_nodes)
+
+    def _unselected_nodes(self):
+        return [node for node in self.aws.get('nodes', []) if not self.node_selection.is_selected(node)]
+
+    def _discovery_enabled(self):
+        # autoscaling groups have no static addresses to publish
+        return bool(self.aws.get('discovery')) and not self.aws.get('asg')
+
+    def _discovery_controller(self):
+        return DiscoveryController(self.aws['discovery'], region=self.region, silent=self.silent)
 
     def _disable_terminate_protection(self, instance_ids):
         for instance_id in instance_ids:
@@ -108,6 +477,9 @@ class CloudController(object):
 
 
     def cleanup(self):
+        if self.multi_region:
+            return self._for_each_region('cleanup')
+
         if self.aws.get('asg'):
             asg_name = self.cluster_name
             asg_details = self._describe_asg(asg_name)
@@ -132,9 +504,159 @@ class CloudController(object):
                 print('cleanup has no effect for non-ASG clusters')
                 print('use cloud-compose cluster down to remove instances')
 
-    def _resolve_ami_name(self, upgrade_image):
+    def snapshot(self, keep=None, hooks=True):
+        if self.multi_region:
+            return self._for_each_region('snapshot', keep, hooks)
+
+        snapshot_config = self.aws.get('snapshots', {})
+        if keep is None:
+            keep = snapshot_config.get('keep')
+
+        instances = self._cluster_instances()
+        if len(instances) == 0:
+            if not self.silent:
+                print('no running instances found for cluster %s' % self.cluster_name)
+            return
+
+        instance_ids = [instance['InstanceId'] for instance in instances]
+        snapshot_set = datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+        controller = EBSController(self.ec2, self.cluster_name, silent=self.silent)
+
+        if hooks:
+            self._run_snapshot_hook('pre_hook', snapshot_config, instance_ids, snapshot_set)
+        try:
+            controller.create_snapshot_sets(instances, self.aws['volumes'], snapshot_set)
+        finally:
+            if hooks:
+                self._run_snapshot_hook('post_hook', snapshot_config, instance_ids, snapshot_set)
+
+        if not self.silent:
+            print('created snapshot set %s for %s' % (snapshot_set, ','.join(instance_ids)))
+
+        if keep:
+            controller.prune_snapshot_sets(int(keep))
+
+    def _run_snapshot_hook(self, hook_name, snapshot_config, instance_ids, snapshot_set):
+        hook = snapshot_config.get(hook_name)
+        if not hook:
+            return
+
+        env = dict(environ)
+        env['CLUSTER_NAME'] = self.cluster_name
+        env['AWS_REGION'] = self.region
+        env['INSTANCE_IDS'] = ','.join(instance_ids)
+        env['SNAPSHOT_SET'] = snapshot_set
+        status = subprocess.call(hook, shell=True, env=env)
+        if status != 0:
+            message = 'snapshot %s failed with exit code %s' % (hook_name, status)
+            if hook_name == 'pre_hook':
+                raise CloudComposeException(message)
+            if not self.silent:
+                print(message)
+
+    def _cluster_instances(self):
+        filters = [
+            {"Name": "instance-state-name", "Values": ["running"]},
+            {"Name": "tag:ClusterName", "Values": [self.cluster_name]}
+        ]
+
+        cluster_instances = []
+        instances = self._ec2_describe_instances(Filters=filters)
+        for reservation in instances.get('Reservations', []):
+            for instance in reservation.get('Instances', []):
+                if 'InstanceId' in instance:
+                    cluster_instances.append(instance)
+
+        return cluster_instances
+
+    def bake(self, cloud_init, force=False):
+        # an unchanged bake script and base image are not baked twice
+        if self.multi_region:
+            return self._for_each_region('bake', cloud_init, force)
+
+        bake_config = self._bake_config()
+        if not bake_config:
+            raise CloudComposeException('Image not baked\naws.bake.name is not configured')
+
+        base_image = self._resolve_base_ami()
+        self.aws['ami'] = base_image
+        self.config_data['_baked'] = False
+        bake_script = self._cloud_init_build(cloud_init, node_id='bake', bake=True)
+        content_hash = hashlib.sha256(('%s\n%s' % (base_image, bake_script)).encode('utf-8')).hexdigest()
+
+        controller = ImageBakeController(self.ec2, self.cluster_name, silent=self.silent)
+        image_id = controller.find_baked_image(bake_config['name'], content_hash)
+        if image_id and not force:
+            if not self.silent:
+                print('skipping bake, %s is up to date as %s' % (bake_config['name'], image_id))
+            return image_id
+
+        instance_args = self._bake_instance_args(bake_config, bake_script)
+        instance_types = bake_config.get('instance_type', self.instance_type_list())
+        if isinstance(instance_types, basestring):
+            instance_types = [instance_types]
+        image_id = controller.bake(bake_config['name'], content_hash, base_image, instance_types, bake_config.get('timeout', 1800), **instance_args)
+        if not self.silent:
+            print('baked %s as %s' % (bake_config['name'], image_id))
+        return image_id
+
+    def _bake_config(self):
+        bake_config = self.aws.get('bake')
+        if isinstance(bake_config, basestring):
+            bake_config = {'name': bake_config}
+        if not bake_config or not bake_config.get('name'):
+            return None
+        return bake_config
+
+    def _bake_instance_args(self, bake_config, bake_script):
+        # only the root volume is baked, data volumes stay per node
+        root_device = self._find_device_from_ami(self.aws['ami'])
+        block_device_map = self._block_device_map(False, None, None)
+        instance_args = {
+            'KeyName': self.aws['keypair'],
+            'SecurityGroupIds': self.security_groups(),
+            'BlockDeviceMappings': [volume_config for volume_config in block_device_map if volume_config['DeviceName'] == root_device],
+            'SubnetId': self._bake_subnet(bake_config),
+            'UserData': bake_script
+        }
+        if self.instance_policy:
+            self._create_instance_policy(self.instance_policy)
+            instance_args['IamInstanceProfile'] = {'Name': self.cluster_name}
+        return instance_args
+
+    def _bake_subnet(self, bake_config):
+        if bake_config.get('subnet'):
+            return bake_config['subnet']
+        if self.nodes:
+            return self.nodes[0]['subnet']
+        if self.aws.get('asg', {}).get('subnets'):
+            return self.aws['asg']['subnets'][0]
+        raise CloudComposeException('Image not baked\nNo subnet found for the builder, set aws.bake.subnet')
+
+    def _is_baked_image(self, image_id):
+        bake_config = self._bake_config()
+        if not bake_config:
+            return False
+        controller = ImageBakeController(self.ec2, self.cluster_name, silent=self.silent)
+        return controller.is_baked_image(image_id, bake_config['name'])
+
+    def _resolve_base_ami(self):
+        # the cluster nodes may run a baked image, so the base only comes from the ami config
         if self.aws['ami'].startswith('ami-'):
             return self.aws['ami']
+        self.aws['ami_name'] = self.aws['ami']
+        try:
+            ami, creation_date = self._find_ami_by_name_tag()
+        except TypeError:
+            raise CloudComposeException('Unable to resolve AMI %s' % self.aws['ami'])
+        if not self.silent:
+            print('ami %s resolves to %s created on %s' % (self.aws['ami_name'], ami, creation_date))
+        return ami
+
+    def _resolve_ami_name(self, upgrade_image):
+        bake_config = self._bake_config()
+        if self.aws['ami'].startswith('ami-') and not bake_config:
+            return self.aws['ami']
         # Set the ami name so we can reference it downstream
         self.aws['ami_name'] = self.aws['ami']
         ami = None
@@ -145,24 +667,34 @@ class CloudController(object):
             if ami:
                 message = 'as used on other cluster nodes'
 
-        if not ami:
+        names = [self.aws['ami']]
+        if bake_config:
+            # baked images are preferred over the image they were baked from
+            names.insert(0, bake_config['name'])
+        for name in names:
+            if ami:
+                break
+            if name.startswith('ami-'):
+                ami, message = name, 'without a baked image'
+                break
             try:
-                ami, creation_date = self._find_ami_by_name_tag()
+                ami, creation_date = self._find_ami_by_name_tag(name)
             except TypeError:
                 creation_date = None
             if ami:
+                self.aws['ami_name'] = name
                 message = 'created on %s' % creation_date
 
         if ami:
             if not self.silent:
-                print('ami %s resolves to %s %s' % (self.aws['ami'], ami, message))
+                print('ami %s resolves to %s %s' % (self.aws['ami_name'], ami, message))
         else:
             raise CloudComposeException('Unable to resolve AMI %s' % self.aws['ami'])
 
         return ami
 
-    def _find_ami_by_name_tag(self):
-        ami = self.aws['ami']
+    def _find_ami_by_name_tag(self, name=None):
+        ami = name or self.aws['ami']
         images = self._ec2_describe_images(Filters=[{'Name': 'tag:Name', 'Values': [ami]}])
 
         for image in sorted(images, reverse=True, key=lambda image: image['CreationDate']):
@@ -185,22 +717,20 @@ class CloudController(object):
     def _block_device_map(self, use_snapshots, snapshot_cluster, snapshot_time):
         controller = EBSController(self.ec2, self.cluster_name, silent=self.silent)
         default_device = self._find_device_from_ami(self.aws['ami'])
-        return controller.block_device_map(self.aws['volumes'], default_device, use_snapshots, snapshot_cluster, snapshot_time)
+        block_device_map = controller.block_device_map(self.aws['volumes'], default_device, use_snapshots, snapshot_cluster, snapshot_time)
 
-    def _instance_ids_from_private_ip(self, ips):
-        instance_ids = []
-        filters = [
-            {"Name": "instance-state-name", "Values": ["running"]},
-            {"Name": "private-ip-address", "Values": ips}
-        ]
-
-        instances = self._ec2_describe_instances(Filters=filters)
-        for reservation in instances.get('Reservations', []):
-            for instance in reservation.get('Instances', []):
-                if 'InstanceId' in instance:
-                    instance_ids.append(instance['InstanceId'])
+        instance_type = self.instance_type_list()[0]
+        if self.aws.get('instance_store'):
+            if not isinstance(self.aws['instance_store'], dict):
+                self.aws['instance_store'] = {}
+            instance_store_map = controller.instance_store_mappings(self.instance_types.instance_store_disks(instance_type), block_device_map)
+            block_device_map.extend(instance_store_map)
+            if not self.instance_types.is_nvme_instance_store(instance_type):
+                self.aws['instance_store']['devices'] = [volume_config['DeviceName'] for volume_config in instance_store_map]
+        for instance_type in self.instance_type_list():
+            self.instance_types.check_ebs_limits(instance_type, self.aws.get('ebs_optimized', False), block_device_map)
 
-        return instance_ids
+        return block_device_map
 
     def security_groups(self):
         security_groups = self.aws['security_groups']
@@ -208,15 +738,29 @@ class CloudController(object):
             security_groups = security_groups.split(',')
         return security_groups
 
+    def instance_type_list(self):
+        instance_types = self.aws.get('instance_type', 't2.medium')
+        if isinstance(instance_types, basestring):
+            instance_types = instance_types.split(',')
+        return [instance_type.strip() for instance_type in instance_types]
+
+    def _capacity_reservation_args(self):
+        capacity_reservation = self.aws.get('capacity_reservation')
+        if not capacity_reservation:
+            return None
+        if capacity_reservation.startswith('cr-'):
+            return {'CapacityReservationTarget': {'CapacityReservationId': capacity_reservation}}
+        return {'CapacityReservationPreference': capacity_reservation}
+
     def _create_instance_args(self, block_device_map):
         ami = self.aws['ami']
         keypair = self.aws['keypair']
         security_groups = self.security_groups()
-        instance_type = self.aws.get('instance_type', 't2.medium')
+        instance_type = self.instance_type_list()[0]
         terminate_protection = self.aws.get('terminate_protection', True)
         detailed_monitoring = self.aws.get('detailed_monitoring', False)
         ebs_optimized = self.aws.get('ebs_optimized', False)
-        return {
+        instance_args = {
             'ImageId': ami,
             'MinCount': 1,
             'MaxCount': 1,
@@ -229,10 +773,17 @@ class CloudController(object):
             'EbsOptimized': ebs_optimized
         }
 
+        capacity_reservation = self._capacity_reservation_args()
+        if capacity_reservation:
+            instance_args['CapacityReservationSpecification'] = capacity_reservation
+
+        return instance_args
+
     def _create_asg_args(self, block_device_map, cloud_init):
         asg_name      = self.cluster_name
         subnet_list   = self.aws['asg']['subnets']
         elb_list   = self.aws['asg'].get('elbs', [])
+        target_group_list = self._target_group_arns(self.aws['asg'].get('target_groups', []))
         vpc_zones     = ', '.join(subnet_list)
         cluster_size  = len(subnet_list)
         redundancy    = self.aws['asg'].get('redundancy', 1)
@@ -242,17 +793,30 @@ class CloudController(object):
         tags['Name'] = self.cluster_name
         instance_tags = self._build_instance_tags(tags)
 
-        return {
+        min_size, max_size, desired = self._scaling_controller().capacity(self._asg_capacity(), cluster_size * redundancy)
+
+        kwargs = {
             'AutoScalingGroupName': asg_name,
             'LaunchConfigurationName': lc_name,
-            'MinSize': cluster_size * redundancy,
-            'MaxSize': cluster_size * redundancy,
-            'DesiredCapacity': cluster_size * redundancy,
+            'MinSize': min_size,
+            'MaxSize': max_size,
+            'DesiredCapacity': desired,
             'LoadBalancerNames': elb_list,
+            'TargetGroupARNs': target_group_list,
             'VPCZoneIdentifier': vpc_zones,
             'TerminationPolicies': term_policies,
             'Tags': instance_tags
         }
+        hooks = self._lifecycle_controller().hook_specifications(self._asg_lifecycle())
+        if hooks:
+            # the hooks have to exist before the first instances launch
+            kwargs['LifecycleHookSpecificationList'] = hooks
+        return kwargs
+
+    def _target_group_arns(self, target_groups):
+        if isinstance(target_groups, basestring):
+            target_groups = target_groups.split(',')
+        return [target_group['arn'] if isinstance(target_group, dict) else target_group.strip() for target_group in target_groups]
 
     def _create_asg(self, block_device_map, cloud_init):
         kwargs = self._create_asg_args(block_device_map, cloud_init)
@@ -260,6 +824,24 @@ class CloudController(object):
             self._asg_create(**kwargs)
         except botocore.exceptions.ClientError as ex:
             raise ex
+        self._scaling_controller().reconcile(self._asg_capacity())
+        self._lifecycle_controller().reconcile(self._asg_lifecycle())
+
+    def _asg_capacity(self):
+        return self.aws['asg'].get('capacity') or {}
+
+    def _asg_lifecycle(self):
+        lifecycle = self.aws['asg'].get('lifecycle')
+        if lifecycle in [None, False]:
+            # no hooks, existing ones are removed
+            return {'terminate': False}
+        return lifecycle if isinstance(lifecycle, dict) else {}
+
+    def _lifecycle_controller(self):
+        return LifecycleController(self.asg, self.cluster_name, silent=self.silent)
+
+    def _scaling_controller(self):
+        return ScalingController(self.asg, self.cluster_name, silent=self.silent)
 
     def _create_instances(self, block_device_map, cloud_init):
         instances = {}
@@ -268,26 +850,28 @@ class CloudController(object):
             self._create_instance_policy(self.instance_policy)
             kwargs['IamInstanceProfile'] = {'Name': self.cluster_name}
 
-        for node in self.aws.get("nodes", []):
+        nodes = self.nodes
+        if self.resume:
+            nodes = self._unfinished_nodes(nodes, instances)
+        subnet_zones = {}
+        if len(self.instance_type_list()) > 1 and nodes:
+            subnet_zones = self._subnet_availability_zones([node['subnet'] for node in nodes])
+
+        for node in nodes:
             private_ip = node["ip"]
             kwargs['SubnetId'] = node["subnet"]
             kwargs['PrivateIpAddress'] = private_ip
 
             if cloud_init:
                 kwargs['UserData'] = self._cloud_init_build(cloud_init, node_id=node['id'])
+            kwargs['TagSpecifications'] = self._tag_specifications(node['id'])
 
-            max_retries = 6
-            retries = 0
-            while retries < max_retries:
-                retries += 1
-                try:
-                    instance_id, created = self._ec2_run_instances(private_ip, **kwargs)
-                    if instance_id:
-                        instances[node['id']] = (instance_id, private_ip, created, node.get("eip"), self.aws.get("source_dest_check", True))
-                    break
-                except botocore.exceptions.ClientError as ex:
-                    if not self.silent:
-                        print(ex.response["Error"]["Message"])
+            instance = self._run_node_instance(node, subnet_zones.get(node['subnet']), **kwargs)
+            if instance:
+                instance_id, created, instance_type = instance
+                instances[node['id']] = (instance_id, private_ip, created, node.get("eip"), self.aws.get("source_dest_check", True), instance_type)
+                self.journal.record_node(node['id'], instance_id=instance_id, ip=private_ip, instance_type=instance_type,
+                                         ami=self.aws['ami'], status='launched')
 
         for node_id, instance_data in instances.items():
             instance_id = instance_data[0]
@@ -295,18 +879,118 @@ class CloudController(object):
             created = instance_data[2]
             elastic_ip = instance_data[3]
             source_dest_check = instance_data[4]
+            instance_type = instance_data[5]
 
             instance_name = "%s-%s" % (self.cluster_name, node_id)
-            self._tag_instance(self.aws.get("tags", {}), node_id, instance_id)
+            if not created:
+                # nodes launched before keep their tags up to date
+                self._tag_instance(self.aws.get("tags", {}), node_id, instance_id)
             if elastic_ip:
                 self._associate_eip(instance_id, elastic_ip)
             if not source_dest_check:
                 self._disable_source_dest_check(instance_id)
-            prefix = 'skipping'
-            if created:
-                prefix = 'created'
+            self.journal.record_node(node_id, status='ready')
             if not self.silent:
-                print("%s %s %s (%s)" % (prefix, instance_id, instance_name, private_ip))
+                if created:
+                    print("created %s %s (%s) as %s" % (instance_id, instance_name, private_ip, instance_type))
+                else:
+                    print("skipping %s %s (%s)" % (instance_id, instance_name, private_ip))
+
+        created_ids = [instance_data[0] for instance_data in instances.values() if instance_data[2]]
+        if created_ids:
+            self._tag_volume_devices(created_ids, block_device_map)
+
+        return instances
+
+    def _unfinished_nodes(self, nodes, instances):
+        # launched but unconfigured nodes are added to instances so only their remaining steps run
+        node_instances = self._node_instances()
+        journal_nodes = self.journal.nodes()
+        unfinished = []
+        for node in nodes:
+            instance = node_instances.get(str(node['id']))
+            journal_node = journal_nodes.get(str(node['id']), {})
+            if not instance or instance['State']['Name'] not in LIVE_INSTANCE_STATES:
+                unfinished.append(node)
+            elif journal_node.get('instance_id') != instance['InstanceId'] or journal_node.get('status') == 'launched':
+                # an instance found by its address has not been through the remaining steps
+                self._journal_instance(node['id'], instance)
+                instances[node['id']] = (instance['InstanceId'], node['ip'], False, node.get("eip"), self.aws.get("source_dest_check", True), instance.get('InstanceType'))
+            elif not self.silent:
+                print("skipping %s %s-%s (%s)" % (instance['InstanceId'], self.cluster_name, node['id'], node['ip']))
+        return unfinished
+
+    def _run_node_instance(self, node, availability_zone, **kwargs):
+        # instance types without capacity are skipped for the rest of the run in the zone
+        unavailable = self.unavailable_instance_types.setdefault(availability_zone, set())
+        for instance_type in self.instance_type_list():
+            if instance_type in unavailable:
+                continue
+            kwargs['InstanceType'] = instance_type
+
+            max_retries = 6
+            retries = 0
+            while retries < max_retries:
+                retries += 1
+                try:
+                    instance_id, created = self._launch_node(node, **kwargs)
+                    if instance_id:
+                        return instance_id, created, instance_type
+                    return None
+                except botocore.exceptions.ClientError as ex:
+                    if not self.silent:
+                        print(ex.response["Error"]["Message"])
+                    if ex.response["Error"]["Code"] in CAPACITY_ERROR_CODES:
+                        unavailable.add(instance_type)
+                        break
+
+            if instance_type not in unavailable:
+                return None
+
+        if not self.silent:
+            print('unable to create node %s, no capacity for %s' % (node['id'], ','.join(self.instance_type_list())))
+        return None
+
+    def _launch_node(self, node, **kwargs):
+        # a retried or repeated launch with the same ClientToken returns the instance it created
+        generation = self.journal.token_generation(node['id'])
+        if not generation:
+            # the journal may be lost, EC2 still knows the recently used tokens
+            generation = self._discovered_token_generation(node['id'], kwargs)
+        for attempt in range(MAX_TOKEN_GENERATIONS):
+            kwargs['ClientToken'] = self._client_token(node['id'], generation, kwargs)
+            try:
+                instance, created = self._ec2_run_instances(node['ip'], **kwargs)
+            except botocore.exceptions.ClientError as ex:
+                if ex.response["Error"]["Code"] != "IdempotentParameterMismatch":
+                    raise ex
+                instance = None
+            if instance and instance.get('State', {}).get('Name') not in ['shutting-down', 'terminated']:
+                return instance['InstanceId'], created
+            generation += 1
+            self.journal.record_token_generation(node['id'], generation)
+
+        # every generation is taken, a fresh token is still retried safely within this launch
+        kwargs['ClientToken'] = uuid.uuid4().hex
+        instance, created = self._ec2_run_instances(node['ip'], **kwargs)
+        return instance['InstanceId'], created
+
+    def _discovered_token_generation(self, node_id, launch_args):
+        tokens = dict((self._client_token(node_id, generation, launch_args), generation) for generation in range(MAX_TOKEN_GENERATIONS))
+        instances = self._describe_instances_by_filters([{'Name': 'client-token', 'Values': list(tokens)}]).values()
+        generation = 0
+        for instance in instances:
+            instance_generation = tokens.get(instance.get('ClientToken'), 0)
+            if instance.get('State', {}).get('Name') in ['shutting-down', 'terminated']:
+                instance_generation += 1
+            generation = max(generation, instance_generation)
+        return generation
+
+    def _client_token(self, node_id, generation, launch_args):
+        launch_args = dict((key, value) for key, value in launch_args.items() if key != 'ClientToken')
+        args_hash = hashlib.sha256(json.dumps(launch_args, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        # client tokens are limited to 64 characters
+        return hashlib.sha256(('%s:%s:%s:%s' % (self.cluster_name, node_id, args_hash, generation)).encode('utf-8')).hexdigest()
 
     def _disable_source_dest_check(self, instance_id):
         self._wait_for_running(instance_id)
@@ -346,6 +1030,9 @@ class CloudController(object):
 
     def _cloud_init_build(self, cloud_init, **kwargs):
         cloud_init_script = cloud_init.build(self.config_data, **kwargs)
+        if cloud_init.docker_compose_sizes and not self.silent:
+            original_size, minified_size = cloud_init.docker_compose_sizes
+            print('node %s docker compose %s -> %s bytes (%s saved)' % (kwargs.get('node_id'), original_size, minified_size, original_size - minified_size))
         if len(cloud_init_script) > MAX_CLOUD_INIT_LENGTH:
             output = BytesIO()
             with GzipFile(mode='wb', fileobj=output) as gzfile:
@@ -354,22 +1041,77 @@ class CloudController(object):
         return cloud_init_script
 
     def _create_instance_policy(self, instance_policy):
+        if self._resumed_step('instance_policy'):
+            return
         controller = InstancePolicyController(self.cluster_name)
         controller.create_instance_policy(instance_policy)
+        self.journal.step_done('instance_policy')
 
-    def _create_log_group(self, log_group, log_retention):
-        controller = LogsController()
-        controller.create_log_group(log_group, log_retention)
+    def _create_log_groups(self, log_groups):
+        controller = LogsController(self.region)
+        changed = controller.create_log_groups(log_groups)
+        if not self.silent and changed:
+            print('updated log groups %s' % ', '.join(changed))
 
     def _tag_instance(self, tags, node_id, instance_id):
-        tags['Name'] = '%s-%s' % (self.cluster_name, node_id)
+        tags = dict(tags, Name='%s-%s' % (self.cluster_name, node_id))
         instance_tags = self._build_instance_tags(tags)
         self._ec2_create_tags(Resources=[instance_id], Tags=instance_tags)
 
-        #NodeId tag is no longer set, this will remove it for existing clusters
-        #This code can be removed in the next release
-        remove_tags = [{'Key': 'NodeId'}]
-        self._ec2_delete_tags(Resources=[instance_id], Tags=remove_tags)
+    def _tag_specifications(self, node_id):
+        tags = self._build_instance_tags(dict(self.aws.get("tags", {}), Name='%s-%s' % (self.cluster_name, node_id)))
+        return [
+            {'ResourceType': 'instance', 'Tags': tags},
+            {'ResourceType': 'volume', 'Tags': tags}
+        ]
+
+    def _tag_volume_devices(self, instance_ids, block_device_map, attempts=10):
+        # one DeviceName tagging call per device, volumes can take a moment to show up
+        expected_devices = len([volume_config for volume_config in block_device_map if 'Ebs' in volume_config])
+        instances = {}
+        pending_ids = list(instance_ids)
+        for attempt in range(attempts):
+            described = self._describe_instances_by_filters([{'Name': 'instance-id', 'Values': pending_ids}])
+            instances.update(described)
+            # only the instances that are still missing volumes are described again
+            pending_ids = [instance_id for instance_id in pending_ids
+                           if len(described.get(instance_id, {}).get('BlockDeviceMappings', [])) < expected_devices]
+            if not pending_ids or attempt == attempts - 1:
+                break
+            sleep(2)
+        EBSController(self.ec2, self.cluster_name, silent=self.silent).tag_volume_devices(list(instances.values()))
+
+    def migrate_tags(self):
+        # removes the legacy NodeId tag and tags the volumes, batched across the cluster
+        if self.multi_region:
+            return self._for_each_region('migrate_tags')
+
+        instances = self._describe_instances_by_filters([
+            {'Name': 'tag:ClusterName', 'Values': [self.cluster_name]},
+            {'Name': 'instance-state-name', 'Values': ['pending', 'running', 'stopping', 'stopped']}
+        ])
+        legacy_ids = [instance_id for instance_id, instance in instances.items()
+                      if any(tag['Key'] == 'NodeId' for tag in instance.get('Tags', []))]
+        for index in range(0, len(legacy_ids), MAX_TAG_RESOURCES):
+            self._ec2_delete_tags(Resources=legacy_ids[index:index + MAX_TAG_RESOURCES], Tags=[{'Key': 'NodeId'}])
+
+        volumes_by_name = {}
+        for instance in instances.values():
+            name = self._find_instance_name(instance)
+            volume_ids = [mapping['Ebs']['VolumeId'] for mapping in instance.get('BlockDeviceMappings', []) if 'Ebs' in mapping]
+            volumes_by_name.setdefault(name, []).extend(volume_ids)
+        for name, volume_ids in volumes_by_name.items():
+            tags = dict(self.aws.get("tags", {}))
+            if name:
+                tags['Name'] = name
+            tags = self._build_instance_tags(tags)
+            for index in range(0, len(volume_ids), MAX_TAG_RESOURCES):
+                self._ec2_create_tags(Resources=volume_ids[index:index + MAX_TAG_RESOURCES], Tags=tags)
+        EBSController(self.ec2, self.cluster_name, silent=self.silent).tag_volume_devices(list(instances.values()))
+
+        if not self.silent:
+            print('removed NodeId from %s instances and tagged the volumes of %s instances' % (len(legacy_ids), len(instances)))
+        return legacy_ids
 
     def _build_instance_tags(self, tags):
         instance_tags = [
@@ -396,7 +1138,9 @@ class CloudController(object):
         if cloud_init:
             cloud_init_script = self._cloud_init_build(cloud_init, node_id=cluster_name)
 
-        instance_type = self.aws.get('instance_type', None)
+        instance_type = None
+        if self.aws.get('instance_type'):
+            instance_type = self.instance_type_list()[0]
 
         if not instance_type:
             existing_instance_type = self._existing_instance_type_from_asg(self.cluster_name)
@@ -436,8 +1180,12 @@ class CloudController(object):
         return None
 
     def _build_launch_config(self, block_device_map, cloud_init):
+        if self._resumed_step('launch_configuration'):
+            return self.journal.get('launch_configuration')
+
         kwargs = self._launch_config_args(block_device_map, cloud_init)
         self._create_launch_configs(**kwargs)
+        self.journal.step_done('launch_configuration', launch_configuration=kwargs['LaunchConfigurationName'])
 
         return kwargs['LaunchConfigurationName']
 
@@ -463,20 +1211,19 @@ class CloudController(object):
     @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
     def _ec2_run_instances(self, private_ip, **kwargs):
         try:
-            response = self.ec2.run_instances(**kwargs)
-            return response['Instances'][0]['InstanceId'], True
+            instance = self.ec2.run_instances(**kwargs)['Instances'][0]
+            # a repeated ClientToken returns the instance launched before
+            return instance, instance.get('State', {}).get('Name', 'pending') == 'pending'
         except botocore.exceptions.ClientError as ex:
             if ex.response["Error"]["Code"] == "InvalidIPAddress.InUse":
+                # nodes launched without this token, or with other launch arguments
                 instance = self._find_existing_instance(private_ip)
                 if instance:
-                    instance_name = self._find_instance_name(instance)
-                    instance_id = instance['InstanceId']
-                    return instance_id, False
+                    return instance, False
                 else:
                     if not self.silent:
                         print('%s in use but not by an instance' % private_ip)
             raise ex
-        return None, False
 
     def _find_instance_name(self, instance):
         instance_name = ''
@@ -501,10 +1248,21 @@ class CloudController(object):
 
     def _asg_update(self, **kwargs):
         tags = kwargs.get('Tags', [])
+        # the desired capacity is left to the scheduled actions and policies
+        group = self._describe_asg(kwargs['AutoScalingGroupName'])["AutoScalingGroups"][0]
+        capacity_args = self._scaling_controller().update_args(group, kwargs['MinSize'], kwargs['MaxSize'])
         self._asg_update_auto_scaling_group(
             AutoScalingGroupName=kwargs['AutoScalingGroupName'],
             LaunchConfigurationName=kwargs['LaunchConfigurationName'],
-            VPCZoneIdentifier=kwargs['VPCZoneIdentifier'])
+            VPCZoneIdentifier=kwargs['VPCZoneIdentifier'],
+            **capacity_args)
+        if not self.silent and capacity_args:
+            print('updated auto scaling group %s capacity %s' % (self.cluster_name, ', '.join('%s=%s' % item for item in sorted(capacity_args.items()))))
+
+        if kwargs.get('TargetGroupARNs'):
+            self._asg_attach_load_balancer_target_groups(
+                AutoScalingGroupName=kwargs['AutoScalingGroupName'],
+                TargetGroupARNs=kwargs['TargetGroupARNs'])
 
         asg_tags = []
         for tag in tags:
@@ -538,6 +1296,10 @@ class CloudController(object):
     def _asg_update_auto_scaling_group(self, **kwargs):
         return self.asg.update_auto_scaling_group(**kwargs)
 
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _asg_attach_load_balancer_target_groups(self, **kwargs):
+        return self.asg.attach_load_balancer_target_groups(**kwargs)
+
     @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
     def _asg_create_auto_scaling_group(self, **kwargs):
         return self.asg.create_auto_scaling_group(**kwargs)
@@ -598,6 +1360,10 @@ class CloudController(object):
     def _ec2_modify_instance_attribute(self, **kwargs):
         return self.ec2.modify_instance_attribute(**kwargs)
 
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _ec2_describe_subnets(self, **kwargs):
+        return self.ec2.describe_subnets(**kwargs)
+
     @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
     def _ec2_associate_address(self, **kwargs):
         return self.ec2.associate_address(**kwargs)
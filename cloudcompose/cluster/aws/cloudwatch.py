@@ -4,26 +4,68 @@ import boto3
 from cloudcompose.util import require_env_var
 from retrying import retry
 from os import environ
+from os.path import commonprefix
 
 class LogsController(object):
-    def __init__(self):
-        self.logs = self._get_logs_client()
+    def __init__(self, region=None, logs_client=None):
+        self.region = region or environ.get('AWS_REGION', 'us-east-1')
+        self.logs = logs_client or self._get_logs_client()
 
     def _get_logs_client(self):
-        return boto3.client('logs', region_name=environ.get('AWS_REGION', 'us-east-1'))
+        return boto3.client('logs', region_name=self.region)
 
     def create_log_group(self, log_group, log_retention):
         if not log_retention:
             #default to 30 days if not set
             log_retention = 30
 
-        self._logs_create_log_group(logGroupName=log_group)
-        self._logs_put_retention_policy(logGroupName=log_group, retentionInDays=int(log_retention))
+        return self.create_log_groups({log_group: log_retention})
+
+    def create_log_groups(self, log_groups):
+        # only missing groups and changed retentions cause calls after the listing
+        existing = self._existing_log_groups(list(log_groups))
+        changed = []
+        for log_group, log_retention in sorted(log_groups.items()):
+            if log_group not in existing:
+                self._logs_create_log_group(logGroupName=log_group)
+            elif existing[log_group].get('retentionInDays') == int(log_retention):
+                continue
+            self._logs_put_retention_policy(logGroupName=log_group, retentionInDays=int(log_retention))
+            changed.append(log_group)
+        return changed
+
+    def _existing_log_groups(self, names):
+        existing = {}
+        for prefix in self._listing_prefixes(names):
+            kwargs = {'logGroupNamePrefix': prefix}
+            while True:
+                page = self._logs_describe_log_groups(**kwargs)
+                for log_group in page.get('logGroups', []):
+                    if log_group['logGroupName'] in names:
+                        existing[log_group['logGroupName']] = log_group
+                if not page.get('nextToken'):
+                    break
+                kwargs['nextToken'] = page['nextToken']
+        return existing
+
+    def _listing_prefixes(self, names):
+        if len(names) > 1:
+            # list whole name segments, e.g. test- for test-web and test-worker
+            prefix = commonprefix(names)
+            prefix = prefix[:max(prefix.rfind(separator) for separator in '/-_.') + 1]
+            if prefix.strip('/'):
+                return [prefix]
+        # without a shared prefix a listing would page through every log group of the account
+        return sorted(names)
 
     def _is_retryable_exception(exception):
         return not isinstance(exception, botocore.exceptions.ClientError) or \
            exception.response["Error"]["Code"] != "ResourceAlreadyExistsException"
 
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _logs_describe_log_groups(self, **kwargs):
+        return self.logs.describe_log_groups(**kwargs)
+
     @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
     def _logs_create_log_group(self, **kwargs):
         try:
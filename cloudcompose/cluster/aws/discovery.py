@@ -0,0 +1,119 @@
+from __future__ import print_function
+from builtins import object
+import boto3
+import botocore
+from retrying import retry
+from os import environ
+
+MAX_CHANGES_PER_BATCH = 1000
+
+# publishes the node addresses as private DNS records or as a hosts file in S3
+class DiscoveryController(object):
+    def __init__(self, discovery, region=None, silent=False, route53_client=None, s3_client=None):
+        self.discovery = discovery
+        self.region = region or environ.get('AWS_REGION', 'us-east-1')
+        self.silent = silent
+        self.prefix = discovery.get('prefix', 'node')
+        self.route53 = route53_client
+        self.s3 = s3_client
+        if discovery.get('zone_id') and not self.route53:
+            self.route53 = boto3.client('route53', region_name=self.region)
+        if discovery.get('hosts') and not self.s3:
+            self.s3 = boto3.client('s3', region_name=self.region)
+
+    def register(self, nodes, all_nodes):
+        if self.discovery.get('zone_id'):
+            changes = [self._change('UPSERT', self.record_name(node), [node['ip']]) for node in nodes]
+            changes.append(self._change('UPSERT', self.shared_record_name(), [node['ip'] for node in all_nodes]))
+            self._change_records(changes)
+        if self.discovery.get('hosts'):
+            bucket, key = self._s3_location()
+            self._s3_put_object(Bucket=bucket, Key=key, Body=self.hosts_file(all_nodes).encode('utf-8'))
+        if not self.silent:
+            print('registered %s nodes for discovery' % len(nodes))
+
+    def deregister(self, nodes, remaining_nodes=None):
+        # remaining_nodes=None leaves the shared records alone, [] deletes them
+        if self.discovery.get('zone_id'):
+            names = set(self._fqdn(self.record_name(node)) for node in nodes)
+            shared_name = self._fqdn(self.shared_record_name())
+            if remaining_nodes is not None and not remaining_nodes:
+                names.add(shared_name)
+            changes = [{'Action': 'DELETE', 'ResourceRecordSet': record} for record in self._existing_records(names)]
+            if remaining_nodes:
+                changes.append(self._change('UPSERT', self.shared_record_name(), [node['ip'] for node in remaining_nodes]))
+            self._change_records(changes)
+        if self.discovery.get('hosts') and remaining_nodes is not None:
+            bucket, key = self._s3_location()
+            if remaining_nodes:
+                self._s3_put_object(Bucket=bucket, Key=key, Body=self.hosts_file(remaining_nodes).encode('utf-8'))
+            else:
+                self._s3_delete_object(Bucket=bucket, Key=key)
+
+    def record_name(self, node):
+        return '%s%s.%s' % (self.prefix, node['id'], self.discovery['domain'])
+
+    def shared_record_name(self):
+        return '%ss.%s' % (self.prefix, self.discovery['domain'])
+
+    def hosts_file(self, nodes):
+        lines = []
+        for node in nodes:
+            names = ['%s%s' % (self.prefix, node['id'])]
+            if self.discovery.get('domain'):
+                names.insert(0, self.record_name(node))
+            lines.append('%s %s' % (node['ip'], ' '.join(names)))
+        return '\n'.join(lines) + '\n'
+
+    def _change(self, action, name, ips):
+        return {
+            'Action': action,
+            'ResourceRecordSet': {
+                'Name': name,
+                'Type': 'A',
+                'TTL': int(self.discovery.get('ttl', 60)),
+                'ResourceRecords': [{'Value': ip} for ip in ips]
+            }
+        }
+
+    def _change_records(self, changes):
+        for index in range(0, len(changes), MAX_CHANGES_PER_BATCH):
+            self._route53_change_resource_record_sets(
+                HostedZoneId=self.discovery['zone_id'],
+                ChangeBatch={'Comment': 'cloud-compose discovery', 'Changes': changes[index:index + MAX_CHANGES_PER_BATCH]})
+
+    def _existing_records(self, names):
+        # records are listed by reversed labels, so everything below the domain comes in one pass
+        domain = self._fqdn(self.discovery['domain'])
+        records = []
+        paginator = self.route53.get_paginator('list_resource_record_sets')
+        for page in paginator.paginate(HostedZoneId=self.discovery['zone_id'], StartRecordName=domain):
+            for record in page.get('ResourceRecordSets', []):
+                if record['Name'] != domain and not record['Name'].endswith('.' + domain):
+                    return records
+                if record['Name'] in names and record['Type'] == 'A':
+                    records.append(record)
+        return records
+
+    def _fqdn(self, name):
+        return name if name.endswith('.') else name + '.'
+
+    def _s3_location(self):
+        bucket, _, key = self.discovery['hosts'].replace('s3://', '', 1).partition('/')
+        return bucket, key
+
+    def _is_retryable_exception(exception):
+        return not isinstance(exception, botocore.exceptions.ClientError) or \
+            exception.response["Error"]["Code"] in ['PriorRequestNotComplete', 'Throttling']
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=30000, wait_exponential_multiplier=500, wait_exponential_max=5000)
+    def _route53_change_resource_record_sets(self, **kwargs):
+        return self.route53.change_resource_record_sets(**kwargs)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _s3_put_object(self, **kwargs):
+        return self.s3.put_object(**kwargs)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _s3_delete_object(self, **kwargs):
+        return self.s3.delete_object(**kwargs)
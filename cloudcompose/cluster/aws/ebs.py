@@ -5,8 +5,16 @@ from past.utils import old_div
 import boto3
 import botocore
 from cloudcompose.exceptions import CloudComposeException
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep, time
 
 from retrying import retry
+
+FAST_SNAPSHOT_RESTORE_POLL_INTERVAL = 15
+MAX_SNAPSHOT_WORKERS = 10
+SNAPSHOT_DELETE_BATCH_SIZE = 20
+MAX_TAG_RESOURCES = 1000
+
 class EBSController(object):
     def __init__(self, ec2, cluster_name, silent=False):
         self.ec2 = ec2
@@ -16,13 +24,193 @@ class EBSController(object):
     def block_device_map(self, volumes, default_device, use_snapshots, snapshot_cluster=None, snapshot_time=None):
         block_device_map = []
         for volume in volumes:
-            file_system = volume.get('file_system')
-            if file_system and file_system.lower() in ['nfs', 'nfs4']:
+            if self._is_nfs_volume(volume):
                 continue
             block_device_map.append(self._create_volume_config(volume, default_device, use_snapshots, snapshot_cluster, snapshot_time))
 
         return block_device_map
 
+    def instance_store_mappings(self, disk_count, block_device_map):
+        # maps the unlisted instance store disks onto the next free /dev/xvd* devices
+        used_devices = set(volume_config['DeviceName'] for volume_config in block_device_map)
+        used_names = set(volume_config['VirtualName'] for volume_config in block_device_map if 'VirtualName' in volume_config)
+        free_devices = ['/dev/xvd%s' % letter for letter in 'bcdefghijklmnopqrstuvwxy' if '/dev/xvd%s' % letter not in used_devices]
+
+        mappings = []
+        for index in range(disk_count):
+            virtual_name = 'ephemeral%s' % index
+            if virtual_name in used_names or not free_devices:
+                continue
+            mappings.append({
+                "DeviceName": free_devices.pop(0),
+                "VirtualName": virtual_name
+            })
+        return mappings
+
+    def snapshot_devices(self, volumes, default_device):
+        devices = []
+        for volume in volumes:
+            if self._is_nfs_volume(volume) or volume.get('ephemeral', False):
+                continue
+            devices.append(volume.get('block', default_device))
+        return devices
+
+    def create_snapshot_sets(self, instances, volumes, snapshot_set):
+        # one crash-consistent multi-volume snapshot per instance, all tagged with the snapshot set
+        if not instances:
+            return []
+
+        workers = min(len(instances), MAX_SNAPSHOT_WORKERS)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda instance: self._create_instance_snapshots(instance, volumes, snapshot_set), instances))
+
+        snapshots_by_device = {}
+        for snapshots in results:
+            for snapshot_id, device in snapshots:
+                snapshots_by_device.setdefault(device, []).append(snapshot_id)
+
+        for device, snapshot_ids in snapshots_by_device.items():
+            self._ec2_create_tags(Resources=snapshot_ids, Tags=[{'Key': 'DeviceName', 'Value': device}])
+
+        return [snapshot for snapshots in results for snapshot in snapshots]
+
+    def tag_volume_devices(self, instances):
+        # one call per device instead of one per volume
+        volumes_by_device = {}
+        for instance in instances:
+            for mapping in instance.get('BlockDeviceMappings', []):
+                if 'Ebs' in mapping:
+                    volumes_by_device.setdefault(mapping['DeviceName'], []).append(mapping['Ebs']['VolumeId'])
+
+        for device, volume_ids in sorted(volumes_by_device.items()):
+            for index in range(0, len(volume_ids), MAX_TAG_RESOURCES):
+                self._ec2_create_tags(Resources=volume_ids[index:index + MAX_TAG_RESOURCES], Tags=[{'Key': 'DeviceName', 'Value': device}])
+        return volumes_by_device
+
+    def _create_instance_snapshots(self, instance, volumes, snapshot_set):
+        instance_id = instance['InstanceId']
+        root_device = instance.get('RootDeviceName')
+        devices = self.snapshot_devices(volumes, root_device)
+
+        volume_devices = {}
+        excluded_volume_ids = []
+        for mapping in instance.get('BlockDeviceMappings', []):
+            volume_id = mapping.get('Ebs', {}).get('VolumeId')
+            if not volume_id:
+                continue
+            if mapping['DeviceName'] in devices:
+                volume_devices[volume_id] = mapping['DeviceName']
+            elif mapping['DeviceName'] != root_device:
+                excluded_volume_ids.append(volume_id)
+
+        if not volume_devices:
+            return []
+
+        instance_specification = {
+            'InstanceId': instance_id,
+            'ExcludeBootVolume': root_device not in volume_devices.values()
+        }
+        if excluded_volume_ids:
+            instance_specification['ExcludeDataVolumeIds'] = excluded_volume_ids
+
+        tags = [
+            {'Key': 'ClusterName', 'Value': self.cluster_name},
+            {'Key': 'SnapshotSet', 'Value': snapshot_set},
+            {'Key': 'Name', 'Value': '%s-%s' % (self.cluster_name, snapshot_set)}
+        ]
+        response = self._ec2_create_snapshots(
+            Description='%s snapshot set %s' % (self.cluster_name, snapshot_set),
+            InstanceSpecification=instance_specification,
+            TagSpecifications=[{'ResourceType': 'snapshot', 'Tags': tags}])
+
+        snapshots = []
+        for snapshot in response.get('Snapshots', []):
+            device = volume_devices.get(snapshot['VolumeId'])
+            if device:
+                snapshots.append((snapshot['SnapshotId'], device))
+                if not self.silent:
+                    print('created snapshot %s of %s %s' % (snapshot['SnapshotId'], instance_id, device))
+        return snapshots
+
+    def prune_snapshot_sets(self, keep):
+        snapshot_sets = {}
+        for snapshot in self._ec2_describe_snapshots(OwnerIds=['self'],
+                                                     Filters=[{"Name": "tag:ClusterName",
+                                                               "Values": [self.cluster_name]},
+                                                              {"Name": "tag-key",
+                                                               "Values": ["SnapshotSet"]}]):
+            for tag in snapshot.get('Tags', []):
+                if tag['Key'] == 'SnapshotSet':
+                    snapshot_sets.setdefault(tag['Value'], []).append(snapshot['SnapshotId'])
+
+        expired_sets = sorted(snapshot_sets.keys(), reverse=True)[keep:]
+        snapshot_ids = [snapshot_id for snapshot_set in expired_sets for snapshot_id in snapshot_sets[snapshot_set]]
+        batches = [snapshot_ids[i:i + SNAPSHOT_DELETE_BATCH_SIZE] for i in range(0, len(snapshot_ids), SNAPSHOT_DELETE_BATCH_SIZE)]
+
+        for batch in batches:
+            with ThreadPoolExecutor(max_workers=MAX_SNAPSHOT_WORKERS) as executor:
+                list(executor.map(self._delete_snapshot, batch))
+
+        if not self.silent and expired_sets:
+            print('deleted snapshot sets %s' % ', '.join(sorted(expired_sets)))
+        return expired_sets
+
+    def _delete_snapshot(self, snapshot_id):
+        try:
+            self._ec2_delete_snapshot(SnapshotId=snapshot_id)
+        except botocore.exceptions.ClientError as ex:
+            if ex.response["Error"]["Code"] != "InvalidSnapshot.InUse":
+                raise ex
+            if not self.silent:
+                print('skipping snapshot %s because it is in use' % snapshot_id)
+
+    def enable_fast_snapshot_restores(self, snapshot_ids, availability_zones, timeout=3600):
+        # returns the snapshots enabled by this call and the ones to prewarm instead
+        states = self._fast_snapshot_restore_states(snapshot_ids)
+        pending = [snapshot_id for snapshot_id in snapshot_ids
+                   if any(states.get((snapshot_id, zone)) != 'enabled' for zone in availability_zones)]
+        if not pending:
+            return [], []
+
+        response = self._ec2_enable_fast_snapshot_restores(AvailabilityZones=availability_zones, SourceSnapshotIds=pending)
+        failed = set()
+        for error in response.get('Unsuccessful', []):
+            failed.add(error['SnapshotId'])
+            if not self.silent:
+                for zone_error in error.get('FastSnapshotRestoreStateErrors', []):
+                    print('unable to enable fast snapshot restore for %s in %s: %s' % (error['SnapshotId'], zone_error.get('AvailabilityZone'), zone_error.get('Error', {}).get('Message')))
+
+        enabled = [snapshot_id for snapshot_id in pending if snapshot_id not in failed]
+        if not self.silent and enabled:
+            print('enabling fast snapshot restore for %s in %s' % (','.join(enabled), ','.join(availability_zones)))
+
+        deadline = time() + timeout
+        waiting = list(enabled)
+        while waiting and time() < deadline:
+            states = self._fast_snapshot_restore_states(waiting)
+            waiting = [snapshot_id for snapshot_id in waiting
+                       if any(states.get((snapshot_id, zone)) != 'enabled' for zone in availability_zones)]
+            if waiting:
+                sleep(FAST_SNAPSHOT_RESTORE_POLL_INTERVAL)
+
+        if not self.silent and waiting:
+            print('fast snapshot restore not enabled for %s after %s seconds' % (','.join(waiting), timeout))
+
+        return enabled, list(failed) + waiting
+
+    def disable_fast_snapshot_restores(self, snapshot_ids, availability_zones):
+        if not snapshot_ids:
+            return
+        self._ec2_disable_fast_snapshot_restores(AvailabilityZones=availability_zones, SourceSnapshotIds=snapshot_ids)
+        if not self.silent:
+            print('disabled fast snapshot restore for %s' % ','.join(snapshot_ids))
+
+    def _fast_snapshot_restore_states(self, snapshot_ids):
+        states = {}
+        for restore in self._ec2_describe_fast_snapshot_restores(Filters=[{"Name": "snapshot-id", "Values": snapshot_ids}]):
+            states[(restore['SnapshotId'], restore['AvailabilityZone'])] = restore['State']
+        return states
+
     def find_latest_snapshot(self, device, snapshot_cluster=None, snapshot_time=None):
         cluster_name = self.cluster_name
         if snapshot_cluster:
@@ -49,8 +237,47 @@ class EBSController(object):
 
     @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
     def _ec2_describe_snapshots(self, **kwargs):
-        response = self.ec2.describe_snapshots(**kwargs)
-        return response.get('Snapshots', [])
+        snapshots = []
+        while True:
+            response = self.ec2.describe_snapshots(**kwargs)
+            snapshots.extend(response.get('Snapshots', []))
+            if not response.get('NextToken'):
+                return snapshots
+            kwargs['NextToken'] = response['NextToken']
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _ec2_describe_fast_snapshot_restores(self, **kwargs):
+        restores = []
+        while True:
+            response = self.ec2.describe_fast_snapshot_restores(**kwargs)
+            restores.extend(response.get('FastSnapshotRestores', []))
+            if not response.get('NextToken'):
+                return restores
+            kwargs['NextToken'] = response['NextToken']
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _ec2_enable_fast_snapshot_restores(self, **kwargs):
+        return self.ec2.enable_fast_snapshot_restores(**kwargs)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _ec2_disable_fast_snapshot_restores(self, **kwargs):
+        return self.ec2.disable_fast_snapshot_restores(**kwargs)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _ec2_create_snapshots(self, **kwargs):
+        return self.ec2.create_snapshots(**kwargs)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _ec2_create_tags(self, **kwargs):
+        return self.ec2.create_tags(**kwargs)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _ec2_delete_snapshot(self, **kwargs):
+        return self.ec2.delete_snapshot(**kwargs)
+
+    def _is_nfs_volume(self, volume):
+        file_system = volume.get('file_system')
+        return file_system and file_system.lower() in ['nfs', 'nfs4']
 
     def _create_volume_config(self, volume, default_device, use_snapshots, snapshot_cluster, snapshot_time):
         if volume.get('ephemeral', False):
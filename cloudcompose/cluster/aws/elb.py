@@ -0,0 +1,79 @@
+from __future__ import print_function
+from builtins import object
+from past.builtins import basestring
+import boto3
+import botocore
+from retrying import retry
+from os import environ
+from time import sleep, time
+
+class TargetGroupController(object):
+    def __init__(self, region=None, silent=False):
+        self.region = region or environ.get('AWS_REGION', 'us-east-1')
+        self.silent = silent
+        self.elbv2 = self._get_elbv2_client()
+
+    def _get_elbv2_client(self):
+        return boto3.client('elbv2', region_name=self.region)
+
+    def register_targets(self, target_groups, instance_ids):
+        for target_group in self._normalize(target_groups):
+            targets = [self._target(target_group, instance_id) for instance_id in instance_ids]
+            self._elbv2_register_targets(TargetGroupArn=target_group['arn'], Targets=targets)
+            if not self.silent:
+                print('registered %s with target group %s' % (','.join(instance_ids), target_group['arn']))
+
+    def wait_healthy(self, target_groups, instance_ids, started, timeout=600):
+        # seconds from started until each instance was healthy in every target group, None on timeout
+        target_groups = self._normalize(target_groups)
+        healthy = dict((instance_id, None) for instance_id in instance_ids)
+        deadline = time() + timeout
+        delay = 2
+
+        while True:
+            states = dict((instance_id, []) for instance_id in instance_ids)
+            for target_group in target_groups:
+                for description in self._elbv2_describe_target_health(TargetGroupArn=target_group['arn']):
+                    instance_id = description['Target']['Id']
+                    if instance_id in states:
+                        states[instance_id].append(description['TargetHealth']['State'])
+
+            now = time()
+            for instance_id, instance_states in states.items():
+                if healthy[instance_id] is None and len(instance_states) >= len(target_groups) and \
+                        all(state == 'healthy' for state in instance_states):
+                    healthy[instance_id] = now - started
+
+            if all(seconds is not None for seconds in healthy.values()) or now >= deadline:
+                return healthy
+
+            sleep(min(delay, max(deadline - now, 0)))
+            delay = min(delay * 1.5, 30)
+
+    def _normalize(self, target_groups):
+        if isinstance(target_groups, basestring):
+            target_groups = target_groups.split(',')
+        normalized = []
+        for target_group in target_groups:
+            if isinstance(target_group, dict):
+                normalized.append(target_group)
+            else:
+                normalized.append({'arn': target_group.strip()})
+        return normalized
+
+    def _target(self, target_group, instance_id):
+        target = {'Id': instance_id}
+        if 'port' in target_group:
+            target['Port'] = int(target_group['port'])
+        return target
+
+    def _is_retryable_exception(exception):
+        return not isinstance(exception, botocore.exceptions.ClientError)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _elbv2_register_targets(self, **kwargs):
+        return self.elbv2.register_targets(**kwargs)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _elbv2_describe_target_health(self, **kwargs):
+        return self.elbv2.describe_target_health(**kwargs).get('TargetHealthDescriptions', [])
@@ -0,0 +1,106 @@
+from __future__ import print_function
+from builtins import object
+import json
+import botocore
+from os import environ, makedirs, rename
+from os.path import join, expanduser, isfile, isdir
+from time import time
+from retrying import retry
+from cloudcompose.exceptions import CloudComposeException
+
+CACHE_DIR = environ.get('CLOUD_COMPOSE_CACHE_DIR', join(expanduser('~'), '.cloud-compose', 'cache'))
+CACHE_TTL = 7 * 24 * 60 * 60
+CAPACITY_ERROR_CODES = ['InsufficientInstanceCapacity', 'Unsupported']
+
+# instance type capabilities from describe_instance_types, cached per region
+class InstanceTypeCatalog(object):
+    def __init__(self, ec2, region=None, cache_dir=CACHE_DIR, silent=False):
+        self.ec2 = ec2
+        self.silent = silent
+        self.region = region or environ.get('AWS_REGION', 'us-east-1')
+        self.cache_dir = cache_dir
+        self.cache_file = join(cache_dir, 'instance-types-%s.json' % self.region)
+        self._instance_types = None
+
+    def describe(self, instance_type):
+        instance_types = self._load_cache()
+        cached = instance_types.get(instance_type)
+        if cached and time() - cached.get('CachedAt', 0) < CACHE_TTL:
+            return cached
+
+        try:
+            response = self._ec2_describe_instance_types(InstanceTypes=[instance_type])
+        except botocore.exceptions.ClientError as ex:
+            if not self.silent:
+                print('unable to describe instance type %s: %s' % (instance_type, ex.response["Error"]["Message"]))
+            return cached
+
+        for info in response.get('InstanceTypes', []):
+            instance_types[info['InstanceType']] = {
+                'CachedAt': time(),
+                'InstanceStorageSupported': info.get('InstanceStorageSupported', False),
+                'InstanceStorageInfo': info.get('InstanceStorageInfo', {}),
+                'EbsInfo': info.get('EbsInfo', {})
+            }
+        self._save_cache(instance_types)
+        return instance_types.get(instance_type)
+
+    def instance_store_disks(self, instance_type):
+        info = self.describe(instance_type)
+        if not info or not info['InstanceStorageSupported']:
+            return 0
+        return sum(disk.get('Count', 0) for disk in info['InstanceStorageInfo'].get('Disks', []))
+
+    def is_nvme_instance_store(self, instance_type):
+        info = self.describe(instance_type)
+        return bool(info) and info['InstanceStorageInfo'].get('NvmeSupport') in ['required', 'supported']
+
+    def check_ebs_limits(self, instance_type, ebs_optimized, block_device_map):
+        info = self.describe(instance_type)
+        if not info:
+            return
+
+        ebs_info = info['EbsInfo']
+        if ebs_optimized and ebs_info.get('EbsOptimizedSupport') == 'unsupported':
+            raise CloudComposeException('Cluster not created\nInstance type %s does not support ebs_optimized' % instance_type)
+
+        max_iops = ebs_info.get('EbsOptimizedInfo', {}).get('MaximumIops')
+        total_iops = sum(self._volume_iops(volume_config['Ebs']) for volume_config in block_device_map if 'Ebs' in volume_config)
+        if max_iops and total_iops > max_iops and not self.silent:
+            print('warning: volumes provision %s IOPS but instance type %s supports at most %s' % (total_iops, instance_type, max_iops))
+
+    def _volume_iops(self, ebs):
+        if 'Iops' in ebs:
+            return ebs['Iops']
+        volume_type = ebs.get('VolumeType', 'gp2')
+        if volume_type == 'gp2':
+            return min(max(ebs.get('VolumeSize', 0) * 3, 100), 16000)
+        if volume_type == 'gp3':
+            return 3000
+        return 0
+
+    def _load_cache(self):
+        if self._instance_types is None:
+            self._instance_types = {}
+            if isfile(self.cache_file):
+                try:
+                    with open(self.cache_file, 'r') as f:
+                        self._instance_types = json.load(f)
+                except ValueError:
+                    pass
+        return self._instance_types
+
+    def _save_cache(self, instance_types):
+        if not isdir(self.cache_dir):
+            makedirs(self.cache_dir)
+        tmp_file = '%s.tmp' % self.cache_file
+        with open(tmp_file, 'w') as f:
+            json.dump(instance_types, f)
+        rename(tmp_file, self.cache_file)
+
+    def _is_retryable_exception(exception):
+        return not isinstance(exception, botocore.exceptions.ClientError)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _ec2_describe_instance_types(self, **kwargs):
+        return self.ec2.describe_instance_types(**kwargs)
@@ -0,0 +1,117 @@
+from __future__ import print_function
+from builtins import object
+import botocore
+from retrying import retry
+from time import sleep, time
+from cloudcompose.exceptions import CloudComposeException
+
+DRAIN_BATCH_SIZE = 50
+DRAIN_POLL_INTERVAL = 5
+TRANSITIONS = {
+    'launch': 'autoscaling:EC2_INSTANCE_LAUNCHING',
+    'terminate': 'autoscaling:EC2_INSTANCE_TERMINATING'
+}
+
+# the drain handler completes the termination hook, the cloud init script the launch hook
+class LifecycleController(object):
+    def __init__(self, asg, asg_name, silent=False):
+        self.asg = asg
+        self.asg_name = asg_name
+        self.silent = silent
+
+    def hook_name(self, hook):
+        return '%s-%s' % (self.asg_name, hook)
+
+    def hook_specifications(self, lifecycle_config):
+        specifications = []
+        if lifecycle_config.get('launch', False):
+            specifications.append({
+                'LifecycleHookName': self.hook_name('launch'),
+                'LifecycleTransition': TRANSITIONS['launch'],
+                'HeartbeatTimeout': int(lifecycle_config.get('launch_timeout', 900)),
+                # a node that never finished its boot is replaced
+                'DefaultResult': 'ABANDON'
+            })
+        if lifecycle_config.get('terminate', True):
+            specifications.append({
+                'LifecycleHookName': self.hook_name('terminate'),
+                'LifecycleTransition': TRANSITIONS['terminate'],
+                'HeartbeatTimeout': int(lifecycle_config.get('drain_timeout', 300)),
+                'DefaultResult': 'CONTINUE'
+            })
+        return specifications
+
+    def reconcile(self, lifecycle_config):
+        existing = dict((hook['LifecycleHookName'], hook) for hook in self._lifecycle_hooks())
+        wanted = self.hook_specifications(lifecycle_config)
+        changed = [hook for hook in wanted if any(existing.get(hook['LifecycleHookName'], {}).get(key) != value for key, value in hook.items())]
+        wanted_names = set(hook['LifecycleHookName'] for hook in wanted)
+        stale = [self.hook_name(hook) for hook in sorted(TRANSITIONS) if self.hook_name(hook) in existing and self.hook_name(hook) not in wanted_names]
+
+        for hook in changed:
+            self._asg_put_lifecycle_hook(AutoScalingGroupName=self.asg_name, **hook)
+        for name in stale:
+            self._asg_delete_lifecycle_hook(AutoScalingGroupName=self.asg_name, LifecycleHookName=name)
+        if not self.silent and (changed or stale):
+            print('updated %s and deleted %s lifecycle hooks of %s' % (len(changed), len(stale), self.asg_name))
+        return changed, stale
+
+    def drain(self, batch_size=DRAIN_BATCH_SIZE, timeout=600):
+        # MaxSize follows every batch so a scaling policy cannot relaunch drained capacity
+        self._asg_update_auto_scaling_group(AutoScalingGroupName=self.asg_name, MinSize=0)
+        drained = 0
+        while True:
+            group = self._describe_group()
+            in_service = [instance for instance in group['Instances'] if not instance['LifecycleState'].startswith('Terminating')]
+            if not in_service:
+                break
+            desired = max(len(in_service) - batch_size, 0)
+            self._asg_update_auto_scaling_group(AutoScalingGroupName=self.asg_name, MaxSize=desired, DesiredCapacity=desired)
+            if not self.silent:
+                print('draining %s instances of %s' % (len(in_service) - desired, self.asg_name))
+            self._wait_for_size(desired, timeout)
+            drained += len(in_service) - desired
+
+        self._asg_update_auto_scaling_group(AutoScalingGroupName=self.asg_name, MinSize=0, MaxSize=0, DesiredCapacity=0)
+        return drained
+
+    def _wait_for_size(self, size, timeout):
+        deadline = time() + timeout
+        while time() < deadline:
+            if len(self._describe_group()['Instances']) <= size:
+                return
+            sleep(DRAIN_POLL_INTERVAL)
+        raise CloudComposeException('Instances of %s did not drain within %s seconds' % (self.asg_name, timeout))
+
+    def _describe_group(self):
+        groups = self._asg_describe_auto_scaling_groups(AutoScalingGroupNames=[self.asg_name]).get('AutoScalingGroups', [])
+        if not groups:
+            raise CloudComposeException('auto scaling group %s does not exist' % self.asg_name)
+        return groups[0]
+
+    def _lifecycle_hooks(self):
+        return self._asg_describe_lifecycle_hooks(AutoScalingGroupName=self.asg_name).get('LifecycleHooks', [])
+
+    def _is_retryable_exception(exception):
+        return not isinstance(exception, botocore.exceptions.ClientError) or \
+            exception.response["Error"]["Code"] in ['Throttling', 'ResourceContention']
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _asg_describe_lifecycle_hooks(self, **kwargs):
+        return self.asg.describe_lifecycle_hooks(**kwargs)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _asg_put_lifecycle_hook(self, **kwargs):
+        return self.asg.put_lifecycle_hook(**kwargs)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _asg_delete_lifecycle_hook(self, **kwargs):
+        return self.asg.delete_lifecycle_hook(**kwargs)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _asg_describe_auto_scaling_groups(self, **kwargs):
+        return self.asg.describe_auto_scaling_groups(**kwargs)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _asg_update_auto_scaling_group(self, **kwargs):
+        return self.asg.update_auto_scaling_group(**kwargs)
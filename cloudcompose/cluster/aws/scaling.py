@@ -0,0 +1,176 @@
+from __future__ import print_function
+from builtins import object
+import botocore
+from retrying import retry
+from cloudcompose.exceptions import CloudComposeException
+
+MAX_SCHEDULED_ACTIONS_PER_BATCH = 50
+
+# only what differs from aws.asg.capacity is changed, so a redeploy keeps a scheduled scale out
+class ScalingController(object):
+    def __init__(self, asg, asg_name, silent=False):
+        self.asg = asg
+        self.asg_name = asg_name
+        self.silent = silent
+
+    def capacity(self, capacity_config, default_size):
+        min_size = int(capacity_config.get('min', default_size))
+        max_size = int(capacity_config.get('max', max(default_size, min_size)))
+        if min_size > max_size:
+            raise CloudComposeException('aws.asg.capacity.min %s is larger than max %s' % (min_size, max_size))
+        desired = int(capacity_config.get('desired', default_size))
+        return min_size, max_size, self.clamp(desired, min_size, max_size)
+
+    def clamp(self, desired, min_size, max_size):
+        return min(max(desired, min_size), max_size)
+
+    def update_args(self, group, min_size, max_size):
+        # the desired capacity is only set when it falls outside the new bounds
+        args = {}
+        if group.get('MinSize') != min_size:
+            args['MinSize'] = min_size
+        if group.get('MaxSize') != max_size:
+            args['MaxSize'] = max_size
+        desired = self.clamp(group.get('DesiredCapacity', min_size), min_size, max_size)
+        if desired != group.get('DesiredCapacity'):
+            args['DesiredCapacity'] = desired
+        return args
+
+    def reconcile(self, capacity_config):
+        if 'scheduled' in capacity_config:
+            self.reconcile_scheduled_actions(capacity_config['scheduled'] or [])
+        if 'policies' in capacity_config:
+            self.reconcile_policies(capacity_config['policies'] or [])
+
+    def reconcile_scheduled_actions(self, scheduled):
+        existing = dict((action['ScheduledActionName'], action) for action in self._scheduled_actions())
+        wanted = [self._scheduled_action(action_config) for action_config in scheduled]
+        changed = [action for action in wanted if not self._matches(action, existing.get(action['ScheduledActionName']))]
+        stale = [name for name in existing if name not in set(action['ScheduledActionName'] for action in wanted)]
+
+        for index in range(0, len(changed), MAX_SCHEDULED_ACTIONS_PER_BATCH):
+            response = self._asg_batch_put_scheduled_update_group_action(
+                AutoScalingGroupName=self.asg_name,
+                ScheduledUpdateGroupActions=changed[index:index + MAX_SCHEDULED_ACTIONS_PER_BATCH])
+            self._check_failed(response, 'FailedScheduledUpdateGroupActions')
+        self._delete_scheduled_actions(stale)
+        if not self.silent and (changed or stale):
+            print('updated %s and deleted %s scheduled actions of %s' % (len(changed), len(stale), self.asg_name))
+        return changed, stale
+
+    def delete_scheduled_actions(self, scheduled):
+        # actions that were not created from the config are left alone
+        configured = set(action_config['name'] for action_config in scheduled)
+        names = [action['ScheduledActionName'] for action in self._scheduled_actions() if action['ScheduledActionName'] in configured]
+        self._delete_scheduled_actions(names)
+        return names
+
+    def reconcile_policies(self, policies):
+        existing = dict((policy['PolicyName'], policy) for policy in self._policies())
+        wanted = [self._policy(policy_config) for policy_config in policies]
+        changed = [policy for policy in wanted if not self._matches(policy, existing.get(policy['PolicyName']))]
+        stale = [name for name in existing if name not in set(policy['PolicyName'] for policy in wanted)]
+
+        for policy in changed:
+            self._asg_put_scaling_policy(AutoScalingGroupName=self.asg_name, **policy)
+        for name in stale:
+            self._asg_delete_policy(AutoScalingGroupName=self.asg_name, PolicyName=name)
+        if not self.silent and (changed or stale):
+            print('updated %s and deleted %s scaling policies of %s' % (len(changed), len(stale), self.asg_name))
+        return changed, stale
+
+    def _scheduled_action(self, action_config):
+        action = {'ScheduledActionName': action_config['name'], 'Recurrence': action_config['recurrence']}
+        for key, name in [('min', 'MinSize'), ('max', 'MaxSize'), ('desired', 'DesiredCapacity')]:
+            if key in action_config:
+                action[name] = int(action_config[key])
+        if 'time_zone' in action_config:
+            action['TimeZone'] = action_config['time_zone']
+        return action
+
+    def _policy(self, policy_config):
+        policy_type = policy_config.get('type', 'target_tracking')
+        target = float(policy_config['target'])
+        if policy_type == 'target_tracking':
+            metric_specification = {'PredefinedMetricType': policy_config.get('metric', 'ASGAverageCPUUtilization')}
+            if 'resource_label' in policy_config:
+                metric_specification['ResourceLabel'] = policy_config['resource_label']
+            configuration = {'PredefinedMetricSpecification': metric_specification, 'TargetValue': target}
+            if 'disable_scale_in' in policy_config:
+                configuration['DisableScaleIn'] = bool(policy_config['disable_scale_in'])
+            return {'PolicyName': policy_config['name'], 'PolicyType': 'TargetTrackingScaling',
+                    'TargetTrackingConfiguration': configuration}
+        if policy_type == 'predictive':
+            # predictive scaling uses metric pairs, which have their own names
+            metric = policy_config.get('metric', 'ASGCPUUtilization')
+            metric_specification = {'TargetValue': target, 'PredefinedMetricPairSpecification': {'PredefinedMetricType': metric}}
+            configuration = {'MetricSpecifications': [metric_specification],
+                             'Mode': policy_config.get('mode', 'ForecastAndScale')}
+            if 'buffer_time' in policy_config:
+                # launch ahead of the forecast to cover the boot time
+                configuration['SchedulingBufferTime'] = int(policy_config['buffer_time'])
+            return {'PolicyName': policy_config['name'], 'PolicyType': 'PredictiveScaling',
+                    'PredictiveScalingConfiguration': configuration}
+        raise CloudComposeException('Unknown scaling policy type %s, use target_tracking or predictive' % policy_type)
+
+    def _matches(self, wanted, existing):
+        if existing is None:
+            return False
+        for key, value in wanted.items():
+            if isinstance(value, dict):
+                if not self._matches(value, existing.get(key) or {}):
+                    return False
+            elif isinstance(value, list):
+                existing_list = existing.get(key) or []
+                if len(value) != len(existing_list) or not all(self._matches(item, existing_item) for item, existing_item in zip(value, existing_list)):
+                    return False
+            elif existing.get(key) != value:
+                return False
+        return True
+
+    def _delete_scheduled_actions(self, names):
+        for index in range(0, len(names), MAX_SCHEDULED_ACTIONS_PER_BATCH):
+            response = self._asg_batch_delete_scheduled_action(
+                AutoScalingGroupName=self.asg_name,
+                ScheduledActionNames=names[index:index + MAX_SCHEDULED_ACTIONS_PER_BATCH])
+            self._check_failed(response, 'FailedScheduledActions')
+
+    def _check_failed(self, response, key):
+        failed = response.get(key, [])
+        if failed:
+            raise CloudComposeException('Failed to update scheduled actions of %s: %s' % (
+                self.asg_name, ', '.join('%s (%s)' % (action['ScheduledActionName'], action.get('ErrorMessage')) for action in failed)))
+
+    def _scheduled_actions(self):
+        actions = []
+        paginator = self.asg.get_paginator('describe_scheduled_actions')
+        for page in paginator.paginate(AutoScalingGroupName=self.asg_name):
+            actions.extend(page.get('ScheduledUpdateGroupActions', []))
+        return actions
+
+    def _policies(self):
+        policies = []
+        paginator = self.asg.get_paginator('describe_policies')
+        for page in paginator.paginate(AutoScalingGroupName=self.asg_name, PolicyTypes=['TargetTrackingScaling', 'PredictiveScaling']):
+            policies.extend(page.get('ScalingPolicies', []))
+        return policies
+
+    def _is_retryable_exception(exception):
+        return not isinstance(exception, botocore.exceptions.ClientError) or \
+            exception.response["Error"]["Code"] in ['Throttling', 'ResourceContention']
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _asg_batch_put_scheduled_update_group_action(self, **kwargs):
+        return self.asg.batch_put_scheduled_update_group_action(**kwargs)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _asg_batch_delete_scheduled_action(self, **kwargs):
+        return self.asg.batch_delete_scheduled_action(**kwargs)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _asg_put_scaling_policy(self, **kwargs):
+        return self.asg.put_scaling_policy(**kwargs)
+
+    @retry(retry_on_exception=_is_retryable_exception, stop_max_delay=10000, wait_exponential_multiplier=500, wait_exponential_max=2000)
+    def _asg_delete_policy(self, **kwargs):
+        return self.asg.delete_policy(**kwargs)
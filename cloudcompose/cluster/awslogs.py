@@ -0,0 +1,63 @@
+from builtins import object
+from cloudcompose.exceptions import CloudComposeException
+
+DEFAULT_RETENTION = 30
+STREAM_TAGS = {
+    'container': '{{.ID}}',
+    'service': '{{.Name}}'
+}
+
+# docker awslogs options from logging.meta, the log groups are created once during up
+class AwsLogs(object):
+    def __init__(self, config_data):
+        logging = config_data.get('logging') or {}
+        self.enabled = logging.get('driver') == 'awslogs'
+        self.meta = logging.get('meta') or {}
+        self.services = self.meta.get('services') or {}
+
+    def options(self, region, service_meta=None):
+        meta = dict(self.meta)
+        meta.update(service_meta or {})
+        meta.pop('services', None)
+        if not meta.get('group'):
+            raise CloudComposeException('logging.meta.group is required for the awslogs driver')
+
+        options = {
+            'awslogs-region': meta.get('region', region),
+            'awslogs-group': meta['group']
+        }
+        stream = meta.get('stream')
+        if stream in STREAM_TAGS:
+            # without awslogs-stream the tag names the log stream
+            options['tag'] = STREAM_TAGS[stream]
+        elif stream:
+            options['awslogs-stream'] = stream
+        if meta.get('mode'):
+            if meta['mode'] not in ['blocking', 'non-blocking']:
+                raise CloudComposeException('logging.meta.mode must be blocking or non-blocking')
+            options['mode'] = meta['mode']
+        if meta.get('max_buffer_size'):
+            options['max-buffer-size'] = str(meta['max_buffer_size'])
+        if meta.get('max_buffered_events'):
+            options['awslogs-max-buffered-events'] = str(meta['max_buffered_events'])
+        if meta.get('flush_interval'):
+            options['awslogs-force-flush-interval-seconds'] = str(meta['flush_interval'])
+        if meta.get('datetime_format'):
+            options['awslogs-datetime-format'] = meta['datetime_format']
+        return options
+
+    def context(self, region):
+        return {
+            'options': self.options(region),
+            'services': dict((name, self.options(region, service_meta)) for name, service_meta in self.services.items())
+        }
+
+    def log_groups(self):
+        log_groups = {}
+        for meta in [self.meta] + list(self.services.values()):
+            group = meta.get('group') or self.meta.get('group')
+            if not group:
+                continue
+            retention = meta.get('retention') or self.meta.get('retention') or DEFAULT_RETENTION
+            log_groups[group] = int(retention)
+        return log_groups
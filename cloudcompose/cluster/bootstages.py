@@ -0,0 +1,81 @@
+from builtins import object
+import re
+from past.builtins import basestring
+from cloudcompose.exceptions import CloudComposeException
+
+# volume stages and the image pull run in parallel, mounts completes once every volume is mounted
+class BootStages(object):
+    def __init__(self, config_data):
+        self.config_data = config_data
+        boot_stages = config_data.get('boot_stages')
+        self.boot_stages = boot_stages if isinstance(boot_stages, dict) else {}
+
+    def stages(self):
+        stages = []
+        volume_stages = []
+        docker_stages = []
+        for volume in self.config_data.get('aws', {}).get('volumes', []):
+            if not self._is_prepared(volume):
+                continue
+            stage = self._stage('volume-%s' % volume['name'], [], volume=volume)
+            stages.append(stage)
+            volume_stages.append(stage['name'])
+            if self._is_docker_storage(volume):
+                docker_stages.append(stage['name'])
+
+        stages.append(self._stage('mounts', volume_stages))
+        stages.append(self._stage('pull', docker_stages, pull=True))
+        for custom_stage in self.boot_stages.get('stages', []):
+            stages.append(self._stage(custom_stage['name'], self._requires(custom_stage), run=custom_stage['run']))
+        return self._sort(stages)
+
+    def _stage(self, name, requires, **kwargs):
+        stage = {
+            'name': name,
+            'function': 'cc_stage_%s' % re.sub('[^A-Za-z0-9_]', '_', name),
+            'requires': requires
+        }
+        stage.update(kwargs)
+        return stage
+
+    def _requires(self, custom_stage):
+        requires = custom_stage.get('requires', [])
+        if isinstance(requires, basestring):
+            requires = requires.split(',')
+        return [stage.strip() for stage in requires]
+
+    def _is_prepared(self, volume):
+        return bool(volume.get('meta')) and 'block' in volume and (volume.get('file_system') == 'lvm2' or 'mount' in volume['meta'] or 'format' in volume['meta'])
+
+    def _is_docker_storage(self, volume):
+        # docker can only pull once its storage is in place
+        return volume.get('file_system') == 'lvm2' or volume['meta'].get('mount', '').startswith('/var/lib/docker')
+
+    def _sort(self, stages):
+        # every stage comes after the stages it requires
+        by_name = dict((stage['name'], stage) for stage in stages)
+        if len(by_name) != len(stages):
+            raise CloudComposeException('Boot stage names must be unique')
+        for stage in stages:
+            for required in stage['requires']:
+                if required not in by_name:
+                    raise CloudComposeException('Boot stage %s requires unknown stage %s' % (stage['name'], required))
+
+        ordered = []
+        visited = set()
+        visiting = set()
+        def visit(stage):
+            if stage['name'] in visited:
+                return
+            if stage['name'] in visiting:
+                raise CloudComposeException('Boot stage %s has a circular dependency' % stage['name'])
+            visiting.add(stage['name'])
+            for required in stage['requires']:
+                visit(by_name[required])
+            visiting.remove(stage['name'])
+            visited.add(stage['name'])
+            ordered.append(stage)
+
+        for stage in stages:
+            visit(stage)
+        return ordered
@@ -0,0 +1,55 @@
+from builtins import object
+import calendar
+import math
+from datetime import datetime
+from dateutil.parser import parse
+
+PHASE_TAG_PREFIX = 'cloud-compose:boot:'
+
+# a phase lasts from the previous marker (or the launch time) to its own marker
+class BootTimings(object):
+    def __init__(self):
+        self.durations = {}
+        self.phase_order = {}
+
+    def add_instance(self, instance):
+        timestamps = []
+        for tag in instance.get('Tags', []):
+            if tag['Key'].startswith(PHASE_TAG_PREFIX):
+                try:
+                    timestamps.append((float(tag['Value']), tag['Key'][len(PHASE_TAG_PREFIX):]))
+                except ValueError:
+                    continue
+
+        if not timestamps:
+            return
+
+        if 'LaunchTime' in instance:
+            timestamps.append((self._epoch(instance['LaunchTime']), 'launch'))
+        self.add_timestamps(timestamps)
+
+    def add_timestamps(self, timestamps):
+        previous = None
+        for index, (timestamp, phase) in enumerate(sorted(timestamps)):
+            if previous is not None:
+                self.durations.setdefault(phase, []).append(timestamp - previous)
+                self.phase_order.setdefault(phase, []).append(index)
+            previous = timestamp
+
+    def summary(self):
+        rows = []
+        for phase in sorted(self.durations.keys(), key=lambda phase: self.percentile(self.phase_order[phase], 50)):
+            durations = self.durations[phase]
+            rows.append((phase, len(durations), self.percentile(durations, 50), self.percentile(durations, 90), max(durations)))
+        return rows
+
+    @classmethod
+    def percentile(cls, values, percent):
+        ordered = sorted(values)
+        rank = max(int(math.ceil(percent / 100.0 * len(ordered))) - 1, 0)
+        return ordered[min(rank, len(ordered) - 1)]
+
+    def _epoch(self, launch_time):
+        if not isinstance(launch_time, datetime):
+            launch_time = parse(launch_time)
+        return calendar.timegm(launch_time.utctimetuple()) + launch_time.microsecond / 1000000.0
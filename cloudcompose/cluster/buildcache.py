@@ -0,0 +1,183 @@
+from __future__ import print_function
+from builtins import object
+import copy
+import hashlib
+import jinja2
+import yaml
+from jinja2 import meta
+from os import environ, makedirs, rename, stat, walk
+from os.path import join, expanduser, isfile, isdir, dirname, abspath, relpath
+from time import sleep
+from cloudcompose.cluster.cloudinit import CloudInit
+from cloudcompose.exceptions import CloudComposeException
+
+CACHE_DIR = environ.get('CLOUD_COMPOSE_CACHE_DIR', join(expanduser('~'), '.cloud-compose', 'cache'))
+PLUGIN_DIR = dirname(abspath(__file__))
+
+# scripts are cached by a hash of everything the build reads
+class BuildCache(object):
+    def __init__(self, cloud_config, base_dir='.', cache_dir=CACHE_DIR):
+        self.cloud_config = cloud_config
+        self.base_dir = base_dir
+        self.cache_dir = join(cache_dir, 'build')
+        self.docker_compose_sizes = {}
+
+    def build(self, node_id=None, use_cache=True):
+        config_data = self.cloud_config.config_data('cluster')
+        return self._build(config_data, self.input_hash(config_data), node_id, use_cache)
+
+    def build_nodes(self, output_dir, use_cache=True):
+        # only the scripts that changed are written
+        config_data = self.cloud_config.config_data('cluster')
+        input_hash = self.input_hash(config_data)
+        if not isdir(output_dir):
+            makedirs(output_dir)
+
+        changed = []
+        for node_id in self.node_ids(config_data):
+            script, _ = self._build(config_data, input_hash, node_id, use_cache)
+            output_file = join(output_dir, '%s.sh' % node_id)
+            if self._read_file(output_file) != script:
+                self._write_file(output_file, script)
+                changed.append(output_file)
+        return changed
+
+    def watch(self, output_dir=None, interval=1):
+        signature = None
+        while True:
+            try:
+                config_data = self.cloud_config.config_data('cluster')
+                current_signature = self._signature(self.input_files(config_data))
+                if current_signature != signature:
+                    signature = current_signature
+                    if output_dir:
+                        for output_file in self.build_nodes(output_dir):
+                            print('wrote %s' % output_file)
+                        for line in self.docker_compose_report():
+                            print(line)
+                    else:
+                        print(self.build()[0])
+            except (CloudComposeException, jinja2.TemplateError, yaml.YAMLError) as ex:
+                # keep watching, the next change may fix the build
+                print('build failed: %s' % ex)
+            sleep(interval)
+
+    def docker_compose_report(self):
+        report = []
+        for node_id, sizes in sorted(self.docker_compose_sizes.items(), key=lambda item: str(item[0])):
+            report.append('node %s docker compose %s -> %s bytes (%s saved)' % (node_id, sizes[0], sizes[1], sizes[0] - sizes[1]))
+        self.docker_compose_sizes = {}
+        return report
+
+    def node_ids(self, config_data):
+        aws = config_data.get('aws', {})
+        if aws.get('asg'):
+            # launch configurations are built with the cluster name as node id
+            return [config_data['name']]
+        return [node['id'] for node in aws.get('nodes', [])]
+
+    def input_files(self, config_data):
+        config_dir, config_file = self.cloud_config.find_config()
+        input_files = [join(config_dir, config_file)]
+        for search_dir in self._search_path(config_data):
+            # templates can include files from subdirectories
+            input_files.extend(input_file for input_file in self._files(search_dir) if input_file not in input_files)
+        return input_files
+
+    def plugin_files(self):
+        # the scripts also depend on the code that renders them
+        return [plugin_file for plugin_file in self._files(PLUGIN_DIR) if plugin_file.endswith('.py')]
+
+    def input_hash(self, config_data):
+        digest = hashlib.sha256()
+        template_sources = []
+        for input_file in self.input_files(config_data):
+            contents = self._read_bytes(input_file)
+            digest.update(input_file.encode('utf-8'))
+            digest.update(contents)
+            template_sources.append(contents.decode('utf-8', 'ignore'))
+        for plugin_file in self.plugin_files():
+            digest.update(relpath(plugin_file, PLUGIN_DIR).encode('utf-8'))
+            digest.update(self._read_bytes(plugin_file))
+        template_sources.extend(str(val) for val in config_data.get('environment', {}).values())
+
+        for name in sorted(self._referenced_variables(template_sources) | set(['AWS_REGION'])):
+            if name in environ:
+                digest.update(('%s=%s' % (name, environ[name])).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _build(self, config_data, input_hash, node_id, use_cache):
+        cache_file = join(self.cache_dir, '%s.sh' % hashlib.sha256(('%s:%s' % (input_hash, node_id)).encode('utf-8')).hexdigest())
+        if use_cache and isfile(cache_file):
+            return self._read_file(cache_file), True
+
+        kwargs = {}
+        if node_id is not None:
+            kwargs['node_id'] = node_id
+        # the build adds to the config data and the environment, keep both
+        # unchanged so every node and every rebuild starts from the same inputs
+        saved_environ = dict(environ)
+        cloud_init = CloudInit(base_dir=self.base_dir)
+        try:
+            script = cloud_init.build(copy.deepcopy(config_data), **kwargs)
+            if cloud_init.docker_compose_sizes:
+                self.docker_compose_sizes[node_id] = cloud_init.docker_compose_sizes
+        finally:
+            environ.clear()
+            environ.update(saved_environ)
+
+        if use_cache:
+            self._write_file(cache_file, script)
+        return script, False
+
+    def _search_path(self, config_data):
+        return CloudInit(base_dir=self.base_dir).search_path(copy.deepcopy(config_data))
+
+    def _referenced_variables(self, template_sources):
+        env = jinja2.Environment()
+        names = set()
+        for source in template_sources:
+            try:
+                names |= meta.find_undeclared_variables(env.parse(source))
+            except jinja2.TemplateSyntaxError:
+                continue
+        return names
+
+    def _files(self, directory):
+        files = []
+        for root, dirs, names in walk(directory):
+            # skip version control and other hidden directories
+            dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+            files.extend(join(root, name) for name in sorted(names))
+        return files
+
+    def _signature(self, input_files):
+        signature = []
+        for input_file in input_files:
+            try:
+                file_stat = stat(input_file)
+                signature.append((input_file, file_stat.st_mtime, file_stat.st_size))
+            except OSError:
+                signature.append((input_file, None, None))
+        return signature
+
+    def _read_bytes(self, file_path):
+        try:
+            with open(file_path, 'rb') as f:
+                return f.read()
+        except (IOError, OSError):
+            return b''
+
+    def _read_file(self, file_path):
+        if not isfile(file_path):
+            return None
+        with open(file_path, 'r') as f:
+            return f.read()
+
+    def _write_file(self, file_path, contents):
+        if not isdir(dirname(file_path)):
+            makedirs(dirname(file_path))
+        tmp_file = '%s.tmp' % file_path
+        with open(tmp_file, 'w') as f:
+            f.write(contents)
+        rename(tmp_file, file_path)
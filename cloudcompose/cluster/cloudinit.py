@@ -1,29 +1,125 @@
 from builtins import str
 from cloudcompose.cluster.template import Template
-from cloudcompose.cluster.dockercompose import DockerCompose
-from os.path import join, split
+from cloudcompose.cluster.dockercompose import DockerCompose, NODES_LABEL
+from cloudcompose.cluster.bootstages import BootStages
+from cloudcompose.cluster.awslogs import AwsLogs
+from os.path import join, split, dirname, abspath
 from os import environ
 from pprint import pprint
 from cloudcompose.cloudinit import CloudInit as BaseCloudInit
 
+BUILTIN_TEMPLATE_DIR = join(dirname(abspath(__file__)), 'templates')
+
 class CloudInit(BaseCloudInit):
     def __init__(self, base_dir='.'):
         BaseCloudInit.__init__(self, 'cluster', base_dir)
 
+    def search_path(self, config_data):
+        # built-in templates come last so projects can override them
+        return BaseCloudInit.search_path(self, config_data) + [BUILTIN_TEMPLATE_DIR]
+
     def build_pre_hook(self, config_data, **kwargs):
+        # _bake is set while rendering the bake script, _baked when the node
+        # boots from a baked image so templates can skip the baked steps
+        config_data['_bake'] = kwargs.get('bake', False)
+        config_data.setdefault('_baked', False)
         self._add_custom_environment(config_data)
+        self._add_nodes_by_region(config_data)
+        self._add_awslogs(config_data)
         self._add_docker_compose(config_data)
+        self._add_boot_stages(config_data)
 
     def _add_custom_environment(self, config_data):
         for key, val in config_data.get('environment', {}).items():
             if key not in environ:
                 environ[key] = Template.render_string(str(val), environ)
 
+    def _add_nodes_by_region(self, config_data):
+        default_region = environ.get('AWS_REGION', 'us-east-1')
+        nodes_by_region = {}
+        for node in config_data.get('aws', {}).get('nodes', []):
+            nodes_by_region.setdefault(node.get('region', default_region), []).append(node)
+        config_data['nodes_by_region'] = nodes_by_region
+
+    def _add_awslogs(self, config_data):
+        # rendered before the docker compose override, which uses the options
+        awslogs = AwsLogs(config_data)
+        if awslogs.enabled:
+            node = self._find_node(config_data) or {}
+            region = node.get('region', environ.get('AWS_REGION', 'us-east-1'))
+            config_data['awslogs'] = awslogs.context(region)
+
     def _add_docker_compose(self, config_data):
         docker_compose = DockerCompose(self.search_path(config_data))
-        docker_compose, docker_compose_override = docker_compose.yaml_files(config_data)
         config_data['docker_compose'] = {}
+        self.docker_compose_sizes = None
+        minify_compose = config_data.get('minify_compose')
+        if minify_compose not in [None, False]:
+            nodes_label = minify_compose.get('label', NODES_LABEL) if isinstance(minify_compose, dict) else NODES_LABEL
+            minified, override, original_size = docker_compose.minified_yaml(config_data, self._find_node(config_data), nodes_label)
+            config_data['docker_compose']['yaml'] = minified
+            # the override is merged in, keep it defined for templates that write both files
+            config_data['docker_compose']['override_yaml'] = override
+            self.docker_compose_sizes = (original_size, len(minified))
+            return
+
+        docker_compose, docker_compose_override = docker_compose.yaml_files(config_data)
         if docker_compose:
             config_data['docker_compose']['yaml'] = docker_compose
         if docker_compose_override:
             config_data['docker_compose']['override_yaml'] = docker_compose_override
+
+    def _find_node(self, config_data):
+        for node in config_data.get('aws', {}).get('nodes', []):
+            if '_node_id' in config_data and str(node['id']) == str(config_data['_node_id']):
+                return node
+
+    def _add_boot_stages(self, config_data):
+        if config_data.get('boot_stages') not in [None, False]:
+            config_data['stages'] = BootStages(config_data).stages()
+
+    def _render_template(self, config_data):
+        template = Template(self.search_path(config_data))
+        cloud_init_script = template.render(self.template_file, config_data)
+        preamble_templates, epilogue_templates = self._builtin_templates(config_data)
+
+        preamble = [template.render(template_file, config_data) for template_file in preamble_templates]
+        if preamble:
+            # keep the interpreter line of the project template first
+            if cloud_init_script.startswith('#!'):
+                interpreter, _, body = cloud_init_script.partition('\n')
+                cloud_init_script = '\n'.join([interpreter] + preamble + [body])
+            else:
+                cloud_init_script = '\n'.join(preamble + [cloud_init_script])
+
+        for template_file in epilogue_templates:
+            cloud_init_script += '\n' + template.render(template_file, config_data)
+        return cloud_init_script
+
+    def _builtin_templates(self, config_data):
+        preamble_templates = []
+        epilogue_templates = []
+        aws = config_data.get('aws', {})
+        if config_data.get('_bake'):
+            # the builder has no data volumes and is never a cluster node
+            return preamble_templates, ['bake.sh']
+        boot_timings = config_data.get('boot_timings') not in [None, False]
+        lifecycle = (aws.get('asg') or {}).get('lifecycle')
+        if lifecycle not in [None, False]:
+            # installed first so a node is drained even if it is removed while booting
+            preamble_templates.append('asg_lifecycle.sh')
+        if boot_timings:
+            preamble_templates.append('boot_timings.sh')
+        if aws.get('instance_store') not in [None, False]:
+            preamble_templates.append('instance_store.raid.sh')
+        if (aws.get('discovery') or {}).get('hosts'):
+            preamble_templates.append('discovery.hosts.sh')
+        if config_data.get('boot_stages') not in [None, False]:
+            preamble_templates.append('boot_stages.sh')
+        if any(volume.get('prewarm') for volume in aws.get('volumes', [])):
+            epilogue_templates.append('snapshot.prewarm.sh')
+        if boot_timings:
+            epilogue_templates.append('boot_timings.ready.sh')
+        if isinstance(lifecycle, dict) and lifecycle.get('launch'):
+            epilogue_templates.append('asg_lifecycle.ready.sh')
+        return preamble_templates, epilogue_templates
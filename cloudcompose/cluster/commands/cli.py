@@ -1,6 +1,8 @@
 from __future__ import print_function
+import sys
 import click
 from cloudcompose.cluster.cloudinit import CloudInit
+from cloudcompose.cluster.buildcache import BuildCache
 from cloudcompose.cluster.aws.cloudcontroller import CloudController
 from cloudcompose.config import CloudConfig
 from cloudcompose.exceptions import CloudComposeException
@@ -15,7 +17,13 @@ def cli():
 @click.option('--upgrade-image/--no-upgrade-image', default=False, help="Upgrade the image to the newest version instead of keeping the cluster consistent")
 @click.option('--snapshot-cluster', help="Cluster name to use for snapshot retrieval. It defaults to the current cluster name.")
 @click.option('--snapshot-time', help="Use a snapshot on or before this time. It defaults to the current time")
-def up(cloud_init, use_snapshots, upgrade_image, snapshot_cluster, snapshot_time):
+@click.option('--restore-mode', type=click.Choice(['lazy', 'prewarm', 'fsr']), help="How volumes restored from snapshots are initialized. It defaults to aws.restore.mode or lazy")
+@click.option('--resume/--no-resume', default=False, help="Continue an interrupted up using the local state journal")
+@click.option('--wait-healthy/--no-wait-healthy', default=False, help="Wait until every node is healthy in its target groups")
+@click.option('--wait-timeout', type=int, default=600, help="Seconds to wait for the nodes to become healthy")
+@click.option('--nodes', help="Only operate on these node IDs, e.g. 3,5-7")
+@click.option('--exclude-nodes', help="Skip these node IDs, e.g. 3,5-7")
+def up(cloud_init, use_snapshots, upgrade_image, snapshot_cluster, snapshot_time, restore_mode, resume, wait_healthy, wait_timeout, nodes, exclude_nodes):
     """
     creates a new cluster
     """
@@ -26,21 +34,54 @@ def up(cloud_init, use_snapshots, upgrade_image, snapshot_cluster, snapshot_time
         if cloud_init:
             ci = CloudInit()
 
-        cloud_controller = CloudController(cloud_config)
-        cloud_controller.up(ci, use_snapshots, upgrade_image, snapshot_cluster, snapshot_time)
+        cloud_controller = CloudController(cloud_config, nodes=nodes, exclude_nodes=exclude_nodes)
+        cloud_controller.up(ci, use_snapshots, upgrade_image, snapshot_cluster, snapshot_time, restore_mode, resume, wait_healthy, wait_timeout)
     except CloudComposeException as ex:
         print(ex)
+        # scripts waiting with --wait-healthy need to see the failure
+        sys.exit(1)
 
 @cli.command()
 @click.option('--force/--no-force', default=False, help="Force the cluster to go down even if terminate protection is enabled")
-def down(force):
+@click.option('--graceful/--no-graceful', default=False, help="Scale an autoscaling group down in batches and wait for the nodes to drain")
+@click.option('--nodes', help="Only operate on these node IDs, e.g. 3,5-7")
+@click.option('--exclude-nodes', help="Skip these node IDs, e.g. 3,5-7")
+def down(force, graceful, nodes, exclude_nodes):
     """
     destroys an existing cluster
     """
+    try:
+        cloud_config = CloudConfig()
+        cloud_controller = CloudController(cloud_config, nodes=nodes, exclude_nodes=exclude_nodes)
+        cloud_controller.down(force, graceful)
+    except CloudComposeException as ex:
+        print(ex)
+
+@cli.command()
+@click.option('--timings/--no-timings', default=False, help="Show boot phase percentiles collected from the boot timing markers")
+@click.option('--nodes', help="Only operate on these node IDs, e.g. 3,5-7")
+@click.option('--exclude-nodes', help="Skip these node IDs, e.g. 3,5-7")
+def status(timings, nodes, exclude_nodes):
+    """
+    shows the state of the cluster nodes
+    """
+    try:
+        cloud_config = CloudConfig()
+        cloud_controller = CloudController(cloud_config, nodes=nodes, exclude_nodes=exclude_nodes)
+        cloud_controller.status(timings)
+    except CloudComposeException as ex:
+        print(ex)
+
+@cli.command()
+@click.option('--force/--no-force', default=False, help="Bake a new image even if one with the same content already exists")
+def bake(force):
+    """
+    builds an image with the cluster software preinstalled
+    """
     try:
         cloud_config = CloudConfig()
         cloud_controller = CloudController(cloud_config)
-        cloud_controller.down(force)
+        cloud_controller.bake(CloudInit(), force)
     except CloudComposeException as ex:
         print(ex)
 
@@ -56,15 +97,51 @@ def cleanup():
     except CloudComposeException as ex:
         print(ex)
 
+@cli.command(name='migrate-tags')
+def migrate_tags():
+    """
+    removes legacy instance tags and tags existing volumes
+    """
+    try:
+        cloud_config = CloudConfig()
+        cloud_controller = CloudController(cloud_config)
+        cloud_controller.migrate_tags()
+    except CloudComposeException as ex:
+        print(ex)
+
+@cli.command()
+@click.option('--keep', type=int, help="Number of snapshot sets to keep. Older sets are deleted after the new set is created")
+@click.option('--hooks/--no-hooks', default=True, help="Run the configured pre and post snapshot hooks")
+def snapshot(keep, hooks):
+    """
+    snapshots the cluster volumes
+    """
+    try:
+        cloud_config = CloudConfig()
+        cloud_controller = CloudController(cloud_config)
+        cloud_controller.snapshot(keep, hooks)
+    except CloudComposeException as ex:
+        print(ex)
+
 @cli.command()
-def build():
+@click.option('--output-dir', help="Write one cloud init script per node to this directory instead of printing it")
+@click.option('--cache/--no-cache', default=True, help="Reuse the cached script when none of the build inputs changed")
+@click.option('--watch/--no-watch', default=False, help="Rebuild whenever a file in the search path or the config changes")
+def build(output_dir, cache, watch):
     """
     builds the cloud_init script
     """
     try:
         cloud_config = CloudConfig()
-        config_data = cloud_config.config_data('cluster')
-        cloud_init = CloudInit()
-        print(cloud_init.build(config_data))
+        build_cache = BuildCache(cloud_config)
+        if watch:
+            build_cache.watch(output_dir)
+        elif output_dir:
+            for output_file in build_cache.build_nodes(output_dir, cache):
+                print('wrote %s' % output_file)
+            for line in build_cache.docker_compose_report():
+                print(line)
+        else:
+            print(build_cache.build(use_cache=cache)[0])
     except CloudComposeException as ex:
         print(ex)
@@ -1,7 +1,17 @@
 from builtins import object
+from past.builtins import basestring
+import json
+import yaml
 from cloudcompose.cluster.template import Template
 from os.path import join, isfile, isdir, split
 
+# options that docker-compose concatenates, merges by key or merges by the
+# container path when an override file redefines them
+CONCATENATED_OPTIONS = ['ports', 'expose', 'external_links', 'dns', 'dns_search', 'tmpfs', 'extra_hosts']
+KEYED_OPTIONS = ['environment', 'labels']
+MOUNT_OPTIONS = ['volumes', 'devices']
+NODES_LABEL = 'cloud-compose.nodes'
+
 class DockerCompose(object):
     def __init__(self, search_path=['cloud-compose', '.']):
         self.search_path = search_path
@@ -13,6 +23,106 @@ class DockerCompose(object):
         docker_compose_override = self._render_docker_compose_override(config_data)
         return docker_compose, docker_compose_override
 
+    def minified_yaml(self, config_data, node=None, nodes_label=NODES_LABEL):
+        # one compact document with the services the node runs and an empty override
+        docker_compose, docker_compose_override = self.yaml_files(config_data)
+        original_size = len(docker_compose or '') + len(docker_compose_override or '')
+        merged = self.merge(yaml.safe_load(docker_compose or '') or {}, yaml.safe_load(docker_compose_override or '') or {})
+        services = merged.get('services', {}) if 'version' in merged else merged
+        for name in list(services.keys()):
+            if name not in self._node_services(services, node, nodes_label):
+                del services[name]
+        override = dict((key, merged[key]) for key in ['version'] if key in merged)
+        return self._dump(merged), self._dump(override), original_size
+
+    def _dump(self, document):
+        # JSON is valid YAML and has no comments or indentation
+        return json.dumps(document, separators=(',', ':'), sort_keys=True)
+
+    def merge(self, docker_compose, docker_compose_override):
+        if 'version' not in docker_compose and 'version' not in docker_compose_override:
+            return self._merge_services(docker_compose, docker_compose_override)
+
+        merged = self._merge_mapping(docker_compose, docker_compose_override)
+        merged['services'] = self._merge_services(docker_compose.get('services', {}), docker_compose_override.get('services', {}))
+        return merged
+
+    def _merge_services(self, services, override_services):
+        merged = dict(services)
+        for name, override in override_services.items():
+            service = dict(merged.get(name) or {})
+            for option, value in (override or {}).items():
+                if option not in service:
+                    service[option] = value
+                elif option in CONCATENATED_OPTIONS:
+                    service[option] = self._as_list(service[option]) + [item for item in self._as_list(value) if item not in self._as_list(service[option])]
+                elif option in KEYED_OPTIONS:
+                    service[option] = self._merge_mapping(self._as_mapping(service[option]), self._as_mapping(value))
+                elif option in MOUNT_OPTIONS:
+                    mounts = dict((self._mount_target(mount), mount) for mount in service[option])
+                    mounts.update((self._mount_target(mount), mount) for mount in value)
+                    service[option] = list(mounts.values())
+                elif isinstance(service[option], dict) and isinstance(value, dict):
+                    service[option] = self._merge_mapping(service[option], value)
+                else:
+                    service[option] = value
+            merged[name] = service
+        return merged
+
+    def _merge_mapping(self, mapping, override):
+        merged = dict(mapping)
+        for key, value in override.items():
+            if isinstance(merged.get(key), dict) and isinstance(value, dict):
+                merged[key] = self._merge_mapping(merged[key], value)
+            else:
+                merged[key] = value
+        return merged
+
+    def _node_services(self, services, node, nodes_label):
+        # services without the node label run everywhere
+        if node is None:
+            return set(services.keys())
+        if node.get('services'):
+            selected = set(self._as_list(node['services']))
+        else:
+            selected = set()
+            for name, service in services.items():
+                node_ids = self._as_mapping((service or {}).get('labels', {})).get(nodes_label)
+                if node_ids is None or str(node['id']) in [node_id.strip() for node_id in str(node_ids).split(',')]:
+                    selected.add(name)
+
+        pending = list(selected)
+        while pending:
+            service = services.get(pending.pop()) or {}
+            for dependency in self._as_list(service.get('depends_on', [])) + [link.split(':')[0] for link in service.get('links', [])]:
+                if dependency in services and dependency not in selected:
+                    selected.add(dependency)
+                    pending.append(dependency)
+        return selected
+
+    def _as_list(self, value):
+        if isinstance(value, dict):
+            return list(value.keys())
+        if isinstance(value, basestring):
+            return [item.strip() for item in value.split(',')]
+        return list(value)
+
+    def _as_mapping(self, value):
+        if isinstance(value, dict):
+            return value
+        mapping = {}
+        for item in value:
+            key, separator, val = item.partition('=')
+            # a name without a value is passed through from the host
+            mapping[key] = val if separator else None
+        return mapping
+
+    def _mount_target(self, mount):
+        if isinstance(mount, dict):
+            return mount.get('target')
+        parts = mount.split(':')
+        return parts[1] if len(parts) > 1 else parts[0]
+
     def _read_docker_compose(self):
         docker_compose_path = self._find_docker_compose_path()
         if docker_compose_path:
@@ -0,0 +1,85 @@
+from builtins import object
+import json
+import threading
+from os import environ, makedirs, rename
+from os.path import join, expanduser, isfile, isdir
+from time import time
+
+STATE_DIR = environ.get('CLOUD_COMPOSE_STATE_DIR', join(expanduser('~'), '.cloud-compose', 'state'))
+
+# every step is written as soon as it completes so an interrupted operation can be resumed
+class StateJournal(object):
+    def __init__(self, cluster_name, state_dir=STATE_DIR):
+        self.cluster_name = cluster_name
+        self.state_dir = state_dir
+        self.path = join(state_dir, '%s.json' % cluster_name)
+        self.lock = threading.RLock()
+        self.state = self._load()
+
+    def start(self, operation, resume=False):
+        with self.lock:
+            current = self.state.get('operation', {})
+            if resume and current.get('name') == operation and not current.get('completed'):
+                return
+            self.state['operation'] = {'name': operation, 'started': time(), 'completed': None, 'steps': []}
+            self._save()
+
+    def complete(self):
+        with self.lock:
+            self.state.setdefault('operation', {})['completed'] = time()
+            self._save()
+
+    def is_done(self, step):
+        return step in self.state.get('operation', {}).get('steps', [])
+
+    def step_done(self, step, **data):
+        with self.lock:
+            steps = self.state.setdefault('operation', {}).setdefault('steps', [])
+            if step not in steps:
+                steps.append(step)
+            self.state.update(data)
+            self._save()
+
+    def get(self, key, default=None):
+        return self.state.get(key, default)
+
+    def nodes(self):
+        return self.state.get('nodes', {})
+
+    def record_node(self, node_id, **data):
+        with self.lock:
+            node = self.state.setdefault('nodes', {}).setdefault(str(node_id), {})
+            node.update(data)
+            self._save()
+
+    def token_generation(self, node_id):
+        return self.state.get('token_generations', {}).get(str(node_id), 0)
+
+    def record_token_generation(self, node_id, generation):
+        # kept apart from the nodes so it outlives down
+        with self.lock:
+            self.state.setdefault('token_generations', {})[str(node_id)] = generation
+            self._save()
+
+    def remove_nodes(self, node_ids):
+        with self.lock:
+            for node_id in node_ids:
+                self.state.get('nodes', {}).pop(str(node_id), None)
+            self._save()
+
+    def _load(self):
+        if isfile(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    return json.load(f)
+            except ValueError:
+                pass
+        return {'cluster': self.cluster_name}
+
+    def _save(self):
+        if not isdir(self.state_dir):
+            makedirs(self.state_dir)
+        tmp_file = '%s.tmp' % self.path
+        with open(tmp_file, 'w') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True, default=str)
+        rename(tmp_file, self.path)
@@ -0,0 +1,49 @@
+from builtins import object, str
+from past.builtins import basestring
+from cloudcompose.exceptions import CloudComposeException
+
+class NodeSelection(object):
+    def __init__(self, nodes=None, exclude_nodes=None):
+        self.nodes = self._parse(nodes)
+        self.exclude_nodes = self._parse(exclude_nodes) or set()
+
+    @property
+    def active(self):
+        return self.nodes is not None or bool(self.exclude_nodes)
+
+    def select(self, nodes):
+        node_ids = set(str(node['id']) for node in nodes)
+        unknown = (self.nodes or set()) - node_ids
+        if unknown:
+            raise CloudComposeException('Unknown nodes %s' % ','.join(sorted(unknown)))
+        return [node for node in nodes if self.is_selected(node)]
+
+    def is_selected(self, node):
+        node_id = str(node['id'])
+        return (self.nodes is None or node_id in self.nodes) and node_id not in self.exclude_nodes
+
+    def _parse(self, selector):
+        if selector is None or selector == '':
+            return None
+        if isinstance(selector, (set, list, tuple)):
+            return set(str(node_id) for node_id in selector)
+        if not isinstance(selector, basestring):
+            selector = str(selector)
+
+        node_ids = set()
+        for part in selector.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            start, _, end = part.partition('-')
+            if end:
+                try:
+                    start, end = int(start), int(end)
+                except ValueError:
+                    raise CloudComposeException('Invalid node range %s' % part)
+                if start > end:
+                    raise CloudComposeException('Invalid node range %s' % part)
+                node_ids.update(str(node_id) for node_id in range(start, end + 1))
+            else:
+                node_ids.add(part)
+        return node_ids
@@ -0,0 +1,3 @@
+# asg_lifecycle.ready.sh
+aws autoscaling complete-lifecycle-action --region $CC_LIFECYCLE_REGION --instance-id $CC_LIFECYCLE_INSTANCE_ID \
+  --auto-scaling-group-name {{ name }} --lifecycle-hook-name {{ name }}-launch --lifecycle-action-result CONTINUE
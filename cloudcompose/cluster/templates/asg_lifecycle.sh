@@ -0,0 +1,40 @@
+# asg_lifecycle.sh
+{%- set lifecycle = aws.asg.lifecycle if aws.asg.lifecycle is mapping else {} %}
+CC_LIFECYCLE_TOKEN=$(curl -s -m 2 -X PUT -H "X-aws-ec2-metadata-token-ttl-seconds: 300" http://169.254.169.254/latest/api/token)
+CC_LIFECYCLE_INSTANCE_ID=$(curl -s -m 2 -H "X-aws-ec2-metadata-token: $CC_LIFECYCLE_TOKEN" http://169.254.169.254/latest/meta-data/instance-id)
+CC_LIFECYCLE_REGION=$(curl -s -m 2 -H "X-aws-ec2-metadata-token: $CC_LIFECYCLE_TOKEN" http://169.254.169.254/latest/meta-data/placement/region)
+{%- if lifecycle.terminate|default(true) %}
+cat << 'EOF_DRAIN' > /usr/local/bin/cloud-compose-drain
+#!/bin/bash
+# waits for the termination lifecycle hook, drains the node and lets the termination continue
+metadata() {
+  local token=$(curl -s -m 2 -X PUT -H "X-aws-ec2-metadata-token-ttl-seconds: 300" http://169.254.169.254/latest/api/token)
+  curl -s -m 2 -H "X-aws-ec2-metadata-token: $token" http://169.254.169.254/latest/meta-data/$1
+}
+while [ "$(metadata autoscaling/target-lifecycle-state)" != "Terminated" ]; do
+  sleep 5
+done
+{%- if lifecycle.drain_command is defined %}
+{{ lifecycle.drain_command }}
+{%- endif %}
+docker ps -q | xargs -r docker stop -t {{ lifecycle.stop_timeout|default(30) }}
+aws autoscaling complete-lifecycle-action --region $(metadata placement/region) --instance-id $(metadata instance-id) \
+  --auto-scaling-group-name {{ name }} --lifecycle-hook-name {{ name }}-terminate --lifecycle-action-result CONTINUE
+EOF_DRAIN
+chmod +x /usr/local/bin/cloud-compose-drain
+cat << 'EOF_DRAIN_UNIT' > /etc/systemd/system/cloud-compose-drain.service
+[Unit]
+Description=cloud-compose drain handler
+After=docker.service
+
+[Service]
+ExecStart=/usr/local/bin/cloud-compose-drain
+Restart=on-failure
+
+[Install]
+WantedBy=multi-user.target
+EOF_DRAIN_UNIT
+systemctl daemon-reload
+systemctl enable cloud-compose-drain.service
+systemctl start cloud-compose-drain.service
+{%- endif %}
@@ -0,0 +1,17 @@
+# bake.sh
+{%- if docker_compose.yaml is defined %}
+mkdir -p /tmp/cloud-compose-bake
+cat << 'EOF_DOCKER_COMPOSE' > /tmp/cloud-compose-bake/docker-compose.yml
+{{ docker_compose.yaml }}
+EOF_DOCKER_COMPOSE
+{%- if docker_compose.override_yaml is defined %}
+cat << 'EOF_DOCKER_COMPOSE' > /tmp/cloud-compose-bake/docker-compose.override.yml
+{{ docker_compose.override_yaml }}
+EOF_DOCKER_COMPOSE
+{%- endif %}
+(cd /tmp/cloud-compose-bake && docker-compose pull)
+rm -rf /tmp/cloud-compose-bake
+{%- endif %}
+# let cloud-init run again on the nodes that boot from the image
+cloud-init clean --logs
+shutdown -h now
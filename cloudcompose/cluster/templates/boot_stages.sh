@@ -0,0 +1,106 @@
+# boot_stages.sh
+CC_STAGE_DIR=/var/lib/cloud-compose/stages
+rm -rf $CC_STAGE_DIR
+mkdir -p $CC_STAGE_DIR
+cc_wait_stage() {
+  local stage
+  for stage in "$@"; do
+    while [ ! -e $CC_STAGE_DIR/$stage.done ]; do
+      if [ -e $CC_STAGE_DIR/$stage.failed ]; then
+        echo "boot stage $stage failed, see $CC_STAGE_DIR/$stage.log" >&2
+        return 1
+      fi
+      sleep 0.5
+    done
+  done
+}
+cc_run_stage() {
+  local stage=$1
+  local requires=$2
+  shift 2
+  (
+    if cc_wait_stage $requires && "$@" > $CC_STAGE_DIR/$stage.log 2>&1; then
+      touch $CC_STAGE_DIR/$stage.done
+      type cc_mark_phase > /dev/null 2>&1 && cc_mark_phase stage:$stage
+    else
+      touch $CC_STAGE_DIR/$stage.failed
+    fi
+  ) &
+}
+cc_wait_device() {
+  local i
+  for i in $(seq 1 120); do
+    [ -b $1 ] && return 0
+    sleep 0.5
+  done
+  echo "device $1 is not attached" >&2
+  return 1
+}
+{%- for stage in stages %}
+{{ stage.function }}() {
+{%- if stage.volume is defined %}
+{%- set volume = stage.volume %}
+{%- set file_system = volume.file_system|default("", true) %}
+{%- if volume.block.startswith("/dev/") %}
+  cc_wait_device {{ volume.block }} || return 1
+{%- endif %}
+{%- if volume.meta.format is defined and volume.snapshot is not defined %}
+{%- if file_system == "xfs" %}
+  mkfs -t xfs -f -K {{ volume.block }} || return 1
+{%- elif file_system.startswith("ext") %}
+  mkfs -t {{ file_system }} -F -E lazy_itable_init=1,lazy_journal_init=1,nodiscard {{ volume.block }} || return 1
+{%- else %}
+  mkfs -t {{ file_system }} {{ volume.block }} || return 1
+{%- endif %}
+{%- endif %}
+{%- if volume.snapshot is defined and file_system.startswith("ext") %}
+  resize2fs {{ volume.block }}
+{%- endif %}
+{%- if volume.meta.mount is defined %}
+  echo -e '{{ volume.block }}\t{{ volume.meta.mount }}\t{{ volume.file_system }}\t{{ volume.meta.options|default("defaults,noatime", true) }}\t0\t0' >> /etc/fstab
+  mkdir -p {{ volume.meta.mount }}
+  mount {{ volume.meta.mount }} || return 1
+{%- endif %}
+{%- if volume.snapshot is defined and file_system == "xfs" and volume.meta.mount is defined %}
+  xfs_growfs {{ volume.meta.mount }}
+{%- endif %}
+{%- if file_system == "lvm2" %}
+  systemctl enable lvm2-lvmetad.service lvm2-lvmetad.socket
+  systemctl start lvm2-lvmetad.service lvm2-lvmetad.socket
+  pvcreate {{ volume.block }} || return 1
+  vgcreate {{ volume.meta.group }} {{ volume.block }} || return 1
+{%- for logical_volume in volume.meta.volumes %}
+  lvcreate -L {{ logical_volume.size }} -n {{ logical_volume.name }} -Z n {{ volume.meta.group }} || return 1
+{%- endfor %}
+  udevadm control --reload-rules
+  udevadm trigger
+  cat << EOF_DOCKER_STORAGE > /etc/sysconfig/docker-storage
+DOCKER_STORAGE_OPTIONS='--storage-driver=devicemapper --storage-opt dm.datadev=/dev/{{ volume.meta.group }}/data --storage-opt dm.metadatadev=/dev/{{ volume.meta.group }}/metadata {% if volume.size %} --storage-opt dm.basesize={{ volume.size }}{% endif %}'
+EOF_DOCKER_STORAGE
+  systemctl restart docker
+{%- endif %}
+{%- elif stage.pull is defined %}
+{%- if docker_compose.yaml is defined %}
+  mkdir -p /tmp/cloud-compose-pull
+  cat << 'EOF_DOCKER_COMPOSE' > /tmp/cloud-compose-pull/docker-compose.yml
+{{ docker_compose.yaml }}
+EOF_DOCKER_COMPOSE
+{%- if docker_compose.override_yaml is defined %}
+  cat << 'EOF_DOCKER_COMPOSE' > /tmp/cloud-compose-pull/docker-compose.override.yml
+{{ docker_compose.override_yaml }}
+EOF_DOCKER_COMPOSE
+{%- endif %}
+  (cd /tmp/cloud-compose-pull && docker-compose pull)
+{%- else %}
+  true
+{%- endif %}
+{%- elif stage.run is defined %}
+  {{ stage.run }}
+{%- else %}
+  true
+{%- endif %}
+}
+{%- endfor %}
+{%- for stage in stages %}
+cc_run_stage {{ stage.name }} "{{ stage.requires|join(" ") }}" {{ stage.function }}
+{%- endfor %}
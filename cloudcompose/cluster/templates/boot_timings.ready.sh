@@ -0,0 +1,3 @@
+# boot_timings.ready.sh
+cc_mark_phase ready
+wait $!
@@ -0,0 +1,13 @@
+# boot_timings.sh
+{%- set endpoint = boot_timings.endpoint if boot_timings is mapping and boot_timings.endpoint is defined else None %}
+CC_IMDS_TOKEN=$(curl -s -m 2 -X PUT -H "X-aws-ec2-metadata-token-ttl-seconds: 21600" http://169.254.169.254/latest/api/token)
+CC_INSTANCE_ID=$(curl -s -m 2 -H "X-aws-ec2-metadata-token: $CC_IMDS_TOKEN" http://169.254.169.254/latest/meta-data/instance-id)
+CC_REGION=$(curl -s -m 2 -H "X-aws-ec2-metadata-token: $CC_IMDS_TOKEN" http://169.254.169.254/latest/meta-data/placement/region)
+cc_mark_phase() {
+{%- if endpoint %}
+  curl -s -m 2 -X POST -d "instance=$CC_INSTANCE_ID&phase=$1&timestamp=$(date +%s.%3N)" {{ endpoint }} > /dev/null 2>&1 &
+{%- else %}
+  aws ec2 create-tags --region $CC_REGION --resources $CC_INSTANCE_ID --tags Key=cloud-compose:boot:$1,Value=$(date +%s.%3N) > /dev/null 2>&1 &
+{%- endif %}
+}
+cc_mark_phase cloud_init
@@ -0,0 +1,14 @@
+# discovery.hosts.sh
+CC_HOSTS_FILE=/tmp/cloud-compose-hosts
+rm -f $CC_HOSTS_FILE
+for i in $(seq 1 30); do
+  aws s3 cp {{ aws.discovery.hosts }} $CC_HOSTS_FILE > /dev/null && break
+  sleep 2
+done
+if [ ! -e $CC_HOSTS_FILE ]; then
+  # the node cannot resolve its peers without the hosts file
+  echo "unable to download the cluster hosts from {{ aws.discovery.hosts }}" >&2
+  logger -t cloud-compose "unable to download the cluster hosts from {{ aws.discovery.hosts }}"
+  exit 1
+fi
+cat $CC_HOSTS_FILE >> /etc/hosts
\ No newline at end of file
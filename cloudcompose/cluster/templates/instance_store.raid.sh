@@ -0,0 +1,30 @@
+# instance_store.raid.sh
+{%- set instance_store = aws.instance_store if aws.instance_store is mapping else {} %}
+{%- set mount = instance_store.mount|default("/mnt/instance-store", true) %}
+{%- set file_system = instance_store.file_system|default("ext4", true) %}
+INSTANCE_STORE_DEVICES=$(ls /dev/disk/by-id/nvme-Amazon_EC2_NVMe_Instance_Storage_* 2> /dev/null | grep -v -- -part | xargs -r readlink -f | sort -u)
+{%- if instance_store.devices is defined %}
+for device in {{ instance_store.devices|join(" ") }}; do
+  [ -b $device ] && INSTANCE_STORE_DEVICES="$INSTANCE_STORE_DEVICES $device"
+done
+{%- endif %}
+INSTANCE_STORE_COUNT=$(echo $INSTANCE_STORE_DEVICES | wc -w)
+INSTANCE_STORE_DEVICE=$INSTANCE_STORE_DEVICES
+for device in $INSTANCE_STORE_DEVICES; do
+  umount $device > /dev/null 2>&1 || true
+done
+if [ $INSTANCE_STORE_COUNT -gt 1 ]; then
+  mdadm --create /dev/md0 --run --level=0 --raid-devices=$INSTANCE_STORE_COUNT $INSTANCE_STORE_DEVICES
+  INSTANCE_STORE_DEVICE=/dev/md0
+fi
+if [ $INSTANCE_STORE_COUNT -gt 0 ]; then
+{%- if file_system == "xfs" %}
+  mkfs -t xfs -f -K $INSTANCE_STORE_DEVICE
+{%- elif file_system.startswith("ext") %}
+  mkfs -t {{ file_system }} -F -E lazy_itable_init=1,lazy_journal_init=1,nodiscard $INSTANCE_STORE_DEVICE
+{%- else %}
+  mkfs -t {{ file_system }} $INSTANCE_STORE_DEVICE
+{%- endif %}
+  mkdir -p {{ mount }}
+  mount -o {{ instance_store.options|default("defaults,noatime", true) }} $INSTANCE_STORE_DEVICE {{ mount }}
+fi
@@ -0,0 +1,10 @@
+# snapshot.prewarm.sh
+{%- for volume in aws.volumes %}
+{%- if volume.prewarm is defined and volume.prewarm %}
+if command -v fio > /dev/null 2>&1; then
+  nohup fio --filename={{ volume.prewarm }} --rw=read --bs=1M --iodepth=32 --ioengine=libaio --direct=1 --name=prewarm-{{ volume.name }} > /dev/null 2>&1 &
+else
+  nohup dd if={{ volume.prewarm }} of=/dev/null bs=1M > /dev/null 2>&1 &
+fi
+{%- endif %}
+{%- endfor %}
@@ -7,6 +7,7 @@ setup(
     version='0.14.6',
     packages=find_packages(),
     include_package_data=True,
+    package_data={'cloudcompose.cluster': ['templates/*.sh']},
     install_requires=[
         'click>=6.6',
         'boto3>=1.3.1',
@@ -1,16 +1,152 @@
 from builtins import object
 from unittest import TestCase
+from unittest.mock import patch
 from cloudcompose.cluster.aws.cloudcontroller import CloudController
+from cloudcompose.cluster.aws.elb import TargetGroupController
+from cloudcompose.cluster.journal import StateJournal
+from cloudcompose.cluster.cloudinit import CloudInit
 from cloudcompose.config import CloudConfig
+from cloudcompose.exceptions import CloudComposeException
+from tempfile import mkdtemp
 from os.path import abspath, join, dirname
+from time import time
+import botocore
 
 TEST_ROOT = abspath(join(dirname(__file__)))
 
 class MockEC2Client(object):
-    pass
+    def __init__(self, unavailable_instance_types=[], images=[], instances=[]):
+        self.unavailable_instance_types = unavailable_instance_types
+        self.images = images
+        self.instances = instances
+        self.run_instances_calls = []
+        self.create_tags_calls = []
+        self.delete_tags_calls = []
+
+    def describe_images(self, **kwargs):
+        images = self.images
+        if 'ImageIds' in kwargs:
+            images = [image for image in images if image['ImageId'] in kwargs['ImageIds']]
+        for image_filter in kwargs.get('Filters', []):
+            if image_filter['Name'] == 'tag:Name':
+                images = [image for image in images if {'Key': 'Name', 'Value': image_filter['Values'][0]} in image['Tags']]
+        return {'Images': images}
+
+    def run_instances(self, **kwargs):
+        self.run_instances_calls.append(kwargs)
+        if kwargs['InstanceType'] in self.unavailable_instance_types:
+            error = {'Error': {'Code': 'InsufficientInstanceCapacity', 'Message': 'no capacity'}}
+            raise botocore.exceptions.ClientError(error, 'RunInstances')
+        return {'Instances': [{'InstanceId': 'i-%s' % len(self.run_instances_calls)}]}
+
+    def describe_instances(self, **kwargs):
+        return {'Reservations': [{'Instances': self.instances}]}
+
+    def create_tags(self, **kwargs):
+        self.create_tags_calls.append(kwargs)
+
+    def delete_tags(self, **kwargs):
+        self.delete_tags_calls.append(kwargs)
+
+class MockTokenEC2Client(object):
+    def __init__(self, terminated_tokens=[]):
+        self.terminated_tokens = terminated_tokens
+        self.instances = {}
+        self.tokens = []
+
+    def run_instances(self, **kwargs):
+        token = kwargs['ClientToken']
+        self.tokens.append(token)
+        if token in self.instances:
+            # the same token returns the instance launched before
+            return {'Instances': [dict(self.instances[token], State={'Name': 'running'})]}
+        state = 'terminated' if len(self.tokens) <= len(self.terminated_tokens) else 'pending'
+        self.instances[token] = {'InstanceId': 'i-%s' % len(self.instances), 'State': {'Name': state}, 'ClientToken': token}
+        return {'Instances': [self.instances[token]]}
+
+    def describe_instances(self, **kwargs):
+        tokens = kwargs['Filters'][0]['Values']
+        return {'Reservations': [{'Instances': [instance for token, instance in self.instances.items() if token in tokens]}]}
+
+class MockInstancesEC2Client(object):
+    def __init__(self, instances=[]):
+        self.instances = instances
+        self.describe_instances_calls = []
+        self.create_tags_calls = []
+        self.terminated = []
+
+    def describe_instances(self, **kwargs):
+        self.describe_instances_calls.append(kwargs)
+        keys = {'instance-id': 'InstanceId', 'private-ip-address': 'PrivateIpAddress'}
+        instances = self.instances
+        for instance_filter in kwargs.get('Filters', []):
+            instances = [instance for instance in instances if instance.get(keys[instance_filter['Name']]) in instance_filter['Values']]
+        return {'Reservations': [{'Instances': [dict(instance) for instance in instances]}]}
+
+    def terminate_instances(self, **kwargs):
+        self.terminated.extend(kwargs['InstanceIds'])
+
+    def create_tags(self, **kwargs):
+        self.create_tags_calls.append(kwargs)
+
+# the volumes of the pending instances are attached after the first describe
+class MockAttachingEC2Client(MockInstancesEC2Client):
+    def describe_instances(self, **kwargs):
+        described = MockInstancesEC2Client.describe_instances(self, **kwargs)
+        for instance in self.instances:
+            instance['BlockDeviceMappings'] = [{'DeviceName': '/dev/xvda', 'Ebs': {'VolumeId': 'vol-%s' % instance['InstanceId']}}]
+        return described
+
+class MockRestoreEC2Client(object):
+    def __init__(self, failing=[]):
+        self.failing = failing
+        self.enabled = []
+        self.disable_calls = []
+
+    def describe_subnets(self, **kwargs):
+        return {'Subnets': [{'SubnetId': subnet_id, 'AvailabilityZone': 'us-east-1%s' % subnet_id[-1]} for subnet_id in kwargs['SubnetIds']]}
+
+    def describe_fast_snapshot_restores(self, **kwargs):
+        return {'FastSnapshotRestores': [{'SnapshotId': snapshot_id, 'AvailabilityZone': zone, 'State': 'enabled'}
+                                         for snapshot_id, zone in self.enabled if snapshot_id in kwargs['Filters'][0]['Values']]}
+
+    def enable_fast_snapshot_restores(self, **kwargs):
+        for snapshot_id in kwargs['SourceSnapshotIds']:
+            if snapshot_id not in self.failing:
+                self.enabled.extend((snapshot_id, zone) for zone in kwargs['AvailabilityZones'])
+        return {'Unsuccessful': [{'SnapshotId': snapshot_id} for snapshot_id in kwargs['SourceSnapshotIds'] if snapshot_id in self.failing]}
+
+    def disable_fast_snapshot_restores(self, **kwargs):
+        self.disable_calls.append(kwargs)
+
+class MockELBv2Client(object):
+    def __init__(self, health={}):
+        self.health = health
+        self.register_calls = []
+
+    def register_targets(self, **kwargs):
+        self.register_calls.append(kwargs)
+
+    def describe_target_health(self, **kwargs):
+        return {'TargetHealthDescriptions': [{'Target': {'Id': instance_id}, 'TargetHealth': {'State': state}}
+                                             for instance_id, state in self.health.get(kwargs['TargetGroupArn'], {}).items()]}
+
+# every describe returns the next state of the group, the last one is kept
+class MockLaunchingASGClient(object):
+    def __init__(self, groups):
+        self.groups = groups
+        self.describe_calls = 0
+
+    def describe_auto_scaling_groups(self, **kwargs):
+        self.describe_calls += 1
+        return {'AutoScalingGroups': [self.groups[min(self.describe_calls, len(self.groups)) - 1]]}
 
 class MockASGClient(object):
-    pass
+    def __init__(self):
+        self.updates = []
+
+    def update_auto_scaling_group(self, **kwargs):
+        self.updates.append(kwargs)
 
 class CloudInitTest(TestCase):
 
@@ -24,7 +160,317 @@ class CloudInitTest(TestCase):
         controller = self._cloud_controller('multi_security_group_list')
         self.assertEquals(['sg-abc123', 'sg-def456', 'sg-hij789'], controller.security_groups())
 
-    def _cloud_controller(self, config_dir):
+    def test_instance_type_fallback(self):
+        ec2 = MockEC2Client(unavailable_instance_types=['m5.large'])
+        controller = self._cloud_controller('single_security_group', ec2)
+        controller.aws['instance_type'] = 'm5.large, m4.large'
+        node = {'id': 0, 'ip': '10.0.10.10'}
+
+        self.assertEqual(('i-2', True, 'm4.large'), controller._run_node_instance(node, 'us-east-1a', ImageId='ami-123'))
+        # m5.large is remembered as unavailable in the zone
+        self.assertEqual(('i-3', True, 'm4.large'), controller._run_node_instance(node, 'us-east-1a', ImageId='ami-123'))
+        self.assertEqual(['m5.large', 'm4.large', 'm4.large'], [call['InstanceType'] for call in ec2.run_instances_calls])
+
+    def test_regions(self):
+        controller = self._cloud_controller('multi_region')
+        self.assertEqual(['us-east-1', 'us-west-2'], controller.regions())
+        self.assertTrue(controller.multi_region)
+
+        controller = self._cloud_controller('multi_region', region='us-west-2')
+        self.assertFalse(controller.multi_region)
+        self.assertEqual([1, 2], [node['id'] for node in controller.nodes])
+        self.assertEqual(3, len(controller.aws['nodes']))
+        self.assertEqual('ami-west', controller.aws['ami'])
+        self.assertEqual(['sg-west'], controller.security_groups())
+
+    def test_regional_cloud_init(self):
+        controller = self._cloud_controller('multi_region')
+        cloud_init = CloudInit()
+        args = controller._regional_args([cloud_init, True])
+        # every region builds with its own cloud init
+        self.assertIsNot(cloud_init, args[0])
+        self.assertIsInstance(args[0], CloudInit)
+        self.assertEqual(True, args[1])
+
+    def test_resolve_baked_ami(self):
+        images = [
+            {'ImageId': 'ami-base', 'CreationDate': '2016-01-01', 'Tags': [{'Key': 'Name', 'Value': 'base'}]},
+            {'ImageId': 'ami-baked-1', 'CreationDate': '2016-01-02', 'Tags': [{'Key': 'Name', 'Value': 'baked'}]},
+            {'ImageId': 'ami-baked-2', 'CreationDate': '2016-01-03', 'Tags': [{'Key': 'Name', 'Value': 'baked'}]}
+        ]
+        controller = self._cloud_controller('single_security_group', MockEC2Client(images=images))
+        controller.aws['asg'] = {'subnets': ['subnet-1']}
+        controller.aws['ami'] = 'base'
+        self.assertEqual('ami-base', controller._resolve_ami_name(True))
+        self.assertFalse(controller._is_baked_image('ami-base'))
+
+        controller.aws['bake'] = {'name': 'baked'}
+        self.assertEqual('ami-baked-2', controller._resolve_ami_name(True))
+        self.assertTrue(controller._is_baked_image('ami-baked-2'))
+        self.assertEqual('ami-base', controller._resolve_base_ami())
+
+    def test_bake_base_ignores_cluster_image(self):
+        images = [
+            {'ImageId': 'ami-base', 'CreationDate': '2016-01-01', 'Tags': [{'Key': 'Name', 'Value': 'base'}]},
+            {'ImageId': 'ami-baked', 'CreationDate': '2016-01-02', 'Tags': [{'Key': 'Name', 'Value': 'baked'}]}
+        ]
+        # the static nodes already run the baked image
+        instances = [{'InstanceId': 'i-0', 'ImageId': 'ami-baked'}]
+        controller = self._cloud_controller('single_security_group', MockEC2Client(images=images, instances=instances))
+        controller.aws['ami'] = 'base'
+        controller.aws['bake'] = {'name': 'baked'}
+        self.assertEqual('ami-baked', controller._resolve_ami_name(False))
+
+        controller.aws['ami'] = 'base'
+        self.assertEqual('ami-base', controller._resolve_base_ami())
+
+    def test_migrate_tags(self):
+        instances = []
+        for node_id in range(3):
+            tags = [{'Key': 'Name', 'Value': 'test-%s' % node_id}]
+            if node_id < 2:
+                tags.append({'Key': 'NodeId', 'Value': str(node_id)})
+            instances.append({'InstanceId': 'i-%s' % node_id, 'Tags': tags,
+                              'BlockDeviceMappings': [{'DeviceName': '/dev/xvda', 'Ebs': {'VolumeId': 'vol-root-%s' % node_id}},
+                                                      {'DeviceName': '/dev/xvdc', 'Ebs': {'VolumeId': 'vol-data-%s' % node_id}}]})
+        ec2 = MockEC2Client(instances=instances)
+        controller = self._cloud_controller('single_security_group', ec2)
+
+        self.assertEqual(['i-0', 'i-1'], sorted(controller.migrate_tags()))
+        self.assertEqual(1, len(ec2.delete_tags_calls))
+        self.assertEqual([{'Key': 'NodeId'}], ec2.delete_tags_calls[0]['Tags'])
+        # one call per instance name and one per device
+        self.assertEqual(5, len(ec2.create_tags_calls))
+        self.assertIn({'Key': 'Name', 'Value': 'test-2'}, ec2.create_tags_calls[2]['Tags'])
+        self.assertEqual(['vol-root-2', 'vol-data-2'], ec2.create_tags_calls[2]['Resources'])
+
+    def test_client_token_launch(self):
+        ec2 = MockTokenEC2Client()
+        controller = self._cloud_controller('single_security_group', ec2)
+        controller.journal = StateJournal('test', mkdtemp())
+        node = {'id': 0, 'ip': '10.0.10.10'}
+
+        self.assertEqual(('i-0', True), controller._launch_node(node, ImageId='ami-123', InstanceType='m4.large'))
+        # a repeated launch returns the same instance without a conflict
+        self.assertEqual(('i-0', False), controller._launch_node(node, ImageId='ami-123', InstanceType='m4.large'))
+        self.assertEqual(1, len(set(ec2.tokens)))
+        self.assertTrue(all(len(token) <= 64 for token in ec2.tokens))
+        # other launch arguments or another node get another token
+        controller._launch_node(node, ImageId='ami-456', InstanceType='m4.large')
+        controller._launch_node({'id': 1, 'ip': '10.0.10.11'}, ImageId='ami-123', InstanceType='m4.large')
+        self.assertEqual(3, len(set(ec2.tokens)))
+
+    def test_client_token_of_terminated_instance(self):
+        ec2 = MockTokenEC2Client(terminated_tokens=['gen-0'])
+        controller = self._cloud_controller('single_security_group', ec2)
+        controller.journal = StateJournal('test', mkdtemp())
+        node = {'id': 0, 'ip': '10.0.10.10'}
+
+        self.assertEqual(('i-1', True), controller._launch_node(node, ImageId='ami-123'))
+        self.assertEqual(2, len(set(ec2.tokens)))
+        self.assertEqual(1, controller.journal.token_generation(0))
+
+    def test_client_token_without_free_generation(self):
+        ec2 = MockTokenEC2Client(terminated_tokens=range(10))
+        controller = self._cloud_controller('single_security_group', ec2)
+        controller.journal = StateJournal('test', mkdtemp())
+        node = {'id': 0, 'ip': '10.0.10.10'}
+
+        # the generations of earlier clusters are used up, a fresh token still launches the node
+        self.assertEqual(('i-10', True), controller._launch_node(node, ImageId='ami-123'))
+        self.assertEqual(11, len(set(ec2.tokens)))
+
+    def test_client_token_generation_without_journal(self):
+        ec2 = MockTokenEC2Client(terminated_tokens=range(3))
+        controller = self._cloud_controller('single_security_group', ec2)
+        controller.journal = StateJournal('test', mkdtemp())
+        node = {'id': 0, 'ip': '10.0.10.10'}
+        controller._launch_node(node, ImageId='ami-123')
+
+        # the journal is lost, the terminated generations are found in EC2
+        controller.journal = StateJournal('test', mkdtemp())
+        self.assertEqual(('i-3', False), controller._launch_node(node, ImageId='ami-123'))
+        self.assertEqual(5, len(ec2.tokens))
+
+    def test_node_selection(self):
+        controller = self._cloud_controller('multi_region', region='us-west-2', nodes='0-1')
+        self.assertEqual([1], [node['id'] for node in controller.nodes])
+        self.assertEqual(3, len(controller.aws['nodes']))
+
+        controller = self._cloud_controller('multi_region', region='us-west-2', exclude_nodes='1')
+        self.assertEqual([2], [node['id'] for node in controller.nodes])
+        self.assertEqual([1], [node['id'] for node in controller._unselected_nodes()])
+
+    def test_asg_down_keeps_unmanaged_scheduled_actions(self):
+        controller = self._cloud_controller('single_security_group')
+        controller.aws['asg'] = {'subnets': ['subnet-1']}
+        # MockASGClient has no paginator, so any scheduled action lookup fails the test
+        controller.down()
+        self.assertEqual([{'AutoScalingGroupName': 'simple', 'MinSize': 0, 'MaxSize': 0, 'DesiredCapacity': 0}], controller.asg.updates)
+
+    def test_lazy_snapshot_restore(self):
+        controller = self._restore_controller(MockRestoreEC2Client())
+        self.assertIsNone(controller._prepare_snapshot_restore(self._restore_block_device_map(), None))
+        self.assertNotIn('prewarm', controller.aws['volumes'][0])
+        self.assertRaises(CloudComposeException, controller._prepare_snapshot_restore, self._restore_block_device_map(), 'eager')
+
+    def test_prewarm_snapshot_restore(self):
+        controller = self._restore_controller(MockRestoreEC2Client())
+        controller.aws['restore'] = {'mode': 'prewarm'}
+        self.assertIsNone(controller._prepare_snapshot_restore(self._restore_block_device_map(), None))
+        self.assertEqual(['/dev/xvdc', '/dev/xvdd'], [volume['prewarm'] for volume in controller.aws['volumes']])
+
+    def test_fast_snapshot_restore(self):
+        ec2 = MockRestoreEC2Client(failing=['snap-logs'])
+        controller = self._restore_controller(ec2)
+        # the command line mode wins over the config
+        controller.aws['restore'] = {'mode': 'prewarm'}
+        fast_restores = controller._prepare_snapshot_restore(self._restore_block_device_map(), 'fsr')
+
+        self.assertEqual((['snap-data'], ['us-east-1a', 'us-east-1b']), fast_restores)
+        # volumes from snapshots without fast restore fall back to prewarm
+        self.assertNotIn('prewarm', controller.aws['volumes'][0])
+        self.assertEqual('/dev/xvdd', controller.aws['volumes'][1]['prewarm'])
+
+        controller._disable_fast_snapshot_restores(*fast_restores)
+        self.assertEqual([{'AvailabilityZones': ['us-east-1a', 'us-east-1b'], 'SourceSnapshotIds': ['snap-data']}], ec2.disable_calls)
+
+    def test_register_targets_with_port(self):
+        elbv2 = MockELBv2Client()
+        controller = self._cloud_controller('single_security_group')
+        with patch.object(TargetGroupController, '_get_elbv2_client', return_value=elbv2):
+            controller._register_targets([{'arn': 'tg-1', 'port': 8080}, 'tg-2'], ['i-1', 'i-2'])
+
+        self.assertEqual([{'TargetGroupArn': 'tg-1', 'Targets': [{'Id': 'i-1', 'Port': 8080}, {'Id': 'i-2', 'Port': 8080}]},
+                          {'TargetGroupArn': 'tg-2', 'Targets': [{'Id': 'i-1'}, {'Id': 'i-2'}]}], elbv2.register_calls)
+
+    def test_wait_healthy(self):
+        elbv2 = MockELBv2Client({'tg-1': {'i-1': 'healthy', 'i-2': 'healthy'}})
+        controller = self._cloud_controller('single_security_group')
+        controller.aws['target_groups'] = 'tg-1'
+        with patch.object(TargetGroupController, '_get_elbv2_client', return_value=elbv2):
+            controller._wait_healthy({0: ('i-1',), 1: ('i-2',)}, time(), 60)
+
+    def test_wait_healthy_fails_for_unhealthy_nodes(self):
+        elbv2 = MockELBv2Client({'tg-1': {'i-1': 'healthy', 'i-2': 'unhealthy'}})
+        controller = self._cloud_controller('single_security_group')
+        controller.aws['target_groups'] = 'tg-1'
+        with patch.object(TargetGroupController, '_get_elbv2_client', return_value=elbv2):
+            with self.assertRaises(CloudComposeException) as context:
+                controller._wait_healthy({0: ('i-1',), 1: ('i-2',)}, time(), 0)
+        self.assertIn('Nodes 1 were not healthy', str(context.exception))
+
+    def test_wait_healthy_asg(self):
+        launching = {'DesiredCapacity': 2, 'Instances': [{'InstanceId': 'i-1', 'LifecycleState': 'InService'},
+                                                         {'InstanceId': 'i-2', 'LifecycleState': 'Pending'}]}
+        launched = {'DesiredCapacity': 2, 'Instances': [{'InstanceId': 'i-1', 'LifecycleState': 'InService'},
+                                                        {'InstanceId': 'i-2', 'LifecycleState': 'InService'}]}
+        elbv2 = MockELBv2Client({'tg-1': {'i-1': 'healthy', 'i-2': 'initial'}})
+        controller = self._cloud_controller('single_security_group')
+        controller.asg = MockLaunchingASGClient([launching, launched])
+        controller.aws['asg'] = {'subnets': ['subnet-1'], 'target_groups': ['tg-1']}
+        with patch.object(TargetGroupController, '_get_elbv2_client', return_value=elbv2), \
+                patch('cloudcompose.cluster.aws.cloudcontroller.time.sleep'), \
+                patch('cloudcompose.cluster.aws.elb.time', side_effect=[0, 600]):
+            with self.assertRaises(CloudComposeException) as context:
+                controller._wait_healthy({}, time(), 60)
+
+        # the launches are awaited before the health of the group instances is polled
+        self.assertEqual(3, controller.asg.describe_calls)
+        self.assertIn('Nodes i-2 were not healthy', str(context.exception))
+
+    def test_status_with_stale_journal(self):
+        ec2 = MockInstancesEC2Client(self._journal_instances())
+        controller = self._journal_controller(ec2)
+
+        nodes = controller._status_nodes()
+        self.assertEqual(['i-0', 'i-new1', 'i-2'], [instance['InstanceId'] for node_id, instance in nodes])
+        # one call for the journaled instances and one for the stale and unjournaled nodes
+        self.assertEqual(2, len(ec2.describe_instances_calls))
+        self.assertEqual(['10.0.10.11', '10.0.10.12'], ec2.describe_instances_calls[1]['Filters'][0]['Values'])
+        self.assertEqual('i-new1', controller.journal.nodes()['1']['instance_id'])
+        self.assertEqual('i-2', controller.journal.nodes()['2']['instance_id'])
+
+    def test_status_without_live_instance(self):
+        ec2 = MockInstancesEC2Client([self._instance('i-old1', '10.0.10.11', 'terminated')])
+        controller = self._journal_controller(ec2)
+
+        nodes = dict(controller._status_nodes())
+        self.assertEqual('terminated', nodes[1]['State']['Name'])
+        self.assertIsNone(nodes[2])
+        # stale entries are not recorded again
+        self.assertNotIn('instance_id', controller.journal.nodes().get('2', {}))
+
+    def test_down_with_stale_journal(self):
+        ec2 = MockInstancesEC2Client(self._journal_instances())
+        controller = self._journal_controller(ec2)
+
+        controller.down()
+        self.assertEqual(['i-0', 'i-new1', 'i-2'], ec2.terminated)
+        self.assertEqual({}, controller.journal.nodes())
+
+    def test_resume_with_partial_journal(self):
+        ec2 = MockInstancesEC2Client(self._journal_instances() + [self._instance('i-3', '10.0.10.13', 'running')])
+        controller = self._journal_controller(ec2)
+        controller.nodes.append({'id': 3, 'ip': '10.0.10.13'})
+        controller.nodes.append({'id': 4, 'ip': '10.0.10.14'})
+        controller.journal.record_node(0, status='ready')
+        controller.journal.record_node(3, instance_id='i-3', status='launched')
+
+        instances = {}
+        unfinished = controller._unfinished_nodes(controller.nodes, instances)
+        # the ready node is skipped, only the node without any instance is launched
+        self.assertEqual([4], [node['id'] for node in unfinished])
+        self.assertEqual(['i-new1', 'i-2', 'i-3'], [instances[node_id][0] for node_id in sorted(instances)])
+        self.assertEqual(2, len(ec2.describe_instances_calls))
+
+    def test_tag_volume_devices_polls_missing_volumes(self):
+        ec2 = MockAttachingEC2Client([
+            dict(self._instance('i-1', '10.0.10.10', 'running'), BlockDeviceMappings=[{'DeviceName': '/dev/xvda', 'Ebs': {'VolumeId': 'vol-i-1'}}]),
+            self._instance('i-2', '10.0.10.11', 'pending')
+        ])
+        controller = self._cloud_controller('single_security_group', ec2)
+        with patch('cloudcompose.cluster.aws.cloudcontroller.sleep'):
+            controller._tag_volume_devices(['i-1', 'i-2'], [{'DeviceName': '/dev/xvda', 'Ebs': {}}])
+
+        # only the instance without volumes is described again
+        self.assertEqual([['i-1', 'i-2'], ['i-2']], [call['Filters'][0]['Values'] for call in ec2.describe_instances_calls])
+        self.assertEqual([['vol-i-1', 'vol-i-2']], [sorted(call['Resources']) for call in ec2.create_tags_calls])
+
+    def _restore_controller(self, ec2):
+        controller = self._cloud_controller('single_security_group', ec2)
+        controller.nodes = [{'id': 0, 'ip': '10.0.10.10', 'subnet': 'subnet-a'}, {'id': 1, 'ip': '10.0.20.10', 'subnet': 'subnet-b'}]
+        controller.aws['volumes'] = [{'name': 'data', 'snapshot': 'snap-data'}, {'name': 'logs', 'snapshot': 'snap-logs'}]
+        return controller
+
+    def _restore_block_device_map(self):
+        return [
+            {'DeviceName': '/dev/xvda', 'Ebs': {'VolumeSize': 30}},
+            {'DeviceName': '/dev/xvdc', 'Ebs': {'SnapshotId': 'snap-data'}},
+            {'DeviceName': '/dev/xvdd', 'Ebs': {'SnapshotId': 'snap-logs'}}
+        ]
+
+    def _instance(self, instance_id, ip, state):
+        return {'InstanceId': instance_id, 'PrivateIpAddress': ip, 'State': {'Name': state}}
+
+    def _journal_instances(self):
+        return [
+            self._instance('i-0', '10.0.10.10', 'running'),
+            self._instance('i-old1', '10.0.10.11', 'terminated'),
+            self._instance('i-new1', '10.0.10.11', 'pending'),
+            self._instance('i-2', '10.0.10.12', 'running')
+        ]
+
+    def _journal_controller(self, ec2):
+        controller = self._cloud_controller('single_security_group', ec2)
+        controller.journal = StateJournal('test', mkdtemp())
+        controller.nodes = [{'id': 0, 'ip': '10.0.10.10'}, {'id': 1, 'ip': '10.0.10.11'}, {'id': 2, 'ip': '10.0.10.12'}]
+        # node 1 was replaced outside of cloud-compose, node 2 was never journaled
+        controller.journal.record_node(0, instance_id='i-0')
+        controller.journal.record_node(1, instance_id='i-old1')
+        return controller
+
+    def _cloud_controller(self, config_dir, ec2_client=None, region=None, **kwargs):
         base_dir = join(TEST_ROOT, config_dir)
         cloud_config = CloudConfig(base_dir)
-        return CloudController(cloud_config, ec2_client=MockEC2Client(), asg_client=MockASGClient())
+        return CloudController(cloud_config, ec2_client=ec2_client or MockEC2Client(), asg_client=MockASGClient(), silent=True, region=region, **kwargs)
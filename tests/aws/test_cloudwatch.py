@@ -0,0 +1,68 @@
+from builtins import object
+from unittest import TestCase
+from cloudcompose.cluster.aws.cloudwatch import LogsController
+
+class MockLogsClient(object):
+    def __init__(self, log_groups=[]):
+        self.log_groups = log_groups
+        self.describe_calls = []
+        self.created = []
+        self.retention_policies = []
+
+    def describe_log_groups(self, **kwargs):
+        self.describe_calls.append(dict(kwargs))
+        prefix = kwargs.get('logGroupNamePrefix', '')
+        log_groups = [log_group for log_group in self.log_groups if log_group['logGroupName'].startswith(prefix)]
+        # one log group per page
+        start = int(kwargs.get('nextToken', 0))
+        page = {'logGroups': log_groups[start:start + 1]}
+        if start + 1 < len(log_groups):
+            page['nextToken'] = str(start + 1)
+        return page
+
+    def create_log_group(self, **kwargs):
+        self.created.append(kwargs['logGroupName'])
+
+    def put_retention_policy(self, **kwargs):
+        self.retention_policies.append((kwargs['logGroupName'], kwargs['retentionInDays']))
+
+class LogsControllerTest(TestCase):
+
+    def test_create_log_groups(self):
+        logs = MockLogsClient([
+            {'logGroupName': 'test-web', 'retentionInDays': 14},
+            {'logGroupName': 'test-worker', 'retentionInDays': 30}
+        ])
+        controller = LogsController('us-east-1', logs_client=logs)
+        changed = controller.create_log_groups({'test-web': 14, 'test-worker': 7, 'test-db': 30})
+
+        self.assertEqual(['test-db', 'test-worker'], changed)
+        self.assertEqual([{'logGroupNamePrefix': 'test-'}, {'logGroupNamePrefix': 'test-', 'nextToken': '1'}], logs.describe_calls)
+        self.assertEqual(['test-db'], logs.created)
+        self.assertEqual([('test-db', 30), ('test-worker', 7)], logs.retention_policies)
+
+    def test_unchanged_log_group(self):
+        logs = MockLogsClient([{'logGroupName': 'test', 'retentionInDays': 30}])
+        controller = LogsController('us-east-1', logs_client=logs)
+
+        self.assertEqual([], controller.create_log_group('test', None))
+        self.assertEqual([], logs.created)
+        self.assertEqual([], logs.retention_policies)
+
+    def test_no_log_groups(self):
+        logs = MockLogsClient([{'logGroupName': 'test', 'retentionInDays': 30}])
+        controller = LogsController('us-east-1', logs_client=logs)
+
+        self.assertEqual([], controller.create_log_groups({}))
+        self.assertEqual([], logs.describe_calls)
+
+    def test_log_groups_without_common_prefix(self):
+        logs = MockLogsClient([{'logGroupName': 'app-a', 'retentionInDays': 30}, {'logGroupName': '/svc-b', 'retentionInDays': 30}])
+        controller = LogsController('us-east-1', logs_client=logs)
+
+        self.assertEqual([], controller.create_log_groups({'app-a': 30, '/svc-b': 30}))
+        self.assertEqual([{'logGroupNamePrefix': '/svc-b'}, {'logGroupNamePrefix': 'app-a'}], logs.describe_calls)
+
+        logs.describe_calls = []
+        controller.create_log_groups({'/a': 30, '/b': 30})
+        self.assertEqual([{'logGroupNamePrefix': '/a'}, {'logGroupNamePrefix': '/b'}], logs.describe_calls)
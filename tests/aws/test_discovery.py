@@ -0,0 +1,73 @@
+from builtins import object
+from unittest import TestCase
+from cloudcompose.cluster.aws.discovery import DiscoveryController
+
+class MockRoute53Client(object):
+    def __init__(self, records=[]):
+        self.records = records
+        self.change_batches = []
+
+    def change_resource_record_sets(self, **kwargs):
+        self.change_batches.append(kwargs['ChangeBatch']['Changes'])
+
+    def get_paginator(self, operation):
+        return self
+
+    def paginate(self, **kwargs):
+        # records are listed in order of their reversed labels
+        key = lambda name: list(reversed(name.rstrip('.').split('.')))
+        records = sorted(self.records, key=lambda record: key(record['Name']))
+        return [{'ResourceRecordSets': [record for record in records if key(record['Name']) >= key(kwargs['StartRecordName'])]}]
+
+class MockS3Client(object):
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, **kwargs):
+        self.objects[(kwargs['Bucket'], kwargs['Key'])] = kwargs['Body']
+
+    def delete_object(self, **kwargs):
+        del self.objects[(kwargs['Bucket'], kwargs['Key'])]
+
+class DiscoveryControllerTest(TestCase):
+    nodes = [{'id': 0, 'ip': '10.0.10.10'}, {'id': 1, 'ip': '10.0.10.11'}]
+
+    def test_register(self):
+        route53 = MockRoute53Client()
+        controller = self._controller(route53)
+        controller.register(self.nodes[:1], self.nodes)
+
+        # every node and the shared record in one batch
+        self.assertEqual(1, len(route53.change_batches))
+        records = dict((change['ResourceRecordSet']['Name'], [record['Value'] for record in change['ResourceRecordSet']['ResourceRecords']])
+                       for change in route53.change_batches[0])
+        self.assertEqual({'node0.mongodb.internal': ['10.0.10.10'], 'nodes.mongodb.internal': ['10.0.10.10', '10.0.10.11']}, records)
+
+    def test_deregister(self):
+        records = [
+            {'Name': 'mongodb.internal.', 'Type': 'SOA'},
+            {'Name': 'node0.mongodb.internal.', 'Type': 'A', 'TTL': 300, 'ResourceRecords': [{'Value': '10.0.10.10'}]},
+            {'Name': 'node1.mongodb.internal.', 'Type': 'A', 'TTL': 300, 'ResourceRecords': [{'Value': '10.0.10.11'}]},
+            {'Name': 'nodes.mongodb.internal.', 'Type': 'A', 'TTL': 300, 'ResourceRecords': [{'Value': '10.0.10.10'}, {'Value': '10.0.10.11'}]},
+            {'Name': 'other.internal.', 'Type': 'A', 'TTL': 300, 'ResourceRecords': [{'Value': '10.0.0.1'}]}
+        ]
+        route53 = MockRoute53Client(records)
+        controller = self._controller(route53)
+        controller.deregister(self.nodes, [])
+
+        self.assertEqual(1, len(route53.change_batches))
+        # records are deleted with their current values
+        self.assertEqual(records[1:4], [change['ResourceRecordSet'] for change in route53.change_batches[0]])
+        self.assertTrue(all(change['Action'] == 'DELETE' for change in route53.change_batches[0]))
+
+    def test_hosts_file(self):
+        s3 = MockS3Client()
+        controller = DiscoveryController({'hosts': 's3://bucket/mongodb/hosts'}, s3_client=s3, silent=True)
+        controller.register(self.nodes, self.nodes)
+        self.assertEqual(b'10.0.10.10 node0\n10.0.10.11 node1\n', s3.objects[('bucket', 'mongodb/hosts')])
+
+        controller.deregister(self.nodes, [])
+        self.assertEqual({}, s3.objects)
+
+    def _controller(self, route53):
+        return DiscoveryController({'zone_id': 'Z123', 'domain': 'mongodb.internal'}, route53_client=route53, silent=True)
@@ -0,0 +1,171 @@
+from builtins import object
+from unittest import TestCase
+from unittest.mock import patch
+from cloudcompose.cluster.aws.ebs import EBSController
+
+class MockEC2Client(object):
+    def __init__(self, snapshots=[]):
+        self.snapshots = snapshots
+        self.create_snapshots_calls = []
+        self.create_tags_calls = []
+        self.deleted_snapshots = []
+
+    def create_snapshots(self, **kwargs):
+        self.create_snapshots_calls.append(kwargs)
+        instance_id = kwargs['InstanceSpecification']['InstanceId']
+        return {'Snapshots': [{'SnapshotId': 'snap-%s-%s' % (instance_id, volume_id), 'VolumeId': volume_id}
+                              for volume_id in ['vol-root', 'vol-data']]}
+
+    def create_tags(self, **kwargs):
+        self.create_tags_calls.append(kwargs)
+
+    def describe_snapshots(self, **kwargs):
+        return {'Snapshots': self.snapshots}
+
+    def delete_snapshot(self, **kwargs):
+        self.deleted_snapshots.append(kwargs['SnapshotId'])
+
+# fast snapshot restores are enabled one describe after enabling them,
+# except for the stuck snapshots, and the failing snapshots cannot be enabled
+class MockRestoreEC2Client(object):
+    def __init__(self, states={}, failing=[], stuck=[]):
+        self.states = dict(states)
+        self.failing = failing
+        self.stuck = stuck
+        self.enable_calls = []
+        self.disable_calls = []
+
+    def describe_fast_snapshot_restores(self, **kwargs):
+        snapshot_ids = kwargs['Filters'][0]['Values']
+        restores = [{'SnapshotId': snapshot_id, 'AvailabilityZone': zone, 'State': state}
+                    for (snapshot_id, zone), state in sorted(self.states.items()) if snapshot_id in snapshot_ids]
+        for key, state in self.states.items():
+            if state == 'enabling' and key[0] not in self.stuck:
+                self.states[key] = 'enabled'
+        return {'FastSnapshotRestores': restores}
+
+    def enable_fast_snapshot_restores(self, **kwargs):
+        self.enable_calls.append(kwargs)
+        unsuccessful = []
+        for snapshot_id in kwargs['SourceSnapshotIds']:
+            if snapshot_id in self.failing:
+                unsuccessful.append({'SnapshotId': snapshot_id, 'FastSnapshotRestoreStateErrors': []})
+                continue
+            for zone in kwargs['AvailabilityZones']:
+                self.states[(snapshot_id, zone)] = 'enabling'
+        return {'Unsuccessful': unsuccessful}
+
+    def disable_fast_snapshot_restores(self, **kwargs):
+        self.disable_calls.append(kwargs)
+
+class EBSControllerTest(TestCase):
+    volumes = [
+        {'name': 'root', 'size': '30G'},
+        {'name': 'ephemeral0', 'block': '/dev/xvdb', 'ephemeral': True},
+        {'name': 'data', 'size': '10G', 'block': '/dev/xvdc'},
+        {'name': 'shared', 'block': 'fs-1234:/', 'file_system': 'nfs4'}
+    ]
+
+    def test_snapshot_devices(self):
+        controller = EBSController(MockEC2Client(), 'test', silent=True)
+        self.assertEqual(['/dev/xvda', '/dev/xvdc'], controller.snapshot_devices(self.volumes, '/dev/xvda'))
+
+    def test_instance_store_mappings(self):
+        controller = EBSController(MockEC2Client(), 'test', silent=True)
+        block_device_map = [
+            {'DeviceName': '/dev/xvdb', 'VirtualName': 'ephemeral0'},
+            {'DeviceName': '/dev/xvdc', 'Ebs': {'VolumeSize': 10}}
+        ]
+        self.assertEqual([{'DeviceName': '/dev/xvdd', 'VirtualName': 'ephemeral1'},
+                          {'DeviceName': '/dev/xvde', 'VirtualName': 'ephemeral2'}],
+                         controller.instance_store_mappings(3, block_device_map))
+
+    def test_create_snapshot_sets(self):
+        ec2 = MockEC2Client()
+        controller = EBSController(ec2, 'test', silent=True)
+        instances = [self._instance('i-1'), self._instance('i-2')]
+        snapshots = controller.create_snapshot_sets(instances, self.volumes, '2016-01-01T00:00:00Z')
+
+        self.assertEqual(4, len(snapshots))
+        self.assertEqual(2, len(ec2.create_snapshots_calls))
+        for call in ec2.create_snapshots_calls:
+            self.assertFalse(call['InstanceSpecification']['ExcludeBootVolume'])
+            self.assertEqual(['vol-extra'], call['InstanceSpecification']['ExcludeDataVolumeIds'])
+            self.assertIn({'Key': 'SnapshotSet', 'Value': '2016-01-01T00:00:00Z'}, call['TagSpecifications'][0]['Tags'])
+
+        # one tagging call per device across all instances
+        self.assertEqual(2, len(ec2.create_tags_calls))
+        tagged = dict((call['Tags'][0]['Value'], sorted(call['Resources'])) for call in ec2.create_tags_calls)
+        self.assertEqual(['snap-i-1-vol-data', 'snap-i-2-vol-data'], tagged['/dev/xvdc'])
+
+    def test_prune_snapshot_sets(self):
+        snapshots = []
+        for snapshot_set in ['2016-01-01T00:00:00Z', '2016-01-02T00:00:00Z', '2016-01-03T00:00:00Z']:
+            for index in range(2):
+                snapshots.append({'SnapshotId': 'snap-%s-%s' % (snapshot_set, index),
+                                  'Tags': [{'Key': 'SnapshotSet', 'Value': snapshot_set}]})
+        ec2 = MockEC2Client(snapshots)
+        controller = EBSController(ec2, 'test', silent=True)
+
+        self.assertEqual(['2016-01-01T00:00:00Z'], controller.prune_snapshot_sets(2))
+        self.assertEqual(['snap-2016-01-01T00:00:00Z-0', 'snap-2016-01-01T00:00:00Z-1'], sorted(ec2.deleted_snapshots))
+
+    def test_enable_fast_snapshot_restores(self):
+        ec2 = MockRestoreEC2Client(states={('snap-a', 'us-east-1a'): 'enabled', ('snap-a', 'us-east-1b'): 'enabled'}, failing=['snap-c'])
+        controller = EBSController(ec2, 'test', silent=True)
+        with patch('cloudcompose.cluster.aws.ebs.sleep'):
+            enabled, prewarm = controller.enable_fast_snapshot_restores(['snap-a', 'snap-b', 'snap-c'], ['us-east-1a', 'us-east-1b'])
+
+        # snap-a was already enabled, so it is neither enabled nor disabled by this run
+        self.assertEqual(['snap-b', 'snap-c'], ec2.enable_calls[0]['SourceSnapshotIds'])
+        self.assertEqual(['snap-b'], enabled)
+        self.assertEqual(['snap-c'], prewarm)
+
+    def test_enable_fast_snapshot_restores_timeout(self):
+        ec2 = MockRestoreEC2Client(stuck=['snap-a'])
+        controller = EBSController(ec2, 'test', silent=True)
+        with patch('cloudcompose.cluster.aws.ebs.sleep'), patch('cloudcompose.cluster.aws.ebs.time', side_effect=[0, 0, 0, 100]):
+            enabled, prewarm = controller.enable_fast_snapshot_restores(['snap-a'], ['us-east-1a'], timeout=60)
+
+        # the snapshot still has to be disabled, but its volumes are prewarmed
+        self.assertEqual(['snap-a'], enabled)
+        self.assertEqual(['snap-a'], prewarm)
+
+    def test_already_enabled_fast_snapshot_restores(self):
+        ec2 = MockRestoreEC2Client(states={('snap-a', 'us-east-1a'): 'enabled'})
+        controller = EBSController(ec2, 'test', silent=True)
+        self.assertEqual(([], []), controller.enable_fast_snapshot_restores(['snap-a'], ['us-east-1a']))
+        self.assertEqual([], ec2.enable_calls)
+
+    def test_disable_fast_snapshot_restores(self):
+        ec2 = MockRestoreEC2Client()
+        controller = EBSController(ec2, 'test', silent=True)
+        controller.disable_fast_snapshot_restores([], ['us-east-1a'])
+        self.assertEqual([], ec2.disable_calls)
+
+        controller.disable_fast_snapshot_restores(['snap-b'], ['us-east-1a'])
+        self.assertEqual([{'AvailabilityZones': ['us-east-1a'], 'SourceSnapshotIds': ['snap-b']}], ec2.disable_calls)
+
+    def test_tag_volume_devices(self):
+        ec2 = MockEC2Client()
+        controller = EBSController(ec2, 'test', silent=True)
+        instances = [self._instance('i-1'), self._instance('i-2'), {'InstanceId': 'i-3'}]
+        volumes_by_device = controller.tag_volume_devices(instances)
+
+        self.assertEqual(['/dev/xvda', '/dev/xvdc', '/dev/xvdf'], sorted(volumes_by_device))
+        # one tagging call per device across all instances
+        self.assertEqual(3, len(ec2.create_tags_calls))
+        for call in ec2.create_tags_calls:
+            self.assertEqual(2, len(call['Resources']))
+            self.assertEqual('DeviceName', call['Tags'][0]['Key'])
+
+    def _instance(self, instance_id):
+        return {
+            'InstanceId': instance_id,
+            'RootDeviceName': '/dev/xvda',
+            'BlockDeviceMappings': [
+                {'DeviceName': '/dev/xvda', 'Ebs': {'VolumeId': 'vol-root'}},
+                {'DeviceName': '/dev/xvdc', 'Ebs': {'VolumeId': 'vol-data'}},
+                {'DeviceName': '/dev/xvdf', 'Ebs': {'VolumeId': 'vol-extra'}}
+            ]
+        }
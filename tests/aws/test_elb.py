@@ -0,0 +1,37 @@
+from builtins import object
+from unittest import TestCase
+from time import time
+from cloudcompose.cluster.aws.elb import TargetGroupController
+
+class MockELBv2Client(object):
+    def __init__(self, health):
+        self.health = health
+        self.describe_calls = 0
+
+    def describe_target_health(self, **kwargs):
+        self.describe_calls += 1
+        return {'TargetHealthDescriptions': [{'Target': {'Id': instance_id}, 'TargetHealth': {'State': state}}
+                                             for instance_id, state in self.health[kwargs['TargetGroupArn']].items()]}
+
+class TargetGroupControllerTest(TestCase):
+
+    def test_wait_healthy(self):
+        controller = self._controller({'tg-1': {'i-1': 'healthy', 'i-2': 'healthy'},
+                                       'tg-2': {'i-1': 'healthy', 'i-2': 'healthy', 'i-3': 'initial'}})
+        healthy = controller.wait_healthy('tg-1,tg-2', ['i-1', 'i-2'], time(), timeout=60)
+        self.assertEqual(['i-1', 'i-2'], sorted(healthy.keys()))
+        self.assertTrue(all(seconds is not None for seconds in healthy.values()))
+        # one describe call per target group
+        self.assertEqual(2, controller.elbv2.describe_calls)
+
+    def test_wait_healthy_timeout(self):
+        controller = self._controller({'tg-1': {'i-1': 'healthy', 'i-2': 'unhealthy'},
+                                       'tg-2': {'i-1': 'healthy'}})
+        healthy = controller.wait_healthy(['tg-1', {'arn': 'tg-2', 'port': 8080}], ['i-1', 'i-2'], time(), timeout=0)
+        self.assertIsNotNone(healthy['i-1'])
+        self.assertIsNone(healthy['i-2'])
+
+    def _controller(self, health):
+        controller = TargetGroupController('us-east-1', silent=True)
+        controller.elbv2 = MockELBv2Client(health)
+        return controller
@@ -0,0 +1,66 @@
+from builtins import object
+from unittest import TestCase
+from cloudcompose.cluster.aws.lifecycle import LifecycleController
+
+class MockASGClient(object):
+    def __init__(self, hooks=[], instances=0):
+        self.hooks = hooks
+        self.instances = instances
+        self.put_hooks = []
+        self.deleted_hooks = []
+        self.updates = []
+
+    def describe_lifecycle_hooks(self, **kwargs):
+        return {'LifecycleHooks': self.hooks}
+
+    def put_lifecycle_hook(self, **kwargs):
+        self.put_hooks.append(kwargs)
+
+    def delete_lifecycle_hook(self, **kwargs):
+        self.deleted_hooks.append(kwargs['LifecycleHookName'])
+
+    def describe_auto_scaling_groups(self, **kwargs):
+        return {'AutoScalingGroups': [{'Instances': [{'InstanceId': 'i-%s' % index, 'LifecycleState': 'InService'}
+                                                     for index in range(self.instances)]}]}
+
+    def update_auto_scaling_group(self, **kwargs):
+        self.updates.append(kwargs)
+        # the drained instances terminate right away
+        if 'DesiredCapacity' in kwargs:
+            self.instances = kwargs['DesiredCapacity']
+
+class LifecycleControllerTest(TestCase):
+
+    def test_hook_specifications(self):
+        controller = LifecycleController(MockASGClient(), 'test', silent=True)
+        self.assertEqual(['test-terminate'], [hook['LifecycleHookName'] for hook in controller.hook_specifications({})])
+        hooks = controller.hook_specifications({'launch': True, 'drain_timeout': 120})
+        self.assertEqual(['test-launch', 'test-terminate'], [hook['LifecycleHookName'] for hook in hooks])
+        self.assertEqual(['ABANDON', 'CONTINUE'], [hook['DefaultResult'] for hook in hooks])
+        self.assertEqual(120, hooks[1]['HeartbeatTimeout'])
+        self.assertEqual([], controller.hook_specifications({'terminate': False}))
+
+    def test_reconcile(self):
+        asg = MockASGClient(hooks=[
+            {'LifecycleHookName': 'test-terminate', 'LifecycleTransition': 'autoscaling:EC2_INSTANCE_TERMINATING',
+             'HeartbeatTimeout': 300, 'DefaultResult': 'CONTINUE', 'GlobalTimeout': 30000},
+            {'LifecycleHookName': 'test-launch', 'LifecycleTransition': 'autoscaling:EC2_INSTANCE_LAUNCHING',
+             'HeartbeatTimeout': 900, 'DefaultResult': 'ABANDON'},
+            {'LifecycleHookName': 'other', 'LifecycleTransition': 'autoscaling:EC2_INSTANCE_LAUNCHING'}
+        ])
+        controller = LifecycleController(asg, 'test', silent=True)
+        changed, stale = controller.reconcile({})
+
+        # unchanged hooks are not put again and hooks of others are kept
+        self.assertEqual([], changed)
+        self.assertEqual(['test-launch'], stale)
+        self.assertEqual(['test-launch'], asg.deleted_hooks)
+
+    def test_drain_in_batches(self):
+        asg = MockASGClient(instances=120)
+        controller = LifecycleController(asg, 'test', silent=True)
+
+        self.assertEqual(120, controller.drain(batch_size=50))
+        self.assertEqual([70, 20, 0], [update['DesiredCapacity'] for update in asg.updates[1:-1]])
+        self.assertEqual([70, 20, 0], [update['MaxSize'] for update in asg.updates[1:-1]])
+        self.assertEqual({'AutoScalingGroupName': 'test', 'MinSize': 0, 'MaxSize': 0, 'DesiredCapacity': 0}, asg.updates[-1])
@@ -0,0 +1,121 @@
+from builtins import object
+from unittest import TestCase
+from cloudcompose.cluster.aws.scaling import ScalingController
+from cloudcompose.exceptions import CloudComposeException
+
+class MockASGClient(object):
+    def __init__(self, scheduled_actions=[], policies=[]):
+        self.scheduled_actions = scheduled_actions
+        self.policies = policies
+        self.put_batches = []
+        self.delete_batches = []
+        self.put_policies = []
+        self.deleted_policies = []
+
+    def get_paginator(self, operation):
+        return MockPaginator(self, operation)
+
+    def batch_put_scheduled_update_group_action(self, **kwargs):
+        self.put_batches.append(kwargs['ScheduledUpdateGroupActions'])
+        return {'FailedScheduledUpdateGroupActions': []}
+
+    def batch_delete_scheduled_action(self, **kwargs):
+        self.delete_batches.append(kwargs['ScheduledActionNames'])
+        return {'FailedScheduledActions': []}
+
+    def put_scaling_policy(self, **kwargs):
+        self.put_policies.append(kwargs)
+
+    def delete_policy(self, **kwargs):
+        self.deleted_policies.append(kwargs['PolicyName'])
+
+class MockPaginator(object):
+    def __init__(self, client, operation):
+        self.client = client
+        self.operation = operation
+
+    def paginate(self, **kwargs):
+        if self.operation == 'describe_scheduled_actions':
+            return [{'ScheduledUpdateGroupActions': self.client.scheduled_actions}]
+        return [{'ScalingPolicies': self.client.policies}]
+
+class ScalingControllerTest(TestCase):
+
+    def test_capacity(self):
+        controller = ScalingController(MockASGClient(), 'test', silent=True)
+        self.assertEqual((3, 3, 3), controller.capacity({}, 3))
+        self.assertEqual((2, 10, 3), controller.capacity({'min': 2, 'max': 10}, 3))
+        self.assertEqual((4, 10, 4), controller.capacity({'min': 4, 'max': 10}, 3))
+        self.assertRaises(CloudComposeException, controller.capacity, {'min': 4, 'max': 2}, 3)
+
+    def test_update_args_keep_desired_capacity(self):
+        controller = ScalingController(MockASGClient(), 'test', silent=True)
+        group = {'MinSize': 3, 'MaxSize': 12, 'DesiredCapacity': 9}
+        # a scheduled scale out is not undone
+        self.assertEqual({}, controller.update_args(group, 3, 12))
+        self.assertEqual({'MaxSize': 6, 'DesiredCapacity': 6}, controller.update_args(group, 3, 6))
+        self.assertEqual({'MinSize': 3, 'MaxSize': 3, 'DesiredCapacity': 3},
+                         controller.update_args({'MinSize': 0, 'MaxSize': 0, 'DesiredCapacity': 0}, 3, 3))
+
+    def test_reconcile_scheduled_actions(self):
+        asg = MockASGClient(scheduled_actions=[
+            {'ScheduledActionName': 'peak', 'Recurrence': '0 7 * * *', 'MinSize': 6, 'MaxSize': 12, 'DesiredCapacity': 9},
+            {'ScheduledActionName': 'night', 'Recurrence': '0 22 * * *', 'MinSize': 3, 'MaxSize': 12, 'DesiredCapacity': 3},
+            {'ScheduledActionName': 'old', 'Recurrence': '0 1 * * *', 'MinSize': 1}
+        ])
+        controller = ScalingController(asg, 'test', silent=True)
+        scheduled = [
+            {'name': 'peak', 'recurrence': '0 7 * * *', 'min': 6, 'max': 12, 'desired': 9},
+            {'name': 'night', 'recurrence': '0 21 * * *', 'min': 3, 'max': 12, 'desired': 3}
+        ]
+        changed, stale = controller.reconcile_scheduled_actions(scheduled)
+
+        self.assertEqual(['night'], [action['ScheduledActionName'] for action in changed])
+        self.assertEqual(['old'], stale)
+        self.assertEqual([changed], asg.put_batches)
+        self.assertEqual([['old']], asg.delete_batches)
+
+    def test_scheduled_actions_are_batched(self):
+        asg = MockASGClient()
+        controller = ScalingController(asg, 'test', silent=True)
+        scheduled = [{'name': 'action-%s' % index, 'recurrence': '%s * * * *' % index, 'desired': 3} for index in range(60)]
+        controller.reconcile_scheduled_actions(scheduled)
+        self.assertEqual([50, 10], [len(batch) for batch in asg.put_batches])
+
+    def test_delete_configured_scheduled_actions(self):
+        asg = MockASGClient(scheduled_actions=[
+            {'ScheduledActionName': 'peak', 'Recurrence': '0 7 * * *', 'MinSize': 6},
+            {'ScheduledActionName': 'external', 'Recurrence': '0 1 * * *', 'MinSize': 1}
+        ])
+        controller = ScalingController(asg, 'test', silent=True)
+
+        self.assertEqual(['peak'], controller.delete_scheduled_actions([{'name': 'peak'}, {'name': 'night'}]))
+        self.assertEqual([['peak']], asg.delete_batches)
+
+    def test_reconcile_policies(self):
+        asg = MockASGClient(policies=[
+            {'PolicyName': 'cpu', 'PolicyType': 'TargetTrackingScaling',
+             'TargetTrackingConfiguration': {'PredefinedMetricSpecification': {'PredefinedMetricType': 'ASGAverageCPUUtilization'},
+                                             'TargetValue': 50.0, 'DisableScaleIn': False}}
+        ])
+        controller = ScalingController(asg, 'test', silent=True)
+        policies = [
+            {'name': 'cpu', 'target': 50},
+            {'name': 'forecast', 'type': 'predictive', 'metric': 'ASGCPUUtilization', 'target': 40, 'buffer_time': 600}
+        ]
+        changed, stale = controller.reconcile_policies(policies)
+
+        self.assertEqual(['forecast'], [policy['PolicyName'] for policy in asg.put_policies])
+        self.assertEqual(600, asg.put_policies[0]['PredictiveScalingConfiguration']['SchedulingBufferTime'])
+        self.assertEqual([], stale)
+        self.assertRaises(CloudComposeException, controller.reconcile_policies, [{'name': 'step', 'type': 'step', 'target': 1}])
+
+    def test_default_policy_metrics(self):
+        asg = MockASGClient()
+        controller = ScalingController(asg, 'test', silent=True)
+        controller.reconcile_policies([{'name': 'cpu', 'target': 50}, {'name': 'forecast', 'type': 'predictive', 'target': 40}])
+
+        self.assertEqual('ASGAverageCPUUtilization',
+                         asg.put_policies[0]['TargetTrackingConfiguration']['PredefinedMetricSpecification']['PredefinedMetricType'])
+        specification = asg.put_policies[1]['PredictiveScalingConfiguration']['MetricSpecifications'][0]
+        self.assertEqual('ASGCPUUtilization', specification['PredefinedMetricPairSpecification']['PredefinedMetricType'])
@@ -0,0 +1,52 @@
+#!/bin/bash
+# asg_lifecycle.sh
+CC_LIFECYCLE_TOKEN=$(curl -s -m 2 -X PUT -H "X-aws-ec2-metadata-token-ttl-seconds: 300" http://169.254.169.254/latest/api/token)
+CC_LIFECYCLE_INSTANCE_ID=$(curl -s -m 2 -H "X-aws-ec2-metadata-token: $CC_LIFECYCLE_TOKEN" http://169.254.169.254/latest/meta-data/instance-id)
+CC_LIFECYCLE_REGION=$(curl -s -m 2 -H "X-aws-ec2-metadata-token: $CC_LIFECYCLE_TOKEN" http://169.254.169.254/latest/meta-data/placement/region)
+cat << 'EOF_DRAIN' > /usr/local/bin/cloud-compose-drain
+#!/bin/bash
+# waits for the termination lifecycle hook, drains the node and lets the termination continue
+metadata() {
+  local token=$(curl -s -m 2 -X PUT -H "X-aws-ec2-metadata-token-ttl-seconds: 300" http://169.254.169.254/latest/api/token)
+  curl -s -m 2 -H "X-aws-ec2-metadata-token: $token" http://169.254.169.254/latest/meta-data/$1
+}
+while [ "$(metadata autoscaling/target-lifecycle-state)" != "Terminated" ]; do
+  sleep 5
+done
+docker exec mongodb mongo --eval 'rs.stepDown(60)'
+docker ps -q | xargs -r docker stop -t 60
+aws autoscaling complete-lifecycle-action --region $(metadata placement/region) --instance-id $(metadata instance-id) \
+  --auto-scaling-group-name asg-lifecycle --lifecycle-hook-name asg-lifecycle-terminate --lifecycle-action-result CONTINUE
+EOF_DRAIN
+chmod +x /usr/local/bin/cloud-compose-drain
+cat << 'EOF_DRAIN_UNIT' > /etc/systemd/system/cloud-compose-drain.service
+[Unit]
+Description=cloud-compose drain handler
+After=docker.service
+
+[Service]
+ExecStart=/usr/local/bin/cloud-compose-drain
+Restart=on-failure
+
+[Install]
+WantedBy=multi-user.target
+EOF_DRAIN_UNIT
+systemctl daemon-reload
+systemctl enable cloud-compose-drain.service
+systemctl start cloud-compose-drain.service
+# docker_compose.run.sh 
+cat << EOF > /tmp/docker-compose.yml
+mongodb:
+  container_name: mongodb 
+  command: --shardsvr --replSet rs0 --dbpath /data/db
+  ports:
+    - "27018:27018"
+
+EOF
+cat << EOF > /tmp/docker-compose.override.yml
+mongodb:
+  image: washpost/mongodb:3.2
+EOF
+# asg_lifecycle.ready.sh
+aws autoscaling complete-lifecycle-action --region $CC_LIFECYCLE_REGION --instance-id $CC_LIFECYCLE_INSTANCE_ID \
+  --auto-scaling-group-name asg-lifecycle --lifecycle-hook-name asg-lifecycle-launch --lifecycle-action-result CONTINUE
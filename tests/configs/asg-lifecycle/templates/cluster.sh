@@ -0,0 +1,2 @@
+#!/bin/bash
+{% include "docker_compose.run.sh" %}
@@ -0,0 +1,29 @@
+#!/bin/bash
+# system.mounts.sh
+mkfs -t ext4 /dev/xvdc
+echo -e '/dev/xvdc\t/data/mongodb\text4\tdefaults,noatime\t0\t0' >> /etc/fstab
+mkdir -p /data/mongodb
+mount /data/mongodb
+# docker_compose.run.sh 
+cat << EOF > /tmp/docker-compose.yml
+mongodb:
+  container_name: mongodb 
+  command: --shardsvr --replSet rs0 --dbpath /data/db
+  ports:
+    - "27018:27018"
+
+EOF
+cat << EOF > /tmp/docker-compose.override.yml
+mongodb:
+  image: washpost/mongodb:3.2
+  volumes:
+    - "/data/mongodb/mongodb:/data/db"
+  log_driver: awslogs
+  log_opt:
+    awslogs-force-flush-interval-seconds: "5"
+    awslogs-group: "awslogs-mongodb"
+    awslogs-region: "us-west-2"
+    max-buffer-size: "4m"
+    mode: "non-blocking"
+    tag: "{{.Name}}"
+EOF
@@ -0,0 +1,27 @@
+#!/bin/bash
+yum install -y nfs-utils
+# bake.sh
+mkdir -p /tmp/cloud-compose-bake
+cat << 'EOF_DOCKER_COMPOSE' > /tmp/cloud-compose-bake/docker-compose.yml
+mongodb:
+  container_name: mongodb 
+  command: --shardsvr --replSet rs0 --dbpath /data/db
+  ports:
+    - "27018:27018"
+
+EOF_DOCKER_COMPOSE
+cat << 'EOF_DOCKER_COMPOSE' > /tmp/cloud-compose-bake/docker-compose.override.yml
+mongodb:
+  image: washpost/mongodb:3.2
+  extra_hosts:
+    - "node0:10.0.10.10"
+  volumes:
+    - "/data/mongodb/mongodb:/data/db"
+  environment:
+    MONGODB_OPTIONS: "-h"
+EOF_DOCKER_COMPOSE
+(cd /tmp/cloud-compose-bake && docker-compose pull)
+rm -rf /tmp/cloud-compose-bake
+# let cloud-init run again on the nodes that boot from the image
+cloud-init clean --logs
+shutdown -h now
\ No newline at end of file
@@ -0,0 +1,10 @@
+#!/bin/bash
+{%- if not _bake %}
+{% include "system.mounts.sh" %}
+{%- endif %}
+{%- if not _baked %}
+yum install -y nfs-utils
+{%- endif %}
+{%- if not _bake %}
+{% include "docker_compose.run.sh" %}
+{%- endif %}
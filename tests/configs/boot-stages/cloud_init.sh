@@ -0,0 +1,126 @@
+#!/bin/bash
+# boot_stages.sh
+CC_STAGE_DIR=/var/lib/cloud-compose/stages
+rm -rf $CC_STAGE_DIR
+mkdir -p $CC_STAGE_DIR
+cc_wait_stage() {
+  local stage
+  for stage in "$@"; do
+    while [ ! -e $CC_STAGE_DIR/$stage.done ]; do
+      if [ -e $CC_STAGE_DIR/$stage.failed ]; then
+        echo "boot stage $stage failed, see $CC_STAGE_DIR/$stage.log" >&2
+        return 1
+      fi
+      sleep 0.5
+    done
+  done
+}
+cc_run_stage() {
+  local stage=$1
+  local requires=$2
+  shift 2
+  (
+    if cc_wait_stage $requires && "$@" > $CC_STAGE_DIR/$stage.log 2>&1; then
+      touch $CC_STAGE_DIR/$stage.done
+      type cc_mark_phase > /dev/null 2>&1 && cc_mark_phase stage:$stage
+    else
+      touch $CC_STAGE_DIR/$stage.failed
+    fi
+  ) &
+}
+cc_wait_device() {
+  local i
+  for i in $(seq 1 120); do
+    [ -b $1 ] && return 0
+    sleep 0.5
+  done
+  echo "device $1 is not attached" >&2
+  return 1
+}
+cc_stage_volume_docker() {
+  cc_wait_device /dev/xvdb || return 1
+  systemctl enable lvm2-lvmetad.service lvm2-lvmetad.socket
+  systemctl start lvm2-lvmetad.service lvm2-lvmetad.socket
+  pvcreate /dev/xvdb || return 1
+  vgcreate docker /dev/xvdb || return 1
+  lvcreate -L 19G -n data -Z n docker || return 1
+  lvcreate -L 1G -n metadata -Z n docker || return 1
+  udevadm control --reload-rules
+  udevadm trigger
+  cat << EOF_DOCKER_STORAGE > /etc/sysconfig/docker-storage
+DOCKER_STORAGE_OPTIONS='--storage-driver=devicemapper --storage-opt dm.datadev=/dev/docker/data --storage-opt dm.metadatadev=/dev/docker/metadata  --storage-opt dm.basesize=20G'
+EOF_DOCKER_STORAGE
+  systemctl restart docker
+}
+cc_stage_volume_data() {
+  cc_wait_device /dev/xvdc || return 1
+  mkfs -t ext4 -F -E lazy_itable_init=1,lazy_journal_init=1,nodiscard /dev/xvdc || return 1
+  echo -e '/dev/xvdc\t/data/mongodb\text4\tdefaults,noatime\t0\t0' >> /etc/fstab
+  mkdir -p /data/mongodb
+  mount /data/mongodb || return 1
+}
+cc_stage_volume_journal() {
+  cc_wait_device /dev/xvdd || return 1
+  echo -e '/dev/xvdd\t/data/journal\txfs\tdefaults,noatime\t0\t0' >> /etc/fstab
+  mkdir -p /data/journal
+  mount /data/journal || return 1
+  xfs_growfs /data/journal
+}
+cc_stage_mounts() {
+  true
+}
+cc_stage_pull() {
+  mkdir -p /tmp/cloud-compose-pull
+  cat << 'EOF_DOCKER_COMPOSE' > /tmp/cloud-compose-pull/docker-compose.yml
+mongodb:
+  container_name: mongodb 
+  command: --shardsvr --replSet rs0 --dbpath /data/db
+  ports:
+    - "27018:27018"
+
+EOF_DOCKER_COMPOSE
+  cat << 'EOF_DOCKER_COMPOSE' > /tmp/cloud-compose-pull/docker-compose.override.yml
+mongodb:
+  image: washpost/mongodb:3.2
+  extra_hosts:
+    - "node0:10.0.10.10"
+  volumes:
+    - "/data/mongodb/mongodb:/data/db"
+  environment:
+    MONGODB_OPTIONS: "-h"
+EOF_DOCKER_COMPOSE
+  (cd /tmp/cloud-compose-pull && docker-compose pull)
+}
+cc_stage_sysctl() {
+  sysctl -w vm.max_map_count=262144
+}
+cc_stage_mongodb_permissions() {
+  chown -R 999:999 /data/mongodb
+}
+cc_run_stage volume-docker "" cc_stage_volume_docker
+cc_run_stage volume-data "" cc_stage_volume_data
+cc_run_stage volume-journal "" cc_stage_volume_journal
+cc_run_stage mounts "volume-docker volume-data volume-journal" cc_stage_mounts
+cc_run_stage pull "volume-docker" cc_stage_pull
+cc_run_stage sysctl "" cc_stage_sysctl
+cc_run_stage mongodb-permissions "volume-data" cc_stage_mongodb_permissions
+cc_wait_stage mounts pull mongodb-permissions || exit 1
+# docker_compose.run.sh 
+cat << EOF > /tmp/docker-compose.yml
+mongodb:
+  container_name: mongodb 
+  command: --shardsvr --replSet rs0 --dbpath /data/db
+  ports:
+    - "27018:27018"
+
+EOF
+cat << EOF > /tmp/docker-compose.override.yml
+mongodb:
+  image: washpost/mongodb:3.2
+  extra_hosts:
+    - "node0:10.0.10.10"
+  volumes:
+    - "/data/mongodb/mongodb:/data/db"
+  environment:
+    MONGODB_OPTIONS: "-h"
+EOF
\ No newline at end of file
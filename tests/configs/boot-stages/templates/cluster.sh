@@ -0,0 +1,3 @@
+#!/bin/bash
+cc_wait_stage mounts pull mongodb-permissions || exit 1
+{% include "docker_compose.run.sh" %}
@@ -0,0 +1,36 @@
+#!/bin/bash
+# boot_timings.sh
+CC_IMDS_TOKEN=$(curl -s -m 2 -X PUT -H "X-aws-ec2-metadata-token-ttl-seconds: 21600" http://169.254.169.254/latest/api/token)
+CC_INSTANCE_ID=$(curl -s -m 2 -H "X-aws-ec2-metadata-token: $CC_IMDS_TOKEN" http://169.254.169.254/latest/meta-data/instance-id)
+CC_REGION=$(curl -s -m 2 -H "X-aws-ec2-metadata-token: $CC_IMDS_TOKEN" http://169.254.169.254/latest/meta-data/placement/region)
+cc_mark_phase() {
+  curl -s -m 2 -X POST -d "instance=$CC_INSTANCE_ID&phase=$1&timestamp=$(date +%s.%3N)" http://127.0.0.1:8125/boot > /dev/null 2>&1 &
+}
+cc_mark_phase cloud_init
+# system.mounts.sh
+mkfs -t ext4 /dev/xvdc
+echo -e '/dev/xvdc\t/data/mongodb\text4\tdefaults,noatime\t0\t0' >> /etc/fstab
+mkdir -p /data/mongodb
+mount /data/mongodb
+# docker_compose.run.sh 
+cat << EOF > /tmp/docker-compose.yml
+mongodb:
+  container_name: mongodb 
+  command: --shardsvr --replSet rs0 --dbpath /data/db
+  ports:
+    - "27018:27018"
+
+EOF
+cat << EOF > /tmp/docker-compose.override.yml
+mongodb:
+  image: washpost/mongodb:3.2
+  extra_hosts:
+    - "node0:10.0.10.10"
+  volumes:
+    - "/data/mongodb/mongodb:/data/db"
+  environment:
+    MONGODB_OPTIONS: "-h"
+EOF
+# boot_timings.ready.sh
+cc_mark_phase ready
+wait $!
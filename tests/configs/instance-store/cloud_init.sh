@@ -0,0 +1,41 @@
+#!/bin/bash
+# instance_store.raid.sh
+INSTANCE_STORE_DEVICES=$(ls /dev/disk/by-id/nvme-Amazon_EC2_NVMe_Instance_Storage_* 2> /dev/null | grep -v -- -part | xargs -r readlink -f | sort -u)
+INSTANCE_STORE_COUNT=$(echo $INSTANCE_STORE_DEVICES | wc -w)
+INSTANCE_STORE_DEVICE=$INSTANCE_STORE_DEVICES
+for device in $INSTANCE_STORE_DEVICES; do
+  umount $device > /dev/null 2>&1 || true
+done
+if [ $INSTANCE_STORE_COUNT -gt 1 ]; then
+  mdadm --create /dev/md0 --run --level=0 --raid-devices=$INSTANCE_STORE_COUNT $INSTANCE_STORE_DEVICES
+  INSTANCE_STORE_DEVICE=/dev/md0
+fi
+if [ $INSTANCE_STORE_COUNT -gt 0 ]; then
+  mkfs -t xfs -f -K $INSTANCE_STORE_DEVICE
+  mkdir -p /data/scratch
+  mount -o defaults,noatime $INSTANCE_STORE_DEVICE /data/scratch
+fi
+# system.mounts.sh
+mkfs -t ext4 /dev/xvdc
+echo -e '/dev/xvdc\t/data/mongodb\text4\tdefaults,noatime\t0\t0' >> /etc/fstab
+mkdir -p /data/mongodb
+mount /data/mongodb
+# docker_compose.run.sh 
+cat << EOF > /tmp/docker-compose.yml
+mongodb:
+  container_name: mongodb 
+  command: --shardsvr --replSet rs0 --dbpath /data/db
+  ports:
+    - "27018:27018"
+
+EOF
+cat << EOF > /tmp/docker-compose.override.yml
+mongodb:
+  image: washpost/mongodb:3.2
+  extra_hosts:
+    - "node0:10.0.10.10"
+  volumes:
+    - "/data/mongodb/mongodb:/data/db"
+  environment:
+    MONGODB_OPTIONS: "-h"
+EOF
\ No newline at end of file
@@ -0,0 +1,13 @@
+#!/bin/bash
+# system.mounts.sh
+mkfs -t ext4 /dev/xvdc
+echo -e '/dev/xvdc\t/data/mongodb\text4\tdefaults,noatime\t0\t0' >> /etc/fstab
+mkdir -p /data/mongodb
+mount /data/mongodb
+# docker_compose.run.sh 
+cat << EOF > /tmp/docker-compose.yml
+{"services":{"mongodb":{"command":"--shardsvr --replSet rs0 --dbpath /data/db","container_name":"mongodb","environment":{"MONGODB_OPTIONS":"-h","MONGODB_ROLE":"shard"},"extra_hosts":["node0:10.0.10.10","node1:10.0.10.11"],"image":"washpost/mongodb:3.2","ports":["27018:27018"],"volumes":["/data/mongodb/mongodb:/data/db"]},"router":{"depends_on":["mongodb"],"image":"washpost/mongodb:3.2","labels":{"cloud-compose.nodes":"0, 1"}}},"version":"2"}
+EOF
+cat << EOF > /tmp/docker-compose.override.yml
+{"version":"2"}
+EOF
\ No newline at end of file
@@ -0,0 +1,31 @@
+#!/bin/bash
+# system.mounts.sh
+echo -e '/dev/xvdc\t/data/mongodb\text4\tdefaults,noatime\t0\t0' >> /etc/fstab
+mkdir -p /data/mongodb
+mount /data/mongodb
+resize2fs /dev/xvdc
+# docker_compose.run.sh 
+cat << EOF > /tmp/docker-compose.yml
+mongodb:
+  container_name: mongodb 
+  command: --shardsvr --replSet rs0 --dbpath /data/db
+  ports:
+    - "27018:27018"
+
+EOF
+cat << EOF > /tmp/docker-compose.override.yml
+mongodb:
+  image: washpost/mongodb:3.2
+  extra_hosts:
+    - "node0:10.0.10.10"
+  volumes:
+    - "/data/mongodb/mongodb:/data/db"
+  environment:
+    MONGODB_OPTIONS: "-h"
+EOF
+# snapshot.prewarm.sh
+if command -v fio > /dev/null 2>&1; then
+  nohup fio --filename=/dev/xvdc --rw=read --bs=1M --iodepth=32 --ioengine=libaio --direct=1 --name=prewarm-data > /dev/null 2>&1 &
+else
+  nohup dd if=/dev/xvdc of=/dev/null bs=1M > /dev/null 2>&1 &
+fi
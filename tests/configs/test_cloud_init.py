@@ -16,15 +16,43 @@ class CloudInitTest(TestCase):
     def test_subtree_with_overrides_config(self):
         self._cloud_init_comparator('subtree-with-overrides')
 
-    def _cloud_init_comparator(self, config_dir):
+    def test_prewarm_config(self):
+        self._cloud_init_comparator('prewarm')
+
+    def test_instance_store_config(self):
+        self._cloud_init_comparator('instance-store')
+
+    def test_boot_timings_config(self):
+        self._cloud_init_comparator('boot-timings')
+
+    def test_boot_stages_config(self):
+        self._cloud_init_comparator('boot-stages')
+
+    def test_minify_compose_config(self):
+        self._cloud_init_comparator('minify-compose', node_id=0)
+
+    def test_awslogs_config(self):
+        self._cloud_init_comparator('awslogs', node_id=0)
+
+    def test_asg_lifecycle_config(self):
+        self._cloud_init_comparator('asg-lifecycle', node_id='asg-lifecycle')
+
+    def test_bake_config(self):
+        self._cloud_init_comparator('bake', 'bake_init.sh', node_id='bake', bake=True)
+
+    def test_null_discovery_config(self):
+        # an empty discovery section in the yaml is loaded as None
+        self.assertEqual(([], []), CloudInit()._builtin_templates({'aws': {'discovery': None}}))
+
+    def _cloud_init_comparator(self, config_dir, expected_file='cloud_init.sh', **kwargs):
         base_dir = join(TEST_ROOT, config_dir)
         cloud_config = CloudConfig(base_dir)
         cloud_init = CloudInit(base_dir=base_dir)
-        actual_cloud_init = cloud_init.build(cloud_config.config_data('cluster'))
-        expected_cloud_init = self._read_cloud_init(base_dir)
+        actual_cloud_init = cloud_init.build(cloud_config.config_data('cluster'), **kwargs)
+        expected_cloud_init = self._read_cloud_init(base_dir, expected_file)
         self.assertEquals(actual_cloud_init.strip(), expected_cloud_init.strip())
 
-    def _read_cloud_init(self, base_dir):
-        with open(join(base_dir, 'cloud_init.sh'), 'r') as f:
+    def _read_cloud_init(self, base_dir, expected_file='cloud_init.sh'):
+        with open(join(base_dir, expected_file), 'r') as f:
             contents = f.read()
         return contents
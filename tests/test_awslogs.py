@@ -0,0 +1,31 @@
+from unittest import TestCase
+from cloudcompose.cluster.awslogs import AwsLogs
+from cloudcompose.exceptions import CloudComposeException
+
+class AwsLogsTest(TestCase):
+
+    def test_options(self):
+        awslogs = AwsLogs({'logging': {'driver': 'awslogs', 'meta': {
+            'group': 'test', 'mode': 'non-blocking', 'max_buffer_size': '4m', 'stream': 'container',
+            'services': {'web': {'group': 'test-web', 'stream': 'web'}}
+        }}})
+        context = awslogs.context('us-east-1')
+
+        self.assertEqual({'awslogs-region': 'us-east-1', 'awslogs-group': 'test', 'tag': '{{.ID}}',
+                          'mode': 'non-blocking', 'max-buffer-size': '4m'}, context['options'])
+        self.assertEqual('test-web', context['services']['web']['awslogs-group'])
+        self.assertEqual('web', context['services']['web']['awslogs-stream'])
+        self.assertEqual('non-blocking', context['services']['web']['mode'])
+
+    def test_invalid_mode(self):
+        awslogs = AwsLogs({'logging': {'driver': 'awslogs', 'meta': {'group': 'test', 'mode': 'async'}}})
+        self.assertRaises(CloudComposeException, awslogs.options, 'us-east-1')
+
+    def test_log_groups(self):
+        awslogs = AwsLogs({'logging': {'driver': 'awslogs', 'meta': {
+            'group': 'test', 'retention': 14,
+            'services': {'web': {'group': 'test-web', 'retention': 7}, 'worker': {'mode': 'non-blocking'}}
+        }}})
+        self.assertTrue(awslogs.enabled)
+        self.assertEqual({'test': 14, 'test-web': 7}, awslogs.log_groups())
+        self.assertFalse(AwsLogs({}).enabled)
@@ -0,0 +1,36 @@
+from unittest import TestCase
+from cloudcompose.cluster.bootstages import BootStages
+from cloudcompose.exceptions import CloudComposeException
+
+class BootStagesTest(TestCase):
+    volumes = [
+        {'name': 'root', 'size': '30G'},
+        {'name': 'docker', 'block': '/dev/xvdb', 'file_system': 'lvm2', 'meta': {'group': 'docker', 'volumes': []}},
+        {'name': 'data', 'block': '/dev/xvdc', 'file_system': 'ext4', 'meta': {'format': True, 'mount': '/data'}}
+    ]
+
+    def test_stages(self):
+        stages = self._stages([{'name': 'permissions', 'requires': 'volume-data', 'run': 'chown 999 /data'},
+                               {'name': 'sysctl', 'run': 'sysctl -p'}])
+
+        self.assertEqual(['volume-docker', 'volume-data', 'mounts', 'pull', 'permissions', 'sysctl'], [stage['name'] for stage in stages])
+        requires = dict((stage['name'], stage['requires']) for stage in stages)
+        self.assertEqual(['volume-docker', 'volume-data'], requires['mounts'])
+        # only the docker storage has to be ready before pulling
+        self.assertEqual(['volume-docker'], requires['pull'])
+        self.assertEqual('cc_stage_volume_docker', stages[0]['function'])
+
+    def test_custom_stages_are_ordered_after_their_requirements(self):
+        stages = self._stages([{'name': 'start', 'requires': ['setup', 'mounts'], 'run': 'true'},
+                               {'name': 'setup', 'run': 'true'}])
+        names = [stage['name'] for stage in stages]
+        self.assertTrue(names.index('setup') < names.index('start'))
+
+    def test_invalid_requirements(self):
+        self.assertRaises(CloudComposeException, self._stages, [{'name': 'a', 'requires': 'missing', 'run': 'true'}])
+        self.assertRaises(CloudComposeException, self._stages, [{'name': 'a', 'requires': 'b', 'run': 'true'},
+                                                                {'name': 'b', 'requires': 'a', 'run': 'true'}])
+
+    def _stages(self, custom_stages):
+        config_data = {'aws': {'volumes': self.volumes}, 'boot_stages': {'stages': custom_stages}}
+        return BootStages(config_data).stages()
@@ -0,0 +1,25 @@
+from unittest import TestCase
+from datetime import datetime
+from dateutil.tz import tzutc
+from cloudcompose.cluster.boottimings import BootTimings
+
+class BootTimingsTest(TestCase):
+
+    def test_summary(self):
+        boot_timings = BootTimings()
+        for node in range(10):
+            boot_timings.add_instance({
+                'LaunchTime': datetime(2016, 1, 1, 0, 0, 0, tzinfo=tzutc()),
+                'Tags': [
+                    {'Key': 'Name', 'Value': 'test-%s' % node},
+                    {'Key': 'cloud-compose:boot:cloud_init', 'Value': str(1451606400 + 30)},
+                    {'Key': 'cloud-compose:boot:ready', 'Value': str(1451606400 + 30 + node + 1)}
+                ]
+            })
+
+        self.assertEqual([('cloud_init', 10, 30.0, 30.0, 30.0), ('ready', 10, 5.0, 9.0, 10.0)], boot_timings.summary())
+
+    def test_instances_without_markers_are_ignored(self):
+        boot_timings = BootTimings()
+        boot_timings.add_instance({'LaunchTime': datetime(2016, 1, 1, tzinfo=tzutc()), 'Tags': []})
+        self.assertEqual([], boot_timings.summary())
@@ -0,0 +1,74 @@
+from tempfile import mkdtemp
+from shutil import copytree, rmtree
+from os import environ, makedirs
+from os.path import abspath, join, dirname
+from unittest import TestCase
+from cloudcompose.cluster import buildcache
+from cloudcompose.cluster.buildcache import BuildCache
+from cloudcompose.config import CloudConfig
+
+TEST_ROOT = abspath(join(dirname(__file__), 'configs'))
+
+class BuildCacheTest(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+        self.base_dir = join(self.tmp_dir, 'simple')
+        copytree(join(TEST_ROOT, 'simple'), self.base_dir)
+        self.build_cache = BuildCache(CloudConfig(self.base_dir), base_dir=self.base_dir, cache_dir=join(self.tmp_dir, 'cache'))
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def test_cached_build(self):
+        script, cached = self.build_cache.build()
+        self.assertFalse(cached)
+        self.assertEqual((script, True), self.build_cache.build())
+
+        with open(join(self.base_dir, 'templates', 'cluster.sh'), 'a') as f:
+            f.write('echo changed\n')
+        script, cached = self.build_cache.build()
+        self.assertFalse(cached)
+        self.assertTrue(script.strip().endswith('echo changed'))
+
+    def test_included_subdirectory_template(self):
+        config_data = self.build_cache.cloud_config.config_data('cluster')
+        input_hash = self.build_cache.input_hash(config_data)
+        makedirs(join(self.base_dir, 'templates', 'sub'))
+        with open(join(self.base_dir, 'templates', 'sub', 'x.sh'), 'w') as f:
+            f.write('echo included\n')
+        self.assertNotEqual(input_hash, self.build_cache.input_hash(config_data))
+
+    def test_plugin_code(self):
+        config_data = self.build_cache.cloud_config.config_data('cluster')
+        self.assertIn(buildcache.__file__.replace('.pyc', '.py'), self.build_cache.plugin_files())
+        input_hash = self.build_cache.input_hash(config_data)
+        plugin_files = self.build_cache.plugin_files
+        # a plugin upgrade changes the rendering code
+        self.build_cache.plugin_files = lambda: plugin_files()[1:]
+        self.assertNotEqual(input_hash, self.build_cache.input_hash(config_data))
+
+    def test_referenced_environment(self):
+        config_data = self.build_cache.cloud_config.config_data('cluster')
+        input_hash = self.build_cache.input_hash(config_data)
+        environ['CLOUD_COMPOSE_UNUSED_VARIABLE'] = 'changed'
+        try:
+            self.assertEqual(input_hash, self.build_cache.input_hash(config_data))
+        finally:
+            del environ['CLOUD_COMPOSE_UNUSED_VARIABLE']
+
+        # the override template references MONGODB_OPTIONS
+        saved = environ.get('MONGODB_OPTIONS')
+        environ['MONGODB_OPTIONS'] = '--changed'
+        try:
+            self.assertNotEqual(input_hash, self.build_cache.input_hash(config_data))
+        finally:
+            if saved is None:
+                del environ['MONGODB_OPTIONS']
+            else:
+                environ['MONGODB_OPTIONS'] = saved
+
+    def test_build_nodes(self):
+        output_dir = join(self.tmp_dir, 'output')
+        self.assertEqual([join(output_dir, '0.sh')], self.build_cache.build_nodes(output_dir))
+        self.assertEqual([], self.build_cache.build_nodes(output_dir))
@@ -0,0 +1,44 @@
+from unittest import TestCase
+from cloudcompose.cluster.dockercompose import DockerCompose
+
+class DockerComposeTest(TestCase):
+
+    def test_merge(self):
+        docker_compose = {
+            'mongodb': {
+                'image': 'mongo:3.0',
+                'ports': ['27017:27017'],
+                'environment': ['ROLE=shard', 'DEBUG'],
+                'volumes': ['/data:/data/db', '/logs:/var/log']
+            }
+        }
+        docker_compose_override = {
+            'mongodb': {
+                'image': 'mongo:3.2',
+                'ports': ['27018:27018'],
+                'environment': {'ROLE': 'config'},
+                'volumes': ['/mnt/data:/data/db']
+            },
+            'router': {'image': 'mongos:3.2'}
+        }
+        merged = DockerCompose().merge(docker_compose, docker_compose_override)
+
+        self.assertEqual('mongo:3.2', merged['mongodb']['image'])
+        self.assertEqual(['27017:27017', '27018:27018'], merged['mongodb']['ports'])
+        self.assertEqual({'ROLE': 'config', 'DEBUG': None}, merged['mongodb']['environment'])
+        self.assertEqual(['/logs:/var/log', '/mnt/data:/data/db'], sorted(merged['mongodb']['volumes']))
+        self.assertEqual({'image': 'mongos:3.2'}, merged['router'])
+
+    def test_node_services(self):
+        services = {
+            'mongodb': {},
+            'router': {'depends_on': ['mongodb']},
+            'config': {'labels': {'cloud-compose.nodes': '1,2'}},
+            'arbiter': {'labels': ['cloud-compose.nodes=0']}
+        }
+        docker_compose = DockerCompose()
+
+        self.assertEqual(set(['mongodb', 'router', 'arbiter']), docker_compose._node_services(services, {'id': 0}, 'cloud-compose.nodes'))
+        self.assertEqual(set(['mongodb', 'router', 'config']), docker_compose._node_services(services, {'id': 2}, 'cloud-compose.nodes'))
+        # listed services bring the services they depend on
+        self.assertEqual(set(['mongodb', 'router']), docker_compose._node_services(services, {'id': 0, 'services': ['router']}, 'cloud-compose.nodes'))
@@ -0,0 +1,48 @@
+from unittest import TestCase
+from tempfile import mkdtemp
+from shutil import rmtree
+from cloudcompose.cluster.journal import StateJournal
+
+class StateJournalTest(TestCase):
+    def setUp(self):
+        self.state_dir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.state_dir)
+
+    def test_resume_keeps_unfinished_steps(self):
+        journal = StateJournal('test', self.state_dir)
+        journal.start('up')
+        journal.step_done('resolve', ami='ami-123')
+        journal.record_node(0, instance_id='i-123', status='launched')
+
+        journal = StateJournal('test', self.state_dir)
+        journal.start('up', resume=True)
+        self.assertTrue(journal.is_done('resolve'))
+        self.assertEqual('ami-123', journal.get('ami'))
+        self.assertEqual({'instance_id': 'i-123', 'status': 'launched'}, journal.nodes()['0'])
+
+    def test_completed_operation_starts_over(self):
+        journal = StateJournal('test', self.state_dir)
+        journal.start('up')
+        journal.step_done('resolve')
+        journal.complete()
+
+        journal = StateJournal('test', self.state_dir)
+        journal.start('up', resume=True)
+        self.assertFalse(journal.is_done('resolve'))
+
+    def test_remove_nodes(self):
+        journal = StateJournal('test', self.state_dir)
+        journal.record_node(0, instance_id='i-123')
+        journal.record_node(1, instance_id='i-456')
+        journal.remove_nodes([0])
+        self.assertEqual(['1'], list(StateJournal('test', self.state_dir).nodes().keys()))
+
+    def test_token_generation_outlives_nodes(self):
+        journal = StateJournal('test', self.state_dir)
+        self.assertEqual(0, journal.token_generation(0))
+        journal.record_node(0, instance_id='i-123')
+        journal.record_token_generation(0, 2)
+        journal.remove_nodes([0])
+        self.assertEqual(2, StateJournal('test', self.state_dir).token_generation(0))
@@ -0,0 +1,18 @@
+from unittest import TestCase
+from cloudcompose.cluster.nodeselection import NodeSelection
+from cloudcompose.exceptions import CloudComposeException
+
+class NodeSelectionTest(TestCase):
+    nodes = [{'id': node_id} for node_id in range(10)]
+
+    def test_select(self):
+        self.assertEqual([3, 5, 6, 7], [node['id'] for node in NodeSelection('3,5-7').select(self.nodes)])
+        self.assertEqual([0, 1, 2, 4, 8, 9], [node['id'] for node in NodeSelection(exclude_nodes='3, 5-7').select(self.nodes)])
+        self.assertEqual([5, 7], [node['id'] for node in NodeSelection('5-7', '6').select(self.nodes)])
+        self.assertEqual(self.nodes, NodeSelection().select(self.nodes))
+        self.assertFalse(NodeSelection().active)
+
+    def test_invalid_selection(self):
+        self.assertRaises(CloudComposeException, NodeSelection, '7-5')
+        self.assertRaises(CloudComposeException, NodeSelection, 'a-b')
+        self.assertRaises(CloudComposeException, NodeSelection('12').select, self.nodes)